@@ -0,0 +1,68 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel
+from typing import List, Literal
+import datetime
+
+from backend.app import crud
+from backend.app.database import get_db
+
+router = APIRouter()
+
+# Length of the system prompt excerpt in the ranked list
+PROMPT_PREVIEW_CHARS = 120
+
+# Pydantic Schemas for the feedback analytics endpoints
+
+class PromptFeedbackResponse(BaseModel):
+    prompt_hash: str
+    system_prompt: str
+    likes: int
+    dislikes: int
+    updated_at: datetime.datetime
+
+    class Config:
+        from_attributes = True # Enable ORM mode for Pydantic
+
+class PromptFeedbackSummary(BaseModel):
+    prompt_hash: str
+    system_prompt_preview: str
+    likes: int
+    dislikes: int
+    updated_at: datetime.datetime
+
+    class Config:
+        from_attributes = True
+
+@router.get(
+    "/analytics/prompts",
+    response_model=List[PromptFeedbackSummary],
+    summary="Rank system prompts by feedback",
+    description=(
+        "Lists the like and dislike counts of every system prompt used in a conversation, ranked by "
+        "`sort` (most first). Reads precomputed counters, so the cost does not grow with the number of messages."
+    )
+)
+async def get_prompt_feedback_ranking(
+    sort: Literal["dislikes", "likes"] = "dislikes",
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db)
+):
+    """Endpoint to rank system prompts by their likes or dislikes."""
+    return await crud.get_prompt_feedback_stats(
+        db, order_by=sort, skip=skip, limit=limit, preview_chars=PROMPT_PREVIEW_CHARS
+    )
+
+@router.get(
+    "/analytics/prompts/{prompt_hash}",
+    response_model=PromptFeedbackResponse,
+    summary="Get the feedback counts of a system prompt",
+    description="Retrieves the like and dislike counts of one system prompt, identified by the SHA-256 of its text."
+)
+async def get_prompt_feedback(prompt_hash: str, db: AsyncSession = Depends(get_db)):
+    """Endpoint to get the feedback counts of one system prompt."""
+    stats = await crud.get_prompt_feedback(db, prompt_hash)
+    if stats is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No feedback recorded for this prompt.")
+    return stats
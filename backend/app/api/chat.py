@@ -1,15 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from typing import List, Optional
+from contextlib import aclosing
+from typing import AsyncIterator, List, Literal, Optional, Tuple
+import asyncio
+import base64
 import datetime
+import html
+import json
+import time
 
 from backend.app import crud, models
-from backend.app.database import get_db
-from backend.app.services.gemini_service import generate_gemini_response
+from backend.app.config import settings
+from backend.app.database import get_db, AsyncSessionLocal
+from backend.app.services.archive import ArchiveError, export_ndjson, gzip_chunks, import_ndjson
+from backend.app.services.change_feed import change_feed
+from backend.app.services.context_builder import build_context, schedule_summary
+from backend.app.services.context_cache import context_cache
+from backend.app.services.metrics import StageTimer
+from backend.app.services.gemini_service import MODEL_NAME, generate_gemini_response, stream_gemini_response
+from backend.app.services.response_cache import make_key, response_cache
 
 router = APIRouter()
 
+# Length of the prompt and last-message previews in conversation summaries
+PREVIEW_CHARS = 80
+
 # Pydantic Schemas for request and response bodies
 
 class MessageBase(BaseModel):
@@ -33,16 +50,34 @@ class ConversationBase(BaseModel):
     system_prompt_used: str
 
 class ConversationCreate(ConversationBase):
-    pass
+    response_cache_bypass: bool = False # Always call the model, even when the response cache is on
 
-class ConversationResponse(ConversationBase):
+class ConversationResponse(BaseModel):
     id: int
+    system_prompt_hash: str # SHA-256 of the system prompt text
+    system_prompt_used: Optional[str] = None # Left out (null) when the list is requested without prompts
     created_at: datetime.datetime
+    response_cache_bypass: bool = False
     messages: List[MessageResponse] = []
 
     class Config:
         from_attributes = True
 
+class ConversationSummary(BaseModel):
+    id: int
+    created_at: datetime.datetime
+    system_prompt_preview: str
+    message_count: int
+    last_message_preview: Optional[str] = None
+    last_activity: datetime.datetime
+
+    class Config:
+        from_attributes = True
+
+class ConversationSummaryPage(BaseModel):
+    items: List[ConversationSummary]
+    next_cursor: Optional[str] = None # Pass as `cursor` to fetch the next (older) page
+
 class UserMessageRequest(BaseModel):
     message_content: str
     api_key: str # Add api_key field
@@ -51,6 +86,102 @@ class MessageFeedbackRequest(BaseModel):
     liked: Optional[bool] = None
     disliked: Optional[bool] = None
 
+class ResponseCacheSettings(BaseModel):
+    bypass: bool
+
+class ImportResult(BaseModel):
+    conversations: int
+    messages: int
+    seconds: float
+    rows_per_s: float
+
+class SearchResult(BaseModel):
+    message_id: int
+    conversation_id: int
+    sender: str
+    timestamp: datetime.datetime
+    snippet: str # HTML-escaped excerpt with matched terms wrapped in <mark>
+    score: float # Higher is a better match
+
+class SearchPage(BaseModel):
+    items: List[SearchResult]
+    next_skip: Optional[int] = None # Pass as `skip` to fetch the next page
+
+
+def _encode_cursor(created_at: datetime.datetime, conversation_id: int) -> str:
+    """Encodes a conversation list position as an opaque cursor string."""
+    raw = json.dumps([created_at.isoformat(), conversation_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime.datetime, int]]:
+    """Decodes a cursor produced by `_encode_cursor`, rejecting malformed ones with a 400."""
+    if cursor is None:
+        return None
+    try:
+        created_at, conversation_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.datetime.fromisoformat(created_at), int(conversation_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+
+
+async def _load_history(db: AsyncSession, conversation_id: int) -> List[dict]:
+    """Returns the conversation's chat history, from the context cache when possible."""
+    history = context_cache.get(conversation_id)
+    if history and context_cache.check_database:
+        # Other workers may have added turns since this one cached the history. The last
+        # cached message comes back first, unless the conversation was deleted meanwhile.
+        last_id = history[-1]["id"]
+        rows = await crud.get_conversation_history(db, conversation_id, since_id=last_id)
+        if rows and rows[0][0] == last_id:
+            newer = [context_cache.to_entry(*row) for row in rows[1:]]
+            if newer:
+                context_cache.extend(conversation_id, last_id, newer)
+                history.extend(newer)
+            return history
+        context_cache.invalidate(conversation_id)
+        history = None
+    elif history == [] and context_cache.check_database:
+        # Cached before it had messages; a full load is as cheap as a check
+        context_cache.invalidate(conversation_id)
+        history = None
+    if history is None:
+        generation = context_cache.generation()
+        rows = await crud.get_conversation_history(db, conversation_id)
+        history = [context_cache.to_entry(*row) for row in rows]
+        context_cache.put(conversation_id, history, generation)
+    return history
+
+
+def _publish_message(db_message) -> None:
+    """Pushes a new message to the browsers connected to /ws."""
+    change_feed.publish("message.created", message=MessageResponse.model_validate(db_message).model_dump(mode="json"))
+
+
+async def _save_message(db: AsyncSession, conversation_id: int, sender: str, content: str, timestamp: datetime.datetime = None):
+    """Saves a single message in its own commit and appends it to the cached history."""
+    db_message = crud.add_message(db, conversation_id, sender, content, timestamp=timestamp)
+    await db.commit()
+    context_cache.append(conversation_id, context_cache.to_entry(db_message.id, sender, content))
+    _publish_message(db_message)
+    return db_message
+
+
+async def _save_turn(db: AsyncSession, conversation_id: int, user_content: str, user_timestamp: datetime.datetime, ai_content: str):
+    """Saves a user message and the AI reply to it in one transaction (a single commit).
+
+    Both rows are inserted by one flush; ids and defaults come back with the
+    INSERT, so no refresh is needed. Returns the AI message.
+    """
+    db_user_message = crud.add_message(db, conversation_id, "user", user_content, timestamp=user_timestamp)
+    db_ai_message = crud.add_message(db, conversation_id, "ai", ai_content)
+    await db.commit()
+    context_cache.append(conversation_id, context_cache.to_entry(db_user_message.id, "user", user_content))
+    context_cache.append(conversation_id, context_cache.to_entry(db_ai_message.id, "ai", ai_content))
+    _publish_message(db_user_message)
+    _publish_message(db_ai_message)
+    return db_ai_message
+
 
 @router.post(
     "/conversation",
@@ -61,12 +192,22 @@ class MessageFeedbackRequest(BaseModel):
 )
 async def create_new_conversation(
     conversation: ConversationCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Endpoint to create a new conversation."""
-    db_conversation = crud.create_conversation(
-        db=db, system_prompt_used=conversation.system_prompt_used
+    db_conversation = await crud.create_conversation(
+        db=db,
+        system_prompt_used=conversation.system_prompt_used,
+        response_cache_bypass=conversation.response_cache_bypass,
     )
+    # Other tabs add it to their sidebar from this summary instead of reloading the list
+    change_feed.publish("conversation.created", conversation=ConversationSummary(
+        id=db_conversation.id,
+        created_at=db_conversation.created_at,
+        system_prompt_preview=db_conversation.system_prompt_used[:PREVIEW_CHARS],
+        message_count=0,
+        last_activity=db_conversation.created_at,
+    ).model_dump(mode="json"))
     return db_conversation
 
 
@@ -74,22 +215,39 @@ async def create_new_conversation(
     "/conversation/{conversation_id}/messages",
     response_model=List[MessageResponse],
     summary="Get messages for a conversation",
-    description="Retrieves all messages for a specific conversation ID."
+    description=(
+        "Retrieves a page of messages for a conversation, oldest first. Without a cursor the "
+        "latest page is returned; pass `before_id` (the oldest message you have) to page back "
+        "or `after_id` (the newest message you have) to page forward."
+    )
 )
 async def get_conversation_messages(
     conversation_id: int,
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_db)
 ):
     """Endpoint to retrieve messages for a conversation."""
     # First, check if conversation exists
-    db_conversation = crud.get_conversation(db, conversation_id)
+    db_conversation = await crud.get_conversation(db, conversation_id)
     if not db_conversation:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found.")
+    if before_id is not None and after_id is not None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Use either before_id or after_id, not both.")
+
+    # Resolve the cursor message to its (timestamp, id) position in the conversation
+    cursors = {}
+    for name, message_id in (("before", before_id), ("after", after_id)):
+        if message_id is None:
+            continue
+        cursor_message = await crud.get_message(db, message_id)
+        if not cursor_message or cursor_message.conversation_id != conversation_id:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Message {message_id} is not in this conversation.")
+        cursors[name] = (cursor_message.timestamp, cursor_message.id)
 
-    messages = crud.get_messages_for_conversation(
-        db=db, conversation_id=conversation_id, skip=skip, limit=limit
+    messages = await crud.get_messages_for_conversation(
+        db=db, conversation_id=conversation_id, limit=limit, **cursors
     )
     return messages
 
@@ -98,18 +256,151 @@ async def get_conversation_messages(
     "/conversations",
     response_model=List[ConversationResponse],
     summary="Get all conversations",
-    description="Retrieves a list of all conversations with their messages."
+    description=(
+        "Retrieves a page of conversations, newest first, with all their messages. "
+        "The cursor for the next page is returned in the `X-Next-Cursor` header. "
+        "With `include_system_prompt=false`, `system_prompt_used` is null and only the "
+        "`system_prompt_hash` identifies the prompt. "
+        "Use `/conversations/summary` when message bodies are not needed."
+    )
 )
 async def get_all_conversations(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=100),
+    include_system_prompt: bool = True,
+    db: AsyncSession = Depends(get_db)
 ):
     """Endpoint to retrieve all conversations."""
-    conversations = crud.get_conversations(db, skip=skip, limit=limit)
+    conversations = await crud.get_conversations(
+        db, before=_decode_cursor(cursor), limit=limit, include_system_prompt=include_system_prompt
+    )
+    if len(conversations) == limit:
+        last = conversations[-1]
+        response.headers["X-Next-Cursor"] = _encode_cursor(last.created_at, last.id)
     return conversations
 
 
+@router.get(
+    "/conversations/summary",
+    response_model=ConversationSummaryPage,
+    summary="List conversation summaries",
+    description=(
+        "Retrieves a page of conversation summaries (message count, last message preview, "
+        "last activity), newest first, without message bodies. Pages are keyed by cursor."
+    )
+)
+async def get_conversation_summaries(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db)
+):
+    """Endpoint to retrieve conversation summaries for the sidebar."""
+    rows = await crud.get_conversation_summaries(db, before=_decode_cursor(cursor), limit=limit, preview_chars=PREVIEW_CHARS)
+    next_cursor = _encode_cursor(rows[-1].created_at, rows[-1].id) if len(rows) == limit else None
+    return ConversationSummaryPage(
+        items=[ConversationSummary.model_validate(row) for row in rows],
+        next_cursor=next_cursor,
+    )
+
+
+@router.get(
+    "/conversations/export",
+    summary="Export all conversations",
+    description=(
+        "Streams every conversation and its messages (with feedback flags) as NDJSON: a header "
+        "line, then each conversation followed by its messages. With `gzip` the stream is "
+        "gzip-compressed. The export is a consistent snapshot and is read with server-side "
+        "cursors, so it works for databases of any size."
+    )
+)
+async def export_conversations(gzip: bool = False):
+    """Endpoint to export conversations as an NDJSON archive."""
+    stamp = models.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    if gzip:
+        return StreamingResponse(
+            gzip_chunks(export_ndjson()),
+            media_type="application/gzip",
+            headers={"Content-Disposition": f'attachment; filename="conversations-{stamp}.ndjson.gz"'},
+        )
+    return StreamingResponse(
+        export_ndjson(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="conversations-{stamp}.ndjson"'},
+    )
+
+
+@router.post(
+    "/conversations/import",
+    response_model=ImportResult,
+    summary="Import conversations",
+    description=(
+        "Imports an archive produced by `/conversations/export`, sent as the raw request body "
+        "(plain or gzip NDJSON). Conversations and messages get new ids; timestamps, summaries "
+        "and feedback flags are kept. Rows are written in large batched transactions, so if a "
+        "line is invalid the batches before it stay imported."
+    )
+)
+async def import_conversations(request: Request):
+    """Endpoint to import an NDJSON archive."""
+    try:
+        stats = await import_ndjson(request.stream())
+    except ArchiveError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    finally:
+        # Too many rows to push one by one (and earlier batches stay imported on failure)
+        change_feed.publish("resync")
+    return ImportResult(**vars(stats))
+
+
+def _highlight(snippet: str) -> str:
+    """HTML-escapes a search snippet and turns its match marks into <mark> tags."""
+    return (
+        html.escape(snippet)
+        .replace(crud.SEARCH_MATCH_START, "<mark>")
+        .replace(crud.SEARCH_MATCH_END, "</mark>")
+    )
+
+
+@router.get(
+    "/search",
+    response_model=SearchPage,
+    summary="Search messages",
+    description=(
+        "Full-text searches message content across all conversations, best matches first. "
+        "Optionally restricted to one conversation or one sender. Pages are fetched with `skip`."
+    )
+)
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=500),
+    conversation_id: Optional[int] = None,
+    sender: Optional[Literal["user", "ai"]] = None,
+    skip: int = Query(0, ge=0, le=10_000),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db)
+):
+    """Endpoint to search message content."""
+    if not q.split():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Search query is empty.")
+    rows = await crud.search_messages(
+        db, q, conversation_id=conversation_id, sender=sender, skip=skip, limit=limit
+    )
+    return SearchPage(
+        items=[
+            SearchResult(
+                message_id=row.id,
+                conversation_id=row.conversation_id,
+                sender=row.sender,
+                timestamp=row.timestamp,
+                snippet=_highlight(row.snippet),
+                score=row.score,
+            )
+            for row in rows
+        ],
+        next_skip=skip + limit if len(rows) == limit else None,
+    )
+
+
 @router.post(
     "/conversation/{conversation_id}/send_message",
     response_model=MessageResponse,
@@ -119,44 +410,227 @@ async def get_all_conversations(
 async def send_user_message_and_get_ai_response(
     conversation_id: int,
     user_message_req: UserMessageRequest,
-    db: Session = Depends(get_db)
+    response: Response,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db)
 ):
     """Endpoint to send a user message and receive an AI response."""
-    db_conversation = crud.get_conversation(db, conversation_id)
-    if not db_conversation:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found.")
+    # Per-stage timings go to the metrics histograms and the Server-Timing header
+    timer = StageTimer("send_message")
+    # The user message is written together with the reply, but keeps the time it was sent
+    user_timestamp = models.utcnow()
+    with timer.stage("history_load"):
+        db_conversation = await crud.get_conversation(db, conversation_id)
+        if not db_conversation:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found.")
+        history = await _load_history(db, conversation_id)
 
-    # 1. Save user message
-    crud.create_message(
-        db=db, conversation_id=conversation_id, sender="user", content=user_message_req.message_content
-    )
+    # 1. Prepare chat history for AI model (history *before* the current user message):
+    # the rolling summary plus the most recent messages that fit in the token budget
+    with timer.stage("prompt_build"):
+        context = build_context(
+            system_prompt=db_conversation.system_prompt_used,
+            summary=db_conversation.summary,
+            summary_upto_message_id=db_conversation.summary_upto_message_id,
+            history=history,
+            user_message=user_message_req.message_content,
+            token_budget=settings.context_token_budget,
+        )
+        # Summarization is queued once the response is out, off the request path
+        background_tasks.add_task(
+            schedule_summary, conversation_id, user_message_req.api_key,
+            db_conversation.summary_upto_message_id, context
+        )
 
-    # 2. Prepare chat history for AI model
-    chat_history_messages = crud.get_messages_for_conversation(db, conversation_id)
-    chat_history_for_gemini = [
-        {"role": msg.sender, "parts": [msg.content]}
-        for msg in chat_history_messages
-    ]
+        system_prompt = db_conversation.system_prompt_used
+        cache_key = None
+        if response_cache.is_active_for(db_conversation):
+            cache_key = make_key(MODEL_NAME, system_prompt, context.history, user_message_req.message_content)
+    # 2. End the read transaction so no pooled connection is held while awaiting the model
+    await db.close()
 
-    # 3. Get AI response
-    try:
-        ai_response_content = await generate_gemini_response(
-            api_key=user_message_req.api_key, # Pass the API key
-            system_prompt=db_conversation.system_prompt_used,
-            chat_history=chat_history_for_gemini[:-1], # Pass history *before* current user message
-            user_message=user_message_req.message_content
+    # 3. Get AI response, from the response cache when this exact turn was answered before
+    cached = None
+    if cache_key:
+        with timer.stage("cache_lookup"):
+            cached = await response_cache.get(cache_key)
+    if cached is not None:
+        ai_response_content = cached.text
+    else:
+        try:
+            with timer.stage("model"):
+                ai_response_content = await generate_gemini_response(
+                    api_key=user_message_req.api_key, # Pass the API key
+                    system_prompt=system_prompt,
+                    chat_history=context.history,
+                    user_message=user_message_req.message_content
+                )
+        except Exception as e:
+            # Keep the user's message even though there is no reply to it
+            await _save_message(db, conversation_id, "user", user_message_req.message_content, timestamp=user_timestamp)
+            # Timeouts (504) and upstream overload (503) keep their status; anything else is a 500
+            status_code = getattr(e, "status_code", status.HTTP_500_INTERNAL_SERVER_ERROR)
+            raise HTTPException(status_code=status_code, detail=str(e))
+
+    # 4. Save the user message and the AI message in one commit
+    with timer.stage("persist"):
+        db_ai_message = await _save_turn(
+            db, conversation_id, user_message_req.message_content, user_timestamp, ai_response_content
         )
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+        if cache_key and cached is None:
+            await response_cache.put(cache_key, MODEL_NAME, ai_response_content, timer.durations["model"] * 1000)
 
-    # 4. Save AI message
-    db_ai_message = crud.create_message(
-        db=db, conversation_id=conversation_id, sender="ai", content=ai_response_content
-    )
+    # Report how many (estimated) tokens were sent to the model for this turn
+    response.headers["X-Context-Tokens"] = str(context.total_tokens)
+    if cache_key:
+        response.headers["X-Response-Cache"] = "hit" if cached is not None else "miss"
+    response.headers["Server-Timing"] = timer.server_timing()
 
     return db_ai_message
 
 
+def _sse_event(event: str, data: dict) -> str:
+    """Formats a single Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _save_streamed_turn(conversation_id: int, user_content: str, user_timestamp: datetime.datetime, ai_content: str) -> Optional[dict]:
+    """Saves a streamed turn in its own session and returns the AI message serialized.
+
+    Without AI text only the user message is saved, and None is returned.
+    """
+    async with AsyncSessionLocal() as db:
+        if not ai_content:
+            await _save_message(db, conversation_id, "user", user_content, timestamp=user_timestamp)
+            return None
+        db_ai_message = await _save_turn(db, conversation_id, user_content, user_timestamp, ai_content)
+        return MessageResponse.model_validate(db_ai_message).model_dump(mode="json")
+
+
+async def _single_chunk(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+@router.post(
+    "/conversation/{conversation_id}/send_message/stream",
+    summary="Send a user message and stream the AI response",
+    description=(
+        "Sends a user message to a conversation and streams the AI response as Server-Sent Events. "
+        "Emits `chunk` events as text arrives, then a `done` event with the saved AI message, "
+        "first-chunk latency and context token counts, or an `error` event if generation fails."
+    )
+)
+async def send_user_message_and_stream_ai_response(
+    conversation_id: int,
+    user_message_req: UserMessageRequest,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db)
+):
+    """Endpoint to send a user message and stream the AI response as it is generated."""
+    timer = StageTimer("send_message_stream")
+    user_timestamp = models.utcnow()
+    with timer.stage("history_load"):
+        db_conversation = await crud.get_conversation(db, conversation_id)
+        if not db_conversation:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found.")
+        history = await _load_history(db, conversation_id)
+
+    # 1. Prepare chat history for AI model (history *before* the current user message):
+    # the rolling summary plus the most recent messages that fit in the token budget
+    with timer.stage("prompt_build"):
+        context = build_context(
+            system_prompt=db_conversation.system_prompt_used,
+            summary=db_conversation.summary,
+            summary_upto_message_id=db_conversation.summary_upto_message_id,
+            history=history,
+            user_message=user_message_req.message_content,
+            token_budget=settings.context_token_budget,
+        )
+        # Summarization is queued once the response is out, off the request path
+        background_tasks.add_task(
+            schedule_summary, conversation_id, user_message_req.api_key,
+            db_conversation.summary_upto_message_id, context
+        )
+
+        system_prompt = db_conversation.system_prompt_used
+        cache_key = None
+        if response_cache.is_active_for(db_conversation):
+            cache_key = make_key(MODEL_NAME, system_prompt, context.history, user_message_req.message_content)
+    # 2. End the read transaction so no pooled connection is held while the response streams
+    await db.close()
+
+    async def event_stream():
+        # 3. Stream the AI response, forwarding each chunk as soon as it arrives.
+        # A cached reply is sent as a single chunk.
+        chunks: List[str] = []
+        started_at = time.perf_counter()
+        first_chunk_latency_ms = None
+        failed = False
+        cached = None
+        try:
+            if cache_key:
+                with timer.stage("cache_lookup"):
+                    cached = await response_cache.get(cache_key)
+            if cached is not None:
+                source = _single_chunk(cached.text)
+            else:
+                source = stream_gemini_response(
+                    api_key=user_message_req.api_key,
+                    system_prompt=system_prompt,
+                    chat_history=context.history,
+                    user_message=user_message_req.message_content
+                )
+            model_started_at = time.perf_counter()
+            # aclosing() closes the model stream as soon as this generator is closed, so a
+            # client that disconnects also cancels the upstream call
+            async with aclosing(source):
+                async for chunk in source:
+                    if first_chunk_latency_ms is None:
+                        first_chunk_latency_ms = (time.perf_counter() - started_at) * 1000
+                        if cached is None:
+                            timer.record("first_token", time.perf_counter() - model_started_at)
+                    chunks.append(chunk)
+                    yield _sse_event("chunk", {"text": chunk})
+            if cached is None:
+                timer.record("model", time.perf_counter() - model_started_at)
+        except Exception as e:
+            failed = True
+            yield _sse_event("error", {"detail": str(e)})
+        finally:
+            # 4. Save the user message and the AI message in one commit once the stream has
+            # ended, or with the partial text if the client went away mid-stream. After a
+            # failure only the user message is kept. The request-scoped session may already
+            # be closed at this point, so a dedicated one is used.
+            # The save is shielded so a cancelled stream still completes its write.
+            ai_content = "".join(chunks) if not failed else ""
+            with timer.stage("persist"):
+                ai_message_payload = await asyncio.shield(_save_streamed_turn(
+                    conversation_id, user_message_req.message_content, user_timestamp, ai_content
+                ))
+
+        if ai_message_payload is not None:
+            total_latency_ms = (time.perf_counter() - started_at) * 1000
+            # Only a reply that streamed to the end is cached, never a partial one
+            if cache_key and cached is None:
+                await response_cache.put(cache_key, MODEL_NAME, ai_message_payload["content"], timer.durations["model"] * 1000)
+            yield _sse_event("done", {
+                "message": ai_message_payload,
+                "first_chunk_latency_ms": first_chunk_latency_ms,
+                "context": context.report(),
+                "total_latency_ms": total_latency_ms,
+                "cached": cached is not None,
+                "timings_ms": {name: round(seconds * 1000, 1) for name, seconds in timer.durations.items()},
+            })
+        elif not failed:
+            yield _sse_event("error", {"detail": "The AI model returned an empty response."})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.put(
     "/message/{message_id}/feedback",
     response_model=MessageResponse,
@@ -166,24 +640,55 @@ async def send_user_message_and_get_ai_response(
 async def update_message_feedback_endpoint(
     message_id: int,
     feedback: MessageFeedbackRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Endpoint to update message feedback."""
-    db_message_check = db.query(models.Message).filter(models.Message.id == message_id).first()
-    if not db_message_check:
+    db_message = await crud.get_message(db, message_id)
+    if not db_message:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Message not found.")
-    if db_message_check.sender != 'ai':
+    if db_message.sender != 'ai':
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Feedback can only be provided for AI messages.")
-    
-    db_message = crud.update_message_feedback(
-        db, message_id=message_id, liked=feedback.liked, disliked=feedback.disliked
+
+    # Update the row already loaded for the checks above rather than fetching it again
+    db_message = await crud.apply_message_feedback(
+        db, db_message, liked=feedback.liked, disliked=feedback.disliked
+    )
+    context_cache.invalidate(db_message.conversation_id)
+    change_feed.publish(
+        "message.feedback", message_id=db_message.id, conversation_id=db_message.conversation_id,
+        liked=db_message.liked, disliked=db_message.disliked,
     )
-    if not db_message:
-        # This case should ideally not be hit if the check above passes, but it's good practice
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Message not found during update.")
     return db_message
 
 
+@router.put(
+    "/conversation/{conversation_id}/response_cache",
+    response_model=ResponseCacheSettings,
+    summary="Bypass the response cache for a conversation",
+    description="With `bypass` set, every turn of the conversation calls the model even when the response cache is on."
+)
+async def update_conversation_response_cache(
+    conversation_id: int,
+    cache_settings: ResponseCacheSettings,
+    db: AsyncSession = Depends(get_db)
+):
+    """Endpoint to turn the response cache off or on for one conversation."""
+    db_conversation = await crud.set_conversation_response_cache_bypass(db, conversation_id, cache_settings.bypass)
+    if not db_conversation:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found.")
+    return ResponseCacheSettings(bypass=db_conversation.response_cache_bypass)
+
+
+@router.get(
+    "/response_cache/stats",
+    summary="Response cache statistics",
+    description="Hits per tier, misses, evictions and the model time saved by cache hits, for this worker."
+)
+async def get_response_cache_stats():
+    """Endpoint to report response cache statistics."""
+    return response_cache.stats()
+
+
 @router.delete(
     "/conversation/{conversation_id}",
     status_code=status.HTTP_204_NO_CONTENT,
@@ -192,9 +697,11 @@ async def update_message_feedback_endpoint(
 )
 async def delete_existing_conversation(
     conversation_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Endpoint to delete a conversation."""
-    if not crud.delete_conversation(db, conversation_id):
+    if not await crud.delete_conversation(db, conversation_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found.")
+    context_cache.invalidate(conversation_id)
+    change_feed.publish("conversation.deleted", conversation_id=conversation_id)
     return # No content to return for 204
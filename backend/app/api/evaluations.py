@@ -0,0 +1,69 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel
+from typing import List, Optional
+
+from backend.app import crud
+from backend.app.config import settings
+from backend.app.database import get_db
+from backend.app.services.evaluation import Evaluation, EvaluationPrompt
+
+router = APIRouter()
+
+# Pydantic Schemas for the batch evaluation endpoint
+
+class EvaluationRequest(BaseModel):
+    prompt_ids: List[int] # Saved prompts to compare
+    messages: List[str] # User messages sent to every prompt
+    api_key: str
+    concurrency: Optional[int] = None # Model calls in flight at once; defaults to (and is capped at) the server limit
+    multi_turn: bool = False # Send each prompt's messages as consecutive turns of one conversation
+
+@router.post(
+    "/evaluations",
+    summary="Run a batch evaluation",
+    description=(
+        "Sends every message to every saved prompt, running the model calls concurrently, and "
+        "streams the results as NDJSON: a `result` line per call as soon as it finishes, then a "
+        "`summary` line with the saved conversations and aggregate latency and throughput stats. "
+        "Each (prompt, message) pair becomes its own conversation; with `multi_turn` each prompt "
+        "gets one conversation with the messages as consecutive turns. The conversations are "
+        "saved together once the calls are done, including when the client disconnects early."
+    )
+)
+async def run_evaluation(
+    evaluation_req: EvaluationRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """Endpoint to run N prompts x M messages and stream the results."""
+    # Duplicates would only repeat identical calls
+    prompt_ids = list(dict.fromkeys(evaluation_req.prompt_ids))
+    if not prompt_ids or not evaluation_req.messages:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="At least one prompt and one message are required.")
+    calls = len(prompt_ids) * len(evaluation_req.messages)
+    if calls > settings.evaluation_max_calls:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"An evaluation can make at most {settings.evaluation_max_calls} model calls; this one needs {calls}.",
+        )
+    if evaluation_req.concurrency is not None and evaluation_req.concurrency < 1:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="concurrency must be at least 1.")
+
+    found = {prompt.id: prompt for prompt in await crud.get_prompts_by_ids(db, prompt_ids)}
+    missing = [prompt_id for prompt_id in prompt_ids if prompt_id not in found]
+    if missing:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Prompts not found: {', '.join(map(str, missing))}.")
+    prompts = [EvaluationPrompt(found[prompt_id].id, found[prompt_id].name, found[prompt_id].content) for prompt_id in prompt_ids]
+    # End the read transaction so no pooled connection is held while the calls run
+    await db.close()
+
+    evaluation = Evaluation(
+        evaluation_req.api_key, prompts, evaluation_req.messages,
+        concurrency=evaluation_req.concurrency, multi_turn=evaluation_req.multi_turn,
+    )
+    return StreamingResponse(
+        evaluation.stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
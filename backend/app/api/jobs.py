@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel
+from typing import Dict, Optional
+import datetime
+
+from backend.app import crud
+from backend.app.database import get_db
+from backend.app.services.job_queue import job_queue
+
+router = APIRouter()
+
+# Pydantic Schemas for the background job endpoints
+
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    status: str
+    attempts: int
+    max_attempts: int
+    last_error: Optional[str] = None
+    created_at: datetime.datetime
+    run_after: datetime.datetime
+    started_at: Optional[datetime.datetime] = None
+    finished_at: Optional[datetime.datetime] = None
+
+    class Config:
+        from_attributes = True # Enable ORM mode for Pydantic
+
+@router.get(
+    "/jobs/stats",
+    summary="Get background job queue statistics",
+    description=(
+        "Returns job counts by status and the age of the oldest pending job, plus this worker's "
+        "concurrency, running and queued jobs, outcome counters and wait/run time percentiles per job kind."
+    )
+)
+async def get_job_queue_stats() -> Dict:
+    """Endpoint to inspect the background job queue."""
+    return await job_queue.stats()
+
+@router.get(
+    "/jobs/{job_id}",
+    response_model=JobResponse,
+    summary="Get a background job",
+    description="Retrieves the status, attempts and last error of a single background job."
+)
+async def get_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    """Endpoint to get a background job by ID."""
+    db_job = await crud.get_job(db, job_id)
+    if db_job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found.")
+    return db_job
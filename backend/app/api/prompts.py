@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import List, Optional
 import datetime
 
 from backend.app import crud, models
 from backend.app.database import get_db
+from backend.app.services.change_feed import change_feed
+from backend.app.services.etags import etag_matches
+from backend.app.services.prompt_registry import CachedBody, PromptRegistry
 
 router = APIRouter()
 
@@ -29,6 +33,25 @@ class PromptResponse(PromptBase):
     class Config:
         from_attributes = True # Enable ORM mode for Pydantic
 
+class PromptBodyResponse(BaseModel):
+    hash: str
+    content: str
+
+    class Config:
+        from_attributes = True
+
+# Prompts are served from memory, serialized once per change (see services/prompt_registry.py)
+prompt_registry = PromptRegistry(lambda prompt: PromptResponse.model_validate(prompt).model_dump(mode="json"))
+
+
+def _cached_json(request: Request, cached: CachedBody) -> Response:
+    """Returns a serialized body with its ETag, or 304 Not Modified if the client has it already."""
+    # no-cache lets browsers keep the body but makes them revalidate it on every use
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), cached.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
 @router.post(
     "/prompts",
     response_model=PromptResponse,
@@ -38,44 +61,85 @@ class PromptResponse(PromptBase):
 )
 async def create_new_prompt(
     prompt: PromptCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Endpoint to create a new prompt."""
-    db_prompt = crud.get_prompt_by_name(db, name=prompt.name)
-    if db_prompt:
+    snapshot = await prompt_registry.get(db)
+    if prompt.name in snapshot.ids_by_name:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Prompt with this name already exists.")
+    try:
+        db_prompt = await crud.create_prompt(db=db, name=prompt.name, content=prompt.content)
+    except IntegrityError:
+        # Created concurrently, after the registry was checked
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Prompt with this name already exists.")
-    return crud.create_prompt(db=db, name=prompt.name, content=prompt.content)
+    prompt_registry.invalidate()
+    change_feed.publish("prompt.created", prompt=PromptResponse.model_validate(db_prompt).model_dump(mode="json"))
+    return db_prompt
 
 @router.get(
     "/prompts",
     response_model=List[PromptResponse],
     summary="Get all system prompts",
-    description="Retrieves a list of all saved system prompts."
+    description=(
+        "Retrieves a list of all saved system prompts. The response carries an ETag; send it "
+        "back in `If-None-Match` to get 304 Not Modified while the prompts are unchanged."
+    )
 )
 async def get_all_prompts(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=0),
+    db: AsyncSession = Depends(get_db)
 ):
     """Endpoint to retrieve all prompts."""
-    prompts = crud.get_prompts(db, skip=skip, limit=limit)
-    return prompts
+    snapshot = await prompt_registry.get(db)
+    return _cached_json(request, snapshot.page(skip, limit))
 
 @router.get(
     "/prompts/{prompt_id}",
     response_model=PromptResponse,
     summary="Get a system prompt by ID",
-    description="Retrieves a single system prompt by its ID."
+    description="Retrieves a single system prompt by its ID. Supports `If-None-Match` like the list."
 )
 async def get_single_prompt(
+    request: Request,
     prompt_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Endpoint to retrieve a single prompt by ID."""
-    db_prompt = crud.get_prompt(db, prompt_id=prompt_id)
-    if not db_prompt:
+    snapshot = await prompt_registry.get(db)
+    cached = snapshot.by_id.get(prompt_id)
+    if cached is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prompt not found.")
-    return db_prompt
+    return _cached_json(request, cached)
+
+@router.get(
+    "/prompt_bodies/{prompt_hash}",
+    response_model=PromptBodyResponse,
+    summary="Get a system prompt text by hash",
+    description=(
+        "Retrieves the text of a system prompt used by conversations, by its `system_prompt_hash`. "
+        "A hash always names the same text, so responses may be cached indefinitely."
+    )
+)
+async def get_prompt_body(
+    request: Request,
+    prompt_hash: str,
+    db: AsyncSession = Depends(get_db)
+):
+    """Endpoint to retrieve a system prompt text by its hash."""
+    db_body = await crud.get_prompt_body(db, prompt_hash)
+    if db_body is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prompt body not found.")
+    # Content-addressed, so the hash is the ETag and the body never goes stale
+    headers = {"ETag": f'"{db_body.hash}"', "Cache-Control": "public, max-age=31536000, immutable"}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(
+        content=PromptBodyResponse.model_validate(db_body).model_dump_json(),
+        media_type="application/json",
+        headers=headers,
+    )
 
 @router.put(
     "/prompts/{prompt_id}",
@@ -86,18 +150,25 @@ async def get_single_prompt(
 async def update_existing_prompt(
     prompt_id: int,
     prompt: PromptUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Endpoint to update an existing prompt."""
     # Check if a prompt with the new name already exists (if name is being updated)
     if prompt.name:
-        existing_prompt = crud.get_prompt_by_name(db, name=prompt.name)
-        if existing_prompt and existing_prompt.id != prompt_id:
+        snapshot = await prompt_registry.get(db)
+        existing_id = snapshot.ids_by_name.get(prompt.name)
+        if existing_id is not None and existing_id != prompt_id:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Prompt with this name already exists.")
 
-    db_prompt = crud.update_prompt(db, prompt_id=prompt_id, name=prompt.name, content=prompt.content)
+    try:
+        db_prompt = await crud.update_prompt(db, prompt_id=prompt_id, name=prompt.name, content=prompt.content)
+    except IntegrityError:
+        # The name was taken concurrently, after the registry was checked
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Prompt with this name already exists.")
     if not db_prompt:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prompt not found.")
+    prompt_registry.invalidate()
+    change_feed.publish("prompt.updated", prompt=PromptResponse.model_validate(db_prompt).model_dump(mode="json"))
     return db_prompt
 
 @router.delete(
@@ -108,9 +179,11 @@ async def update_existing_prompt(
 )
 async def delete_existing_prompt(
     prompt_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Endpoint to delete a prompt."""
-    if not crud.delete_prompt(db, prompt_id=prompt_id):
+    if not await crud.delete_prompt(db, prompt_id=prompt_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prompt not found.")
+    prompt_registry.invalidate()
+    change_feed.publish("prompt.deleted", prompt_id=prompt_id)
     return # No content to return for 204
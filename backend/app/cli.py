@@ -0,0 +1,98 @@
+"""Command-line maintenance tasks for the PromptCraft backend.
+
+Uses the same settings as the server (DATABASE_URL etc.). Usage, from the project root:
+    python -m backend.app.cli export conversations.ndjson.gz
+    python -m backend.app.cli import conversations.ndjson.gz
+    python -m backend.app.cli rebuild-feedback-stats
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from dataclasses import asdict
+
+from backend.app import crud
+from backend.app.database import AsyncSessionLocal
+from backend.app.services import archive
+
+# Bytes read from an archive file at a time
+_READ_BYTES = 1024 * 1024
+
+
+async def _read_file(path: str):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(_READ_BYTES)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def _write_chunks(chunks, out) -> int:
+    written = 0
+    async for chunk in chunks:
+        out.write(chunk)
+        written += len(chunk)
+    return written
+
+
+async def export_archive(args) -> None:
+    started = time.perf_counter()
+    chunks = archive.export_ndjson()
+    # Compression follows the file name, like the import side detects it from the content
+    if args.path.endswith(".gz"):
+        chunks = archive.gzip_chunks(chunks)
+    if args.path == "-":
+        written = await _write_chunks(chunks, sys.stdout.buffer)
+        sys.stdout.buffer.flush()
+    else:
+        with open(args.path, "wb") as out:
+            written = await _write_chunks(chunks, out)
+    seconds = time.perf_counter() - started
+    print(json.dumps({"bytes": written, "seconds": round(seconds, 3)}), file=sys.stderr)
+
+
+async def import_archive(args) -> None:
+    def progress(stats):
+        print(f"{stats.conversations} conversations, {stats.messages} messages, {stats.rows_per_s:.0f} rows/s", file=sys.stderr)
+
+    chunks = _read_file(args.path) if args.path != "-" else _read_file("/dev/stdin")
+    try:
+        stats = await archive.import_ndjson(chunks, batch_rows=args.batch_rows, progress=progress)
+    except archive.ArchiveError as e:
+        sys.exit(f"Import failed: {e}")
+    print(json.dumps(asdict(stats)))
+
+
+async def rebuild_feedback_stats(args) -> None:
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        prompts = await crud.rebuild_prompt_feedback_stats(db)
+    print(json.dumps({"prompts": prompts, "seconds": round(time.perf_counter() - started, 3)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="write all conversations to an NDJSON archive")
+    export_parser.add_argument("path", help="output file; gzip-compressed if it ends in .gz, '-' for stdout")
+    export_parser.set_defaults(handler=export_archive)
+
+    import_parser = commands.add_parser("import", help="load conversations from an NDJSON archive (plain or gzip)")
+    import_parser.add_argument("path", help="archive file, '-' for stdin")
+    import_parser.add_argument("--batch-rows", type=int, default=archive.IMPORT_BATCH_ROWS, help="rows per transaction")
+    import_parser.set_defaults(handler=import_archive)
+
+    rebuild_parser = commands.add_parser(
+        "rebuild-feedback-stats", help="recompute the per-prompt like/dislike counters from the messages"
+    )
+    rebuild_parser.set_defaults(handler=rebuild_feedback_stats)
+
+    args = parser.parse_args()
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
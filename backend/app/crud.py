@@ -1,104 +1,730 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, update, delete, func, text, tuple_, and_, or_, bindparam, case, false, DateTime
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, raiseload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import Dict, Iterable, List, Optional, Tuple
 import datetime
 
-from backend.app.models import Prompt, Conversation, Message
+from backend.app.models import (
+    Prompt, PromptBody, Conversation, Message, ResponseCacheEntry, CacheVersion, Job, PromptFeedbackStats, ChangeEvent,
+    ACTIVE_JOB_CONDITION, PROMPTS_CACHE_VERSION, SEARCH_TS_CONFIG, prompt_hash, utcnow,
+)
 
 # CRUD operations for Prompts
 
-def create_prompt(db: Session, name: str, content: str):
+async def create_prompt(db: AsyncSession, name: str, content: str):
     """Creates a new prompt in the database."""
     db_prompt = Prompt(name=name, content=content)
     db.add(db_prompt)
-    db.commit()
-    db.refresh(db_prompt)
+    await bump_cache_version(db, PROMPTS_CACHE_VERSION)
+    await db.commit()
     return db_prompt
 
-def get_prompt(db: Session, prompt_id: int):
+async def get_prompt(db: AsyncSession, prompt_id: int):
     """Retrieves a single prompt by its ID."""
-    return db.query(Prompt).filter(Prompt.id == prompt_id).first()
+    return await db.scalar(select(Prompt).filter(Prompt.id == prompt_id))
 
-def get_prompt_by_name(db: Session, name: str):
-    """Retrieves a single prompt by its name."""
-    return db.query(Prompt).filter(Prompt.name == name).first()
+async def get_all_prompts(db: AsyncSession):
+    """Retrieves every prompt, in id order."""
+    result = await db.scalars(select(Prompt).order_by(Prompt.id))
+    return result.all()
 
-def get_prompts(db: Session, skip: int = 0, limit: int = 100):
-    """Retrieves a list of prompts with pagination."""
-    return db.query(Prompt).offset(skip).limit(limit).all()
+async def get_prompts_by_ids(db: AsyncSession, prompt_ids: Iterable[int]):
+    """Retrieves the prompts with the given IDs (missing ones are left out), in id order."""
+    result = await db.scalars(select(Prompt).filter(Prompt.id.in_(set(prompt_ids))).order_by(Prompt.id))
+    return result.all()
 
-def update_prompt(db: Session, prompt_id: int, name: str = None, content: str = None):
+async def update_prompt(db: AsyncSession, prompt_id: int, name: str = None, content: str = None):
     """Updates an existing prompt. Returns the updated prompt or None if not found."""
-    db_prompt = db.query(Prompt).filter(Prompt.id == prompt_id).first()
+    db_prompt = await get_prompt(db, prompt_id)
     if db_prompt:
-        if name is not None: 
+        if name is not None:
             db_prompt.name = name
-        if content is not None: 
+        if content is not None:
             db_prompt.content = content
-        db.commit()
-        db.refresh(db_prompt)
+        await bump_cache_version(db, PROMPTS_CACHE_VERSION)
+        await db.commit()
     return db_prompt
 
-def delete_prompt(db: Session, prompt_id: int):
+async def delete_prompt(db: AsyncSession, prompt_id: int):
     """Deletes a prompt by its ID. Returns True if deleted, False otherwise."""
-    db_prompt = db.query(Prompt).filter(Prompt.id == prompt_id).first()
+    db_prompt = await get_prompt(db, prompt_id)
     if db_prompt:
-        db.delete(db_prompt)
-        db.commit()
+        await db.delete(db_prompt)
+        await bump_cache_version(db, PROMPTS_CACHE_VERSION)
+        await db.commit()
         return True
     return False
 
+# Cache version counters
+
+async def get_cache_version(db: AsyncSession, name: str) -> int:
+    """Retrieves the current value of a cache version counter (0 if it was never bumped)."""
+    return await db.scalar(select(CacheVersion.version).filter(CacheVersion.name == name)) or 0
+
+async def bump_cache_version(db: AsyncSession, name: str):
+    """Increments a cache version counter as part of the caller's transaction. Does not commit."""
+    await db.execute(
+        update(CacheVersion).filter(CacheVersion.name == name).values(version=CacheVersion.version + 1)
+    )
+
+# CRUD operations for prompt bodies
+
+def _dialect_insert(db: AsyncSession):
+    """The dialect's INSERT construct, which supports ON CONFLICT on both backends."""
+    return (postgresql if db.bind.dialect.name == "postgresql" else sqlite).insert
+
+async def store_prompt_bodies(db: AsyncSession, bodies: Dict[str, str]):
+    """Stores prompt texts, given as {prompt_hash: content}, that are not stored yet. Does not commit."""
+    if not bodies:
+        return
+    table = PromptBody.__table__
+    now = utcnow()
+    await db.execute(
+        _dialect_insert(db)(table).on_conflict_do_nothing(index_elements=[table.c.hash]),
+        # In hash order, so concurrent transactions storing the same texts cannot deadlock
+        [{"hash": key, "content": bodies[key], "created_at": now} for key in sorted(bodies)],
+    )
+
+async def get_or_create_prompt_body(db: AsyncSession, content: str):
+    """Returns the stored body of a prompt text, storing it first if it is new. Does not commit."""
+    key = prompt_hash(content)
+    await store_prompt_bodies(db, {key: content})
+    return await db.get(PromptBody, key)
+
+async def get_prompt_body(db: AsyncSession, prompt_hash: str):
+    """Retrieves a stored prompt text by its hash."""
+    return await db.get(PromptBody, prompt_hash)
+
 # CRUD operations for Conversations
 
-def create_conversation(db: Session, system_prompt_used: str):
-    """Creates a new conversation in the database."""
-    db_conversation = Conversation(system_prompt_used=system_prompt_used)
+async def create_conversation(db: AsyncSession, system_prompt_used: str, response_cache_bypass: bool = False):
+    """Creates a new conversation in the database, referencing the stored body of its system prompt."""
+    # A new conversation has no messages; setting the collection up front means
+    # serializing it never needs a lazy load, which AsyncSession does not allow.
+    db_conversation = Conversation(
+        prompt_body=await get_or_create_prompt_body(db, system_prompt_used),
+        response_cache_bypass=response_cache_bypass,
+        messages=[],
+    )
     db.add(db_conversation)
-    db.commit()
-    db.refresh(db_conversation)
+    await db.commit()
     return db_conversation
 
-def get_conversation(db: Session, conversation_id: int):
+async def get_conversation(db: AsyncSession, conversation_id: int):
     """Retrieves a single conversation by its ID."""
-    return db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    return await db.scalar(select(Conversation).filter(Conversation.id == conversation_id))
+
+def _newest_first_page(query, before: Optional[Tuple[datetime.datetime, int]], limit: int):
+    """Orders conversations newest first and applies a (created_at, id) keyset cursor."""
+    if before is not None:
+        query = query.where(tuple_(Conversation.created_at, Conversation.id) < tuple_(*before))
+    return query.order_by(Conversation.created_at.desc(), Conversation.id.desc()).limit(limit)
 
-def get_conversations(db: Session, skip: int = 0, limit: int = 100):
-    """Retrieves a list of conversations with pagination."""
-    return db.query(Conversation).order_by(Conversation.created_at.desc()).offset(skip).limit(limit).all()
+async def get_conversations(db: AsyncSession, before: Optional[Tuple[datetime.datetime, int]] = None, limit: int = 100, include_system_prompt: bool = True):
+    """Retrieves a page of conversations, newest first, with their messages eagerly loaded.
 
-def delete_conversation(db: Session, conversation_id: int):
+    `before` is the (created_at, id) of the last conversation on the previous page.
+    Without `include_system_prompt` the prompt bodies are not loaded, and
+    `system_prompt_used` is None on the returned conversations.
+    """
+    query = select(Conversation).options(selectinload(Conversation.messages))
+    if not include_system_prompt:
+        query = query.options(raiseload(Conversation.prompt_body))
+    result = await db.scalars(_newest_first_page(query, before, limit))
+    return result.all()
+
+async def get_conversation_summaries(db: AsyncSession, before: Optional[Tuple[datetime.datetime, int]] = None, limit: int = 50, preview_chars: int = 80):
+    """Retrieves a page of lightweight conversation summaries, newest first, in a single query.
+
+    Each row has id, created_at, system_prompt_preview, message_count,
+    last_message_preview and last_activity. Message statistics are correlated
+    subqueries, so only the conversations on the page are aggregated.
+    """
+    message_count = (
+        select(func.count(Message.id))
+        .where(Message.conversation_id == Conversation.id)
+        .scalar_subquery()
+    )
+    last_message = (
+        select(Message)
+        .where(Message.conversation_id == Conversation.id)
+        .order_by(Message.timestamp.desc(), Message.id.desc())
+        .limit(1)
+    )
+    last_message_preview = last_message.with_only_columns(func.substr(Message.content, 1, preview_chars)).scalar_subquery()
+    last_message_at = last_message.with_only_columns(Message.timestamp).scalar_subquery()
+    query = select(
+        Conversation.id,
+        Conversation.created_at,
+        func.substr(PromptBody.content, 1, preview_chars).label("system_prompt_preview"),
+        message_count.label("message_count"),
+        last_message_preview.label("last_message_preview"),
+        func.coalesce(last_message_at, Conversation.created_at).label("last_activity"),
+    ).join(PromptBody, PromptBody.hash == Conversation.system_prompt_hash)
+    result = await db.execute(_newest_first_page(query, before, limit))
+    return result.all()
+
+async def update_conversation_summary(db: AsyncSession, conversation_id: int, summary: str, upto_message_id: int, expected_upto_message_id: int = None):
+    """Stores a new rolling summary, unless another update replaced the expected one first.
+
+    Returns True if the summary was stored.
+    """
+    if expected_upto_message_id is None:
+        unchanged = Conversation.summary_upto_message_id.is_(None)
+    else:
+        unchanged = Conversation.summary_upto_message_id == expected_upto_message_id
+    result = await db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id, unchanged)
+        .values(summary=summary, summary_upto_message_id=upto_message_id)
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+async def set_conversation_response_cache_bypass(db: AsyncSession, conversation_id: int, bypass: bool):
+    """Turns the response cache off (or back on) for one conversation."""
+    db_conversation = await get_conversation(db, conversation_id)
+    if db_conversation:
+        db_conversation.response_cache_bypass = bypass
+        await db.commit()
+    return db_conversation
+
+async def delete_conversation(db: AsyncSession, conversation_id: int):
     """Deletes a conversation by its ID. Returns True if deleted, False otherwise."""
-    db_conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    # Messages are loaded with the conversation so the delete-orphan cascade can remove them
+    db_conversation = await db.scalar(
+        select(Conversation)
+        .options(selectinload(Conversation.messages))
+        .filter(Conversation.id == conversation_id)
+    )
     if db_conversation:
-        db.delete(db_conversation)
-        db.commit()
+        # Take the deleted messages' feedback out of the prompt's counters
+        likes = sum(1 for message in db_conversation.messages if message.liked)
+        dislikes = sum(1 for message in db_conversation.messages if message.disliked)
+        await add_prompt_feedback(db, {db_conversation.system_prompt_hash: (-likes, -dislikes)})
+        await db.delete(db_conversation)
+        await db.commit()
         return True
     return False
 
 # CRUD operations for Messages
 
-def create_message(db: Session, conversation_id: int, sender: str, content: str):
-    """Creates a new message in the database for a given conversation."""
+def add_message(db: AsyncSession, conversation_id: int, sender: str, content: str, timestamp: datetime.datetime = None):
+    """Stages a new message in the session without flushing or committing it.
+
+    Lets a caller write several rows (e.g. both messages of a chat turn) and
+    commit them together in one transaction.
+    """
     db_message = Message(conversation_id=conversation_id, sender=sender, content=content)
+    if timestamp is not None:
+        db_message.timestamp = timestamp
     db.add(db_message)
-    db.commit()
-    db.refresh(db_message)
     return db_message
 
-def get_messages_for_conversation(db: Session, conversation_id: int, skip: int = 0, limit: int = 100):
-    """Retrieves messages for a specific conversation with pagination."""
-    return db.query(Message).filter(Message.conversation_id == conversation_id).order_by(Message.timestamp.asc()).offset(skip).limit(limit).all()
+async def bulk_insert_messages(db: AsyncSession, rows: Iterable[dict]):
+    """Inserts many messages with one executemany statement, without building ORM objects.
 
-def update_message_feedback(db: Session, message_id: int, liked: bool = None, disliked: bool = None):
-    """Updates the liked/disliked status of a message."""
-    db_message = db.query(Message).filter(Message.id == message_id).first()
-    if db_message:
+    Each row is a dict of Message column values (conversation_id, sender and
+    content are required). Does not commit; callers batch rows into large
+    transactions. Returns the number of rows inserted.
+    """
+    rows = list(rows)
+    if rows:
+        # A Core insert of the table skips the ORM's per-row bulk-insert bookkeeping
+        await db.execute(insert(Message.__table__), rows)
+    return len(rows)
+
+async def get_message(db: AsyncSession, message_id: int):
+    """Retrieves a single message by its ID."""
+    return await db.scalar(select(Message).filter(Message.id == message_id))
+
+async def get_messages_for_conversation(
+    db: AsyncSession,
+    conversation_id: int,
+    before: Optional[Tuple[datetime.datetime, int]] = None,
+    after: Optional[Tuple[datetime.datetime, int]] = None,
+    limit: int = 100,
+):
+    """Retrieves a page of messages for a conversation, oldest first within the page.
+
+    Pages are keyed on (timestamp, id) rather than offsets, so each page is a
+    bounded range scan of the conversation's index. With `after`, returns the
+    messages following that position; with `before` (or no cursor at all),
+    returns the latest messages preceding it.
+    """
+    query = select(Message).filter(Message.conversation_id == conversation_id)
+    position = tuple_(Message.timestamp, Message.id)
+    if after is not None:
+        result = await db.scalars(
+            query.where(position > tuple_(*after))
+            .order_by(Message.timestamp.asc(), Message.id.asc())
+            .limit(limit)
+        )
+        return result.all()
+    if before is not None:
+        query = query.where(position < tuple_(*before))
+    result = await db.scalars(query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit))
+    return list(reversed(result.all()))
+
+async def get_conversation_history(db: AsyncSession, conversation_id: int, since_id: Optional[int] = None):
+    """Retrieves (id, sender, content) for every message in a conversation, oldest first.
+
+    With `since_id`, only that message and the ones following it are returned;
+    nothing if it is not (or no longer) in the conversation.
+    """
+    query = (
+        select(Message.id, Message.sender, Message.content)
+        .filter(Message.conversation_id == conversation_id)
+        .order_by(Message.timestamp.asc(), Message.id.asc())
+    )
+    if since_id is not None:
+        cursor = aliased(Message)
+        query = query.join(cursor, and_(cursor.id == since_id, cursor.conversation_id == conversation_id)).where(
+            tuple_(Message.timestamp, Message.id) >= tuple_(cursor.timestamp, cursor.id)
+        )
+    result = await db.execute(query)
+    return result.all()
+
+async def apply_message_feedback(db: AsyncSession, db_message: Message, liked: bool = None, disliked: bool = None):
+    """Updates the liked/disliked status of an already loaded message and commits it.
+
+    The conversation's prompt feedback counters move by the change in the same
+    commit. The message is only updated if its status is still the one loaded
+    (otherwise it is re-read and the change applied again), so concurrent
+    toggles each move the counters exactly once.
+    """
+    old_liked, old_disliked = bool(db_message.liked), bool(db_message.disliked)
+    while True:
+        new_liked, new_disliked = old_liked, old_disliked
         if liked is not None:
-            db_message.liked = liked
+            new_liked = liked
             if liked: # If liked, ensure not disliked
-                db_message.disliked = False
+                new_disliked = False
         if disliked is not None:
-            db_message.disliked = disliked
+            new_disliked = disliked
             if disliked: # If disliked, ensure not liked
-                db_message.liked = False
-        db.commit()
-        db.refresh(db_message)
+                new_liked = False
+        if (new_liked, new_disliked) == (old_liked, old_disliked):
+            break
+        result = await db.execute(
+            update(Message)
+            .where(
+                Message.id == db_message.id,
+                func.coalesce(Message.liked, false()) == old_liked,
+                func.coalesce(Message.disliked, false()) == old_disliked,
+            )
+            .values(liked=new_liked, disliked=new_disliked)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            system_prompt_hash = await db.scalar(
+                select(Conversation.system_prompt_hash).filter(Conversation.id == db_message.conversation_id)
+            )
+            await add_prompt_feedback(
+                db, {system_prompt_hash: (int(new_liked) - int(old_liked), int(new_disliked) - int(old_disliked))}
+            )
+            old_liked, old_disliked = new_liked, new_disliked
+            break
+        # Changed by a concurrent request since it was loaded (or deleted)
+        current = (await db.execute(select(Message.liked, Message.disliked).filter(Message.id == db_message.id))).first()
+        if current is None:
+            break
+        old_liked, old_disliked = bool(current.liked), bool(current.disliked)
+    await db.commit()
+    set_committed_value(db_message, "liked", old_liked)
+    set_committed_value(db_message, "disliked", old_disliked)
     return db_message
+
+# Marks placed around matched terms in search snippets; replaced after HTML-escaping
+SEARCH_MATCH_START = "\x02"
+SEARCH_MATCH_END = "\x03"
+
+def _fts5_query(query: str) -> str:
+    """Turns free text into an FTS5 query matching all of its words.
+
+    Each word is quoted, so characters that mean something in FTS5 syntax
+    (quotes, parentheses, AND/OR/NEAR, column filters) are searched literally.
+    """
+    return " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+async def search_messages(db: AsyncSession, query: str, conversation_id: int = None, sender: str = None, skip: int = 0, limit: int = 20):
+    """Full-text searches message content, best matches first.
+
+    Returns rows of (id, conversation_id, sender, timestamp, snippet, score), where
+    the snippet marks matched terms with SEARCH_MATCH_START/SEARCH_MATCH_END and a
+    higher score is a better match. Uses the FTS5 table on SQLite and the tsvector
+    index on PostgreSQL.
+    """
+    params = {"query": query, "skip": skip, "limit": limit}
+    filters = ""
+    if conversation_id is not None:
+        filters += " AND m.conversation_id = :conversation_id"
+        params["conversation_id"] = conversation_id
+    if sender is not None:
+        filters += " AND m.sender = :sender"
+        params["sender"] = sender
+
+    if db.bind.dialect.name == "postgresql":
+        statement = text(f"""
+            SELECT m.id, m.conversation_id, m.sender, m.timestamp,
+                   ts_headline('{SEARCH_TS_CONFIG}', m.content, q,
+                               'StartSel=' || chr(2) || ', StopSel=' || chr(3) || ', MaxWords=30, MinWords=10, MaxFragments=2') AS snippet,
+                   ts_rank_cd(to_tsvector('{SEARCH_TS_CONFIG}', m.content), q) AS score
+            FROM messages AS m, websearch_to_tsquery('{SEARCH_TS_CONFIG}', :query) AS q
+            WHERE to_tsvector('{SEARCH_TS_CONFIG}', m.content) @@ q{filters}
+            ORDER BY score DESC, m.id DESC
+            LIMIT :limit OFFSET :skip
+        """)
+    else:
+        params["query"] = _fts5_query(query)
+        # bm25() is lower for better matches; it is negated so higher is better on both backends
+        statement = text(f"""
+            SELECT m.id, m.conversation_id, m.sender, m.timestamp,
+                   snippet(messages_fts, 0, char(2), char(3), '…', 24) AS snippet,
+                   -bm25(messages_fts) AS score
+            FROM messages_fts JOIN messages AS m ON m.id = messages_fts.rowid
+            WHERE messages_fts MATCH :query{filters}
+            ORDER BY bm25(messages_fts), m.id DESC
+            LIMIT :limit OFFSET :skip
+        """)
+    statement = statement.columns(timestamp=DateTime(timezone=True))
+    result = await db.execute(statement, params)
+    return result.all()
+
+# Bulk export and import (see services/archive.py)
+
+# Rows fetched per round trip by the export cursors
+EXPORT_FETCH_ROWS = 1000
+
+async def stream_conversations_for_export(db: AsyncSession):
+    """Streams every conversation in id order from a server-side cursor.
+
+    Rows carry `summary_message_count`, the number of messages folded into the
+    summary, which stays meaningful when messages get new ids on import.
+    """
+    summary_message_count = case(
+        (
+            Conversation.summary_upto_message_id.is_not(None),
+            select(func.count(Message.id))
+            .where(Message.conversation_id == Conversation.id, Message.id <= Conversation.summary_upto_message_id)
+            .scalar_subquery(),
+        ),
+        else_=None,
+    )
+    return await db.stream(
+        select(
+            Conversation.id,
+            PromptBody.content.label("system_prompt_used"),
+            Conversation.created_at,
+            Conversation.summary,
+            summary_message_count.label("summary_message_count"),
+            Conversation.response_cache_bypass,
+        )
+        .join(PromptBody, PromptBody.hash == Conversation.system_prompt_hash)
+        .order_by(Conversation.id)
+        .execution_options(yield_per=EXPORT_FETCH_ROWS)
+    )
+
+async def stream_messages_for_export(db: AsyncSession):
+    """Streams every message grouped by conversation, oldest first, from a server-side cursor."""
+    return await db.stream(
+        select(
+            Message.conversation_id,
+            Message.sender,
+            Message.content,
+            Message.timestamp,
+            Message.liked,
+            Message.disliked,
+        )
+        .order_by(Message.conversation_id, Message.timestamp, Message.id)
+        .execution_options(yield_per=EXPORT_FETCH_ROWS)
+    )
+
+async def bulk_insert_conversations(db: AsyncSession, rows: List[dict]) -> List[int]:
+    """Inserts many conversations in one statement and returns their new ids, in row order.
+
+    Rows reference their system prompt by `system_prompt_hash`; the bodies must be
+    stored already (see store_prompt_bodies). Does not commit.
+    """
+    if not rows:
+        return []
+    result = await db.scalars(
+        insert(Conversation).returning(Conversation.id, sort_by_parameter_order=True), rows
+    )
+    return result.all()
+
+async def set_summary_positions(db: AsyncSession, positions: Iterable[Tuple[int, int]]):
+    """Points summaries at the n-th message of their conversation, for (conversation_id, n) pairs.
+
+    Used after an import, where messages have new ids. Does not commit.
+    """
+    params = [{"cid": conversation_id, "offset": count - 1} for conversation_id, count in positions if count > 0]
+    if not params:
+        return
+    upto_message_id = (
+        select(Message.id)
+        .where(Message.conversation_id == bindparam("cid"))
+        .order_by(Message.timestamp, Message.id)
+        .offset(bindparam("offset"))
+        .limit(1)
+        .scalar_subquery()
+    )
+    # A Core update of the table, since an ORM update with a parameter list is a bulk update by primary key
+    await db.execute(
+        update(Conversation.__table__)
+        .where(Conversation.__table__.c.id == bindparam("cid"))
+        .values(summary_upto_message_id=upto_message_id),
+        params,
+    )
+
+# CRUD operations for the response cache (on-disk tier)
+
+async def get_cached_response(db: AsyncSession, key: str, created_after: datetime.datetime):
+    """Retrieves a cached response by key, unless it was stored before `created_after`."""
+    return await db.scalar(
+        select(ResponseCacheEntry).filter(
+            ResponseCacheEntry.key == key, ResponseCacheEntry.created_at > created_after
+        )
+    )
+
+async def put_cached_response(db: AsyncSession, key: str, model: str, response: str, model_latency_ms: float):
+    """Stores (or replaces) a cached response."""
+    await db.merge(ResponseCacheEntry(
+        key=key, model=model, response=response, model_latency_ms=model_latency_ms, created_at=utcnow()
+    ))
+    await db.commit()
+
+async def prune_response_cache(db: AsyncSession, created_before: datetime.datetime, max_entries: int):
+    """Deletes expired cached responses, then the oldest ones beyond `max_entries`.
+
+    Returns the number of entries deleted.
+    """
+    deleted = (await db.execute(
+        delete(ResponseCacheEntry).filter(ResponseCacheEntry.created_at <= created_before)
+    )).rowcount
+    # Everything older than the max_entries-th newest entry goes
+    cutoff = await db.scalar(
+        select(ResponseCacheEntry.created_at)
+        .order_by(ResponseCacheEntry.created_at.desc())
+        .offset(max_entries)
+        .limit(1)
+    )
+    if cutoff is not None:
+        deleted += (await db.execute(
+            delete(ResponseCacheEntry).filter(ResponseCacheEntry.created_at <= cutoff)
+        )).rowcount
+    await db.commit()
+    return deleted
+
+# CRUD operations for background jobs (see services/job_queue.py)
+
+async def create_job(db: AsyncSession, kind: str, payload: str, max_attempts: int, dedupe_key: str = None, owner: str = None, run_after: datetime.datetime = None):
+    """Stores a new pending job and commits it.
+
+    With a `dedupe_key`, returns None instead if a pending or running job already has that key.
+    The unique index on active keys decides, so of concurrent enqueues exactly one succeeds.
+    """
+    values = {"kind": kind, "payload": payload, "max_attempts": max_attempts, "dedupe_key": dedupe_key, "owner": owner}
+    if run_after is not None:
+        values["run_after"] = run_after
+    statement = _dialect_insert(db)(Job).values(**values)
+    if dedupe_key is not None:
+        statement = statement.on_conflict_do_nothing(
+            index_elements=[Job.dedupe_key], index_where=text(ACTIVE_JOB_CONDITION)
+        )
+    db_job = await db.scalar(statement.returning(Job))
+    await db.commit()
+    return db_job
+
+async def get_job(db: AsyncSession, job_id: int):
+    """Retrieves a single job by its ID."""
+    return await db.scalar(select(Job).filter(Job.id == job_id))
+
+def _runnable(now: datetime.datetime):
+    # Due pending jobs, and running jobs whose worker let the lease expire (e.g. it crashed)
+    return or_(
+        and_(Job.status == "pending", Job.run_after <= now),
+        and_(Job.status == "running", Job.locked_until < now),
+    )
+
+async def claim_job(db: AsyncSession, job_id: int, now: datetime.datetime, locked_until: datetime.datetime):
+    """Marks a runnable job as running under a lease and returns it, or None if it is not runnable.
+
+    The check and the update are one statement, so two workers never both claim a job.
+    """
+    db_job = await db.scalar(
+        update(Job)
+        .where(Job.id == job_id, _runnable(now))
+        .values(status="running", attempts=Job.attempts + 1, started_at=now, locked_until=locked_until)
+        .returning(Job)
+    )
+    await db.commit()
+    return db_job
+
+async def get_runnable_job_ids(db: AsyncSession, now: datetime.datetime, owner: str, orphaned_before: datetime.datetime, limit: int):
+    """Retrieves the ids of runnable jobs, oldest due first.
+
+    Jobs holding secrets in another process are left to it, unless they were
+    enqueued before `orphaned_before` (that process is presumably gone).
+    """
+    result = await db.scalars(
+        select(Job.id)
+        .where(
+            _runnable(now),
+            or_(Job.owner.is_(None), Job.owner == owner, Job.created_at < orphaned_before),
+        )
+        .order_by(Job.run_after)
+        .limit(limit)
+    )
+    return result.all()
+
+async def finish_job(db: AsyncSession, job_id: int, status: str, error: str = None, run_after: datetime.datetime = None):
+    """Records the outcome of an attempt: 'done', 'failed', or 'pending' again for a retry at `run_after`."""
+    values = {"status": status, "last_error": error, "locked_until": None}
+    if status == "pending":
+        values["run_after"] = run_after
+    else:
+        values["finished_at"] = utcnow()
+    await db.execute(update(Job).filter(Job.id == job_id).values(**values))
+    await db.commit()
+
+async def release_jobs(db: AsyncSession, job_ids: List[int]):
+    """Returns interrupted running jobs to pending, without counting the interrupted attempt."""
+    if job_ids:
+        await db.execute(
+            update(Job)
+            .filter(Job.id.in_(job_ids), Job.status == "running")
+            .values(status="pending", attempts=Job.attempts - 1, locked_until=None)
+        )
+        await db.commit()
+
+async def get_job_counts(db: AsyncSession):
+    """Returns the number of jobs per status and the creation time of the oldest pending job."""
+    counts = dict((await db.execute(select(Job.status, func.count(Job.id)).group_by(Job.status))).all())
+    oldest_pending = await db.scalar(select(func.min(Job.created_at)).filter(Job.status == "pending"))
+    return counts, oldest_pending
+
+async def prune_jobs(db: AsyncSession, finished_before: datetime.datetime):
+    """Deletes finished (done or failed) jobs older than `finished_before`. Returns how many were deleted."""
+    deleted = (await db.execute(
+        delete(Job).filter(Job.status.in_(("done", "failed")), Job.finished_at < finished_before)
+    )).rowcount
+    await db.commit()
+    return deleted
+
+# CRUD operations for the change feed
+
+async def add_change_events(db: AsyncSession, origin: str, payloads: List[str]):
+    """Appends serialized change events to the outbox in one transaction."""
+    if payloads:
+        now = utcnow()
+        await db.execute(insert(ChangeEvent), [{"origin": origin, "payload": payload, "created_at": now} for payload in payloads])
+        await db.commit()
+
+async def get_latest_change_event_id(db: AsyncSession) -> int:
+    """Returns the id of the newest change event (0 if there is none)."""
+    return await db.scalar(select(func.max(ChangeEvent.id))) or 0
+
+async def get_change_events(db: AsyncSession, after_id: int, also_ids: Iterable[int] = (), skip_origin: str = None, limit: int = 500):
+    """Returns (id, payload) of the events after `after_id` plus those in `also_ids`, oldest first.
+
+    The payloads of events published by `skip_origin` come back as None: the caller
+    delivered those already and only needs their ids.
+    """
+    also_ids = list(also_ids)
+    condition = ChangeEvent.id > after_id
+    if also_ids:
+        condition = or_(condition, ChangeEvent.id.in_(also_ids))
+    payload = ChangeEvent.payload if skip_origin is None else case((ChangeEvent.origin == skip_origin, None), else_=ChangeEvent.payload)
+    result = await db.execute(select(ChangeEvent.id, payload).filter(condition).order_by(ChangeEvent.id).limit(limit))
+    return result.all()
+
+async def prune_change_events(db: AsyncSession, created_before: datetime.datetime):
+    """Deletes change events older than `created_before`. Returns how many were deleted."""
+    deleted = (await db.execute(delete(ChangeEvent).filter(ChangeEvent.created_at < created_before))).rowcount
+    await db.commit()
+    return deleted
+
+# CRUD operations for prompt feedback analytics
+
+async def add_prompt_feedback(db: AsyncSession, deltas: Dict[str, Tuple[int, int]]):
+    """Adds (likes, dislikes) deltas to the feedback counters of each prompt, keyed by prompt hash. Does not commit.
+
+    Counters of a prompt seen for the first time start at zero.
+    """
+    now = utcnow()
+    # In hash order, so two transactions updating the same prompts cannot deadlock
+    rows = [
+        {"prompt_hash": key, "likes": deltas[key][0], "dislikes": deltas[key][1], "updated_at": now}
+        for key in sorted(deltas) if any(deltas[key])
+    ]
+    if not rows:
+        return
+    table = PromptFeedbackStats.__table__
+    upsert = _dialect_insert(db)(table)
+    await db.execute(
+        upsert.on_conflict_do_update(
+            index_elements=[table.c.prompt_hash],
+            set_={
+                "likes": table.c.likes + upsert.excluded.likes,
+                "dislikes": table.c.dislikes + upsert.excluded.dislikes,
+                "updated_at": upsert.excluded.updated_at,
+            },
+        ),
+        rows,
+    )
+
+async def rebuild_prompt_feedback_stats(db: AsyncSession):
+    """Recomputes every prompt's feedback counters from the messages and commits. Returns the number of prompts."""
+    if db.bind.dialect.name == "postgresql":
+        # Feedback changes committed from here on wait for the rebuild and are added on top of it
+        await db.execute(text("LOCK TABLE prompt_feedback_stats IN SHARE ROW EXCLUSIVE MODE"))
+    # Deleting first takes SQLite's write lock before the messages are read
+    await db.execute(delete(PromptFeedbackStats))
+    result = await db.execute(
+        select(
+            Conversation.system_prompt_hash,
+            func.sum(case((Message.liked, 1), else_=0)),
+            func.sum(case((Message.disliked, 1), else_=0)),
+        )
+        .join(Message, Message.conversation_id == Conversation.id)
+        .filter(or_(Message.liked, Message.disliked))
+        .group_by(Conversation.system_prompt_hash)
+    )
+    deltas = {key: (likes, dislikes) for key, likes, dislikes in result.all()}
+    await add_prompt_feedback(db, deltas)
+    await db.commit()
+    return len(deltas)
+
+def _prompt_feedback_query(system_prompt):
+    return select(
+        PromptFeedbackStats.prompt_hash,
+        system_prompt,
+        PromptFeedbackStats.likes,
+        PromptFeedbackStats.dislikes,
+        PromptFeedbackStats.updated_at,
+    ).join(PromptBody, PromptBody.hash == PromptFeedbackStats.prompt_hash)
+
+async def get_prompt_feedback_stats(db: AsyncSession, order_by: str = "dislikes", skip: int = 0, limit: int = 20, preview_chars: int = 120):
+    """Retrieves the feedback counters of a page of prompts, ranked by `order_by` ('likes' or 'dislikes').
+
+    Rows have prompt_hash, system_prompt_preview, likes, dislikes and updated_at.
+    """
+    column = PromptFeedbackStats.likes if order_by == "likes" else PromptFeedbackStats.dislikes
+    result = await db.execute(
+        _prompt_feedback_query(func.substr(PromptBody.content, 1, preview_chars).label("system_prompt_preview"))
+        .order_by(column.desc(), PromptFeedbackStats.prompt_hash)
+        .offset(skip)
+        .limit(limit)
+    )
+    return result.all()
+
+async def get_prompt_feedback(db: AsyncSession, prompt_hash: str):
+    """Retrieves the feedback counters and full system prompt of one prompt by its hash."""
+    result = await db.execute(
+        _prompt_feedback_query(PromptBody.content.label("system_prompt"))
+        .filter(PromptFeedbackStats.prompt_hash == prompt_hash)
+    )
+    return result.first()
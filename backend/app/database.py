@@ -1,34 +1,139 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+
+from backend.app.config import Settings, settings
+
+# PostgreSQL is driven by psycopg 3, which provides both the sync and the async dialect
+_SYNC_DRIVERS = {"postgresql": "postgresql+psycopg", "postgres": "postgresql+psycopg"}
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+psycopg",
+    "postgres": "postgresql+psycopg",
+    "postgresql+psycopg": "postgresql+psycopg",
+}
+
+
+def to_sync_url(url: str) -> str:
+    """Returns the database URL with an explicit synchronous driver."""
+    parsed = make_url(url)
+    parsed = parsed.set(drivername=_SYNC_DRIVERS.get(parsed.drivername, parsed.drivername))
+    return parsed.render_as_string(hide_password=False)
+
+
+def to_async_url(url: str) -> str:
+    """Returns the same database URL with the async driver used by the request path."""
+    parsed = make_url(url)
+    parsed = parsed.set(drivername=_ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername))
+    return parsed.render_as_string(hide_password=False)
+
+
+# Database URL, configurable through the DATABASE_URL setting
+SQLALCHEMY_DATABASE_URL = to_sync_url(settings.database_url)
+
+
+def apply_sqlite_pragmas(engine, config: Settings) -> None:
+    """Applies the configured SQLite storage profile to every new connection of an engine."""
+    if engine.dialect.name != "sqlite" or config.sqlite_profile != "production":
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={config.sqlite_journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={config.sqlite_synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={int(config.sqlite_busy_timeout_ms)}")
+        cursor.execute(f"PRAGMA mmap_size={int(config.sqlite_mmap_size)}")
+        # A negative cache_size is a size in KiB rather than a page count
+        cursor.execute(f"PRAGMA cache_size=-{int(config.sqlite_cache_size_kib)}")
+        cursor.close()
+
+
+def create_app_engine(config: Settings = settings):
+    """Creates the synchronous engine for the configured database."""
+    url = to_sync_url(config.database_url)
+    connect_args = {}
+    if make_url(url).get_backend_name() == "sqlite":
+        # connect_args={'check_same_thread': False} is needed for SQLite to allow multiple threads
+        # to interact with the database, which is common in web applications.
+        connect_args["check_same_thread"] = False
+    sync_engine = create_engine(url, connect_args=connect_args, pool_pre_ping=config.db_pool_pre_ping)
+    apply_sqlite_pragmas(sync_engine, config)
+    return sync_engine
+
+
+def create_app_async_engine(config: Settings = settings):
+    """Creates the async engine for the configured database, with the configured pool."""
+    new_engine = create_async_engine(
+        to_async_url(config.database_url),
+        pool_size=config.db_pool_size,
+        max_overflow=config.db_max_overflow,
+        pool_timeout=config.db_pool_timeout,
+        pool_recycle=config.db_pool_recycle,
+        pool_pre_ping=config.db_pool_pre_ping,
+    )
+    apply_sqlite_pragmas(new_engine.sync_engine, config)
+    return new_engine
 
-# SQLite database URL
-SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db"
 
 # Create the SQLAlchemy engine
-# connect_args={'check_same_thread': False} is needed for SQLite to allow multiple threads
-# to interact with the database, which is common in web applications.
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+engine = create_app_engine()
 
 # Create a SessionLocal class
-# This class will be an actual database session for a single request.
+# Synchronous sessions are kept for schema management and offline scripts.
 # The `autocommit=False` and `autoflush=False` settings ensure that
 # changes are not committed until explicitly told to, and objects are not
 # flushed to the database automatically.
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine and session factory used by the API endpoints.
+# Queries and commits are awaited, so they no longer block the event loop while
+# other requests are streaming or waiting on the AI model.
+# `expire_on_commit=False` keeps loaded attributes usable after a commit; with an
+# AsyncSession an expired attribute cannot be lazily reloaded on access.
+async_engine = create_app_async_engine()
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+# Number of committed transactions that wrote to the database, across all sessions in
+# this process. Read-only transactions are not counted, so the difference over a chat
+# turn is the number of durable commits (fsyncs on SQLite) that turn cost.
+commit_stats = {"write_commits": 0}
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _mark_transaction_dirty(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_statement_write(orm_execute_state):
+    # Bulk insert()/update()/delete() statements bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _count_write_commit(session):
+    if session.info.pop("wrote", False):
+        commit_stats["write_commits"] += 1
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_write_mark(session):
+    session.info.pop("wrote", None)
+
+
 # Create a Base class for declarative models
 # This is the base class that our SQLAlchemy models will inherit from.
 Base = declarative_base()
 
 # Dependency to get a database session
-# This function will be used with FastAPI's Depends to inject a database session
+# This function will be used with FastAPI's Depends to inject an async database session
 # into our path operations. It ensures that the session is properly closed
 # after the request is finished.
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
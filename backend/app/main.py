@@ -1,19 +1,41 @@
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, Response
+from contextlib import asynccontextmanager
 from pathlib import Path # Import Path
+import asyncio
 
-from backend.app import models
-from backend.app.database import engine
+from backend.app.api import analytics
 from backend.app.api import chat # Import the chat router
+from backend.app.api import evaluations
+from backend.app.api import jobs
 from backend.app.api import prompts # Will be imported when prompts API is created
+from backend.app.services.change_feed import change_feed
+from backend.app.services.job_queue import job_queue
+from backend.app.services.metrics import MetricsMiddleware, mark_process_dead, render_latest
+from backend.app.services.static_assets import StaticAssets
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start the background job workers at once, so jobs left pending by a previous
+    # run are picked up without waiting for the first enqueue
+    job_queue.start()
+    yield
+    # Jobs interrupted mid-run go back to pending and are resumed on the next start
+    await job_queue.stop()
+    # Write out change events still queued, so other workers' clients get them
+    await change_feed.stop()
+    # Gauges such as jobs_running no longer count this worker
+    mark_process_dead()
+
 
 # Initialize FastAPI app
 app = FastAPI(
     title="PromptCraft AI Chat Backend",
     description="API for managing AI chat conversations and system prompts.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configure CORS middleware
@@ -26,28 +48,66 @@ app.add_middleware(
     allow_headers=["*"], # Allow all headers
 )
 
-# Event handler for application startup
-@app.on_event("startup")
-def on_startup():
-    """Create database tables on application startup."""
-    # This will create all tables defined in models.py if they don't already exist.
-    models.Base.metadata.create_all(bind=engine)
+# Record per-route request latency histograms, exposed on /metrics
+app.add_middleware(MetricsMiddleware)
+
+# The database schema is managed by Alembic migrations (`alembic upgrade head`, run by
+# startup.sh before the server starts) rather than created here, so schema changes
+# keep existing data and several workers never race to create tables.
 
-# Serve static files (like CSS, JS) from the 'static' directory within the 'frontend' folder
-app.mount("/static", StaticFiles(directory=Path(__file__).parent.parent.parent / "frontend" / "static"), name="static")
+# Load the frontend (index.html and the CSS/JS under 'static') into memory once, with
+# content-hashed asset URLs and precompressed gzip/brotli variants
+frontend_dir = Path(__file__).parent.parent.parent / "frontend"
+static_assets = StaticAssets(frontend_dir / "static", frontend_dir / "index.html").load()
 
 # Include API routers
 # This registers the endpoints defined in chat.py (and prompts.py when it's ready)
 app.include_router(chat.router, prefix="/api")
 app.include_router(prompts.router, prefix="/api") # Uncomment when prompts API is ready
+app.include_router(jobs.router, prefix="/api")
+app.include_router(analytics.router, prefix="/api")
+app.include_router(evaluations.router, prefix="/api")
+
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Serves the application metrics in the Prometheus text format."""
+    content, content_type = render_latest()
+    return Response(content=content, media_type=content_type)
+
+# Live updates for the frontend: small JSON events (message.created, message.feedback,
+# conversation.created/deleted, prompt.created/updated/deleted, resync) pushed to every
+# open tab, so pages patch what they show instead of refetching whole lists
+@app.websocket("/ws")
+async def change_events(websocket: WebSocket):
+    """Streams change events to one browser tab until it disconnects."""
+    await websocket.accept()
+    with change_feed.subscribe() as events:
+        async def forward():
+            while True:
+                await websocket.send_text(await events.get())
+
+        forwarder = asyncio.create_task(forward())
+        try:
+            # Clients send nothing; this only waits for the disconnect
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            forwarder.cancel()
+
+# Static files (like CSS, JS), from memory
+@app.get("/static/{name:path}", include_in_schema=False)
+async def serve_static(name: str, request: Request):
+    """Serves a frontend asset, compressed if the client accepts it."""
+    asset = static_assets.get(name)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return asset.response(request)
 
 # Root endpoint to serve the frontend HTML
 @app.get("/", response_class=HTMLResponse, summary="Serve Frontend", description="Serves the main frontend HTML application.")
-async def serve_frontend():
-    """Serves the index.html file for the frontend application."""
-    # Construct the path to index.html relative to the current file (main.py)
-    html_file_path = Path(__file__).parent.parent.parent / "frontend" / "index.html"
-    if not html_file_path.is_file():
-        raise HTTPException(status_code=500, detail="index.html not found at expected path.")
-    with open(html_file_path, "r", encoding="utf-8") as f:
-        return HTMLResponse(content=f.read())
\ No newline at end of file
+async def serve_frontend(request: Request):
+    """Serves the index.html page, loaded at startup and pointing at the hashed asset URLs."""
+    return static_assets.index.response(request)
@@ -1,9 +1,25 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Float, Index, event, inspect, text
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, false
+from typing import Optional
+import datetime
+import hashlib
 
 from backend.app.database import Base
 
+def utcnow():
+    """Current UTC time, used as the client-side default for creation timestamps.
+
+    Setting timestamps in Python (rather than only via the server default) keeps
+    sub-second precision and stores them in the same format SQLAlchemy uses for
+    bound parameters, so keyset cursors on timestamps compare correctly.
+    """
+    return datetime.datetime.now(datetime.timezone.utc)
+
+def prompt_hash(system_prompt: str) -> str:
+    """Identifies a system prompt by its text: the hex SHA-256 of its UTF-8 encoding."""
+    return hashlib.sha256(system_prompt.encode()).hexdigest()
+
 # Prompt Model
 # Represents a saved system prompt that a user can configure and reuse.
 class Prompt(Base):
@@ -17,17 +33,48 @@ class Prompt(Base):
     # Relationship to Conversations (optional, for tracking which conversations used this prompt)
     # conversations = relationship("Conversation", back_populates="prompt_ref")
 
+    # Fetch server-generated values (e.g. created_at) with RETURNING at flush time,
+    # so a new row is complete without a follow-up refresh query
+    __mapper_args__ = {"eager_defaults": True}
+
+# PromptBody Model
+# The text of a system prompt, stored once however many conversations use it and
+# addressed by its hash. Rows are never changed: a different text is a different row.
+class PromptBody(Base):
+    __tablename__ = "prompt_bodies"
+
+    hash = Column(String(64), primary_key=True) # prompt_hash() of the content
+    content = Column(Text, nullable=False) # The system prompt text
+    created_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now()) # When the text was first used
+
 # Conversation Model
 # Represents a single chat session between the user and the AI.
 class Conversation(Base):
     __tablename__ = "conversations"
 
     id = Column(Integer, primary_key=True, index=True) # Unique ID for the conversation
-    system_prompt_used = Column(Text, nullable=False) # The system prompt active for this conversation
-    created_at = Column(DateTime(timezone=True), server_default=func.now()) # Timestamp of creation
+    system_prompt_hash = Column(String(64), ForeignKey("prompt_bodies.hash"), nullable=False, index=True) # The system prompt active for this conversation
+    created_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now()) # Timestamp of creation
+    summary = Column(Text, nullable=True) # Rolling summary of messages that no longer fit the context budget
+    summary_upto_message_id = Column(Integer, nullable=True) # Last message folded into the summary
+    response_cache_bypass = Column(Boolean, default=False, server_default=false(), nullable=False) # Always call the model, even with the response cache on
 
     # Relationship to Messages: A conversation can have many messages.
     messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
+    # The prompt text is loaded with the conversation (one join on the primary key), since
+    # every turn needs it and AsyncSession cannot lazy load
+    prompt_body = relationship("PromptBody", lazy="joined", innerjoin=True)
+
+    @property
+    def system_prompt_used(self) -> Optional[str]:
+        """The system prompt text, or None if the query left the prompt body out."""
+        if "prompt_body" in inspect(self).unloaded:
+            return None
+        return self.prompt_body.content
+
+    # Backs the newest-first keyset pagination of the conversation list
+    __table_args__ = (Index("ix_conversations_created_at_id", "created_at", "id"),)
+    __mapper_args__ = {"eager_defaults": True}
 
 # Message Model
 # Represents a single message within a conversation, either from the user or the AI.
@@ -38,9 +85,162 @@ class Message(Base):
     conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False) # Foreign key to the parent conversation
     sender = Column(String, nullable=False) # 'user' or 'ai'
     content = Column(Text, nullable=False) # The message content
-    timestamp = Column(DateTime(timezone=True), server_default=func.now()) # Timestamp of message creation
+    timestamp = Column(DateTime(timezone=True), default=utcnow, server_default=func.now()) # Timestamp of message creation
     liked = Column(Boolean, default=False) # New field for like status
     disliked = Column(Boolean, default=False) # New field for dislike status
 
     # Relationship to Conversation: A message belongs to one conversation.
     conversation = relationship("Conversation", back_populates="messages")
+
+    # Serves per-conversation message pages in (timestamp, id) order. The id breaks ties
+    # between messages written in the same instant, so the order is deterministic.
+    __table_args__ = (Index("ix_messages_conversation_timestamp_id", "conversation_id", "timestamp", "id"),)
+    __mapper_args__ = {"eager_defaults": True}
+
+# Full-text search index over message content (see crud.search_messages).
+# SQLite keeps an FTS5 table in sync with messages.content through triggers; PostgreSQL
+# uses a GIN index over the content's tsvector. Neither maps to a model, so the DDL is
+# attached to the messages table: create_all() builds it, and migration 0003 adds the
+# same objects to existing databases. A batch (copy-and-move) migration of the messages
+# table on SQLite drops the triggers and must recreate them.
+SEARCH_TS_CONFIG = "english"
+SEARCH_INDEX_DDL = {
+    "sqlite": [
+        "CREATE VIRTUAL TABLE messages_fts USING fts5("
+        "content, content='messages', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN "
+        "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+        "CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN "
+        "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+        "CREATE TRIGGER messages_fts_update AFTER UPDATE OF content ON messages BEGIN "
+        "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+        "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+    ],
+    "postgresql": [
+        f"CREATE INDEX ix_messages_content_fts ON messages USING gin (to_tsvector('{SEARCH_TS_CONFIG}', content))",
+    ],
+}
+# Dropping the messages table removes its triggers and indexes, but not the FTS5 table
+SEARCH_INDEX_DROP_DDL = {
+    "sqlite": ["DROP TABLE IF EXISTS messages_fts"],
+}
+
+
+@event.listens_for(Message.__table__, "after_create")
+def _create_search_index(target, connection, **kw):
+    for statement in SEARCH_INDEX_DDL.get(connection.dialect.name, []):
+        connection.exec_driver_sql(statement)
+
+
+@event.listens_for(Message.__table__, "after_drop")
+def _drop_search_index(target, connection, **kw):
+    for statement in SEARCH_INDEX_DROP_DDL.get(connection.dialect.name, []):
+        connection.exec_driver_sql(statement)
+
+# ResponseCacheEntry Model
+# A stored AI reply, keyed by a hash of everything the model saw for that turn.
+# This is the on-disk tier of the response cache (see services/response_cache.py).
+class ResponseCacheEntry(Base):
+    __tablename__ = "response_cache"
+
+    key = Column(String(64), primary_key=True) # sha256 of model, system prompt, history and user message
+    model = Column(String, nullable=False) # Model that produced the response
+    response = Column(Text, nullable=False) # The cached AI reply
+    model_latency_ms = Column(Float, nullable=False) # How long the model took to produce it
+    created_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now()) # Entries expire by age
+
+    # Expiry and size-based pruning delete the oldest entries first
+    __table_args__ = (Index("ix_response_cache_created_at", "created_at"),)
+
+# CacheVersion Model
+# A counter bumped in the same transaction as every change to some cached data, so each
+# worker can tell with one primary-key read whether its in-memory copy is stale
+# (see services/prompt_registry.py).
+class CacheVersion(Base):
+    __tablename__ = "cache_versions"
+
+    name = Column(String, primary_key=True) # What the counter covers, e.g. "prompts"
+    version = Column(Integer, nullable=False, default=0, server_default="0") # Incremented on every change
+
+PROMPTS_CACHE_VERSION = "prompts"
+# Counters that must exist; migrations insert the same rows into existing databases
+CACHE_VERSION_NAMES = (PROMPTS_CACHE_VERSION,)
+
+
+@event.listens_for(CacheVersion.__table__, "after_create")
+def _seed_cache_versions(target, connection, **kw):
+    connection.execute(target.insert(), [{"name": name, "version": 0} for name in CACHE_VERSION_NAMES])
+
+# Jobs that are waiting or running; only these hold on to their dedupe_key
+ACTIVE_JOB_CONDITION = "status IN ('pending', 'running')"
+
+# Job Model
+# A unit of background work (see services/job_queue.py). Jobs are stored before they
+# run, so pending work survives restarts and can be picked up by any worker.
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True) # Unique ID for the job
+    kind = Column(String, nullable=False) # Registered handler name, e.g. "summarize_conversation"
+    payload = Column(Text, nullable=False) # JSON arguments for the handler
+    status = Column(String, nullable=False, default="pending", server_default="pending") # 'pending', 'running', 'done' or 'failed'
+    dedupe_key = Column(String, nullable=True) # At most one pending or running job per key
+    owner = Column(String, nullable=True) # Process holding the job's in-memory secrets, if it has any
+    attempts = Column(Integer, nullable=False, default=0, server_default="0") # Attempts started so far
+    max_attempts = Column(Integer, nullable=False) # Attempts before the job is marked failed
+    last_error = Column(Text, nullable=True) # Error of the latest failed attempt
+    created_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now()) # When the job was enqueued
+    run_after = Column(DateTime(timezone=True), nullable=False, default=utcnow) # Not started before this (retry backoff, delays)
+    started_at = Column(DateTime(timezone=True), nullable=True) # Start of the latest attempt
+    finished_at = Column(DateTime(timezone=True), nullable=True) # When the job succeeded or finally failed
+    locked_until = Column(DateTime(timezone=True), nullable=True) # Lease of a running job; past it, another worker may take over
+
+    # Workers look for due jobs by status and time. The unique index on the dedupe_key of
+    # active jobs lets the database turn away duplicates, even from concurrent enqueues
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+        Index(
+            "uq_jobs_active_dedupe_key", "dedupe_key", unique=True,
+            sqlite_where=text(ACTIVE_JOB_CONDITION), postgresql_where=text(ACTIVE_JOB_CONDITION),
+        ),
+    )
+    __mapper_args__ = {"eager_defaults": True}
+
+# PromptFeedbackStats Model
+# Like and dislike counts over the messages of all conversations that used one system
+# prompt body. Every feedback change moves the counters in the same transaction, so the
+# analytics endpoints read one row per prompt instead of scanning messages; the
+# `rebuild-feedback-stats` CLI command recomputes them from the messages.
+class PromptFeedbackStats(Base):
+    __tablename__ = "prompt_feedback_stats"
+
+    prompt_hash = Column(String(64), ForeignKey("prompt_bodies.hash"), primary_key=True) # The system prompt
+    likes = Column(Integer, nullable=False, default=0, server_default="0") # Liked messages
+    dislikes = Column(Integer, nullable=False, default=0, server_default="0") # Disliked messages
+    updated_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now()) # Last counter change
+
+    # The analytics endpoint ranks prompts by either counter
+    __table_args__ = (
+        Index("ix_prompt_feedback_stats_likes", "likes"),
+        Index("ix_prompt_feedback_stats_dislikes", "dislikes"),
+    )
+
+# ChangeEvent Model
+# Outbox of the change events pushed to browsers over the /ws WebSocket. A worker delivers
+# the events it publishes to its own clients at once and reads the ones published by other
+# workers from this table. Rows are only needed until every worker has polled, so they are
+# pruned after a short retention.
+class ChangeEvent(Base):
+    __tablename__ = "change_events"
+
+    id = Column(Integer, primary_key=True) # Increasing; workers read on from the last id they have seen
+    origin = Column(String, nullable=False) # Process that published the event (and already delivered it)
+    payload = Column(Text, nullable=False) # The event as sent to clients, JSON
+    created_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now()) # When it was published
+
+    __table_args__ = (
+        Index("ix_change_events_created_at", "created_at"),
+        # Ids must never be reused after pruning, or workers would skip the new rows
+        {"sqlite_autoincrement": True},
+    )
+    __mapper_args__ = {"eager_defaults": True}
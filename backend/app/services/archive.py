@@ -0,0 +1,331 @@
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import datetime
+import json
+import time
+import zlib
+
+from backend.app import crud
+from backend.app.config import settings
+from backend.app.database import AsyncSessionLocal
+from backend.app.models import prompt_hash
+
+# Archive layout: one JSON object per line. A header line comes first, then each
+# conversation followed by its messages, oldest first:
+#   {"format": "promptcraft-conversations", "version": 1, "exported_at": "..."}
+#   {"type": "conversation", "id": 7, "system_prompt_used": "...", "created_at": "...", ...}
+#   {"type": "message", "conversation_id": 7, "sender": "user", "content": "...", "liked": false, ...}
+# Ids are only used to tie messages to their conversation; imported rows get new ids.
+ARCHIVE_FORMAT = "promptcraft-conversations"
+ARCHIVE_VERSION = 1
+
+# Encoded lines are sent in chunks of about this many bytes
+_CHUNK_BYTES = 64 * 1024
+# Rows written per import transaction
+IMPORT_BATCH_ROWS = 10_000
+# Longest line accepted on import, so a file without newlines cannot exhaust memory
+_MAX_LINE_BYTES = 64 * 1024 * 1024
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+class ArchiveError(ValueError):
+    """An archive line that cannot be imported."""
+
+
+@dataclass
+class ImportStats:
+    conversations: int = 0
+    messages: int = 0
+    seconds: float = 0.0
+    rows_per_s: float = 0.0
+
+
+def _isoformat(value: Optional[datetime.datetime]) -> Optional[str]:
+    if value is None:
+        return None
+    if value.tzinfo is None: # SQLite returns naive UTC datetimes
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.isoformat()
+
+
+async def _rows(result) -> AsyncIterator:
+    # Fetching a partition at a time avoids a greenlet switch into the driver per row
+    async for partition in result.partitions():
+        for row in partition:
+            yield row
+
+
+def _line(record: Dict) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+async def export_ndjson() -> AsyncIterator[bytes]:
+    """Yields every conversation and message as NDJSON, in chunks of about 64 KiB.
+
+    Conversations and messages are read from two server-side cursors in one read
+    transaction (so the archive is a consistent snapshot) and merged on the fly,
+    keeping memory use flat however large the database is.
+    """
+    async with AsyncSessionLocal() as db:
+        conversations = _rows(await crud.stream_conversations_for_export(db))
+        messages = _rows(await crud.stream_messages_for_export(db))
+        pending: List[str] = [_line({
+            "format": ARCHIVE_FORMAT,
+            "version": ARCHIVE_VERSION,
+            "exported_at": _isoformat(datetime.datetime.now(datetime.timezone.utc)),
+        })]
+        size = 0
+        message = await anext(messages, None)
+        async for conversation in conversations:
+            pending.append(_line({
+                "type": "conversation",
+                "id": conversation.id,
+                "system_prompt_used": conversation.system_prompt_used,
+                "created_at": _isoformat(conversation.created_at),
+                "summary": conversation.summary,
+                "summary_message_count": conversation.summary_message_count,
+                "response_cache_bypass": conversation.response_cache_bypass,
+            }))
+            # Both cursors are ordered by conversation id, so a conversation's messages
+            # are next in the message cursor
+            while message is not None and message.conversation_id <= conversation.id:
+                if message.conversation_id == conversation.id:
+                    line = _line({
+                        "type": "message",
+                        "conversation_id": message.conversation_id,
+                        "sender": message.sender,
+                        "content": message.content,
+                        "timestamp": _isoformat(message.timestamp),
+                        "liked": bool(message.liked),
+                        "disliked": bool(message.disliked),
+                    })
+                    pending.append(line)
+                    size += len(line)
+                    if size >= _CHUNK_BYTES:
+                        yield "".join(pending).encode()
+                        pending, size = [], 0
+                message = await anext(messages, None)
+        yield "".join(pending).encode()
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """Gzip-compresses a stream of byte chunks."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31) # 31: gzip container
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+async def _decompressed(chunks: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+    """Passes plain chunks through and decompresses gzip ones (detected by magic bytes).
+
+    Output comes in pieces of at most _CHUNK_BYTES however far the input expands,
+    and more than `max_bytes` of it (unless 0) is an ArchiveError.
+    """
+    decompressor = None
+    first = True
+    total = 0
+
+    def counted(piece: bytes) -> bytes:
+        nonlocal total
+        total += len(piece)
+        if max_bytes and total > max_bytes:
+            raise ArchiveError(f"The archive is larger than {max_bytes} bytes uncompressed.")
+        return piece
+
+    async for chunk in chunks:
+        if first:
+            if not chunk:
+                continue
+            first = False
+            if chunk[:2] == _GZIP_MAGIC:
+                decompressor = zlib.decompressobj(31)
+        if decompressor is None:
+            yield counted(chunk)
+            continue
+        while True:
+            piece = decompressor.decompress(chunk, _CHUNK_BYTES)
+            if piece:
+                yield counted(piece)
+            if decompressor.eof:
+                # Concatenated gzip members (e.g. from appending archives) continue in a new one
+                chunk = decompressor.unused_data
+                if not chunk:
+                    break
+                decompressor = zlib.decompressobj(31)
+            else:
+                chunk = decompressor.unconsumed_tail
+                # A full piece may leave output pending even with all input consumed
+                if not chunk and len(piece) < _CHUNK_BYTES:
+                    break
+
+
+async def _lines(chunks: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[Tuple[int, bytes]]:
+    """Splits a byte stream into numbered, non-empty lines."""
+    buffer = b""
+    number = 0
+    async for chunk in _decompressed(chunks, max_bytes):
+        buffer += chunk
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        if len(buffer) > _MAX_LINE_BYTES:
+            raise ArchiveError(f"Line {number + len(lines) + 1} is longer than {_MAX_LINE_BYTES} bytes.")
+        for line in lines:
+            number += 1
+            if line.strip():
+                yield number, line
+    if buffer.strip():
+        yield number + 1, buffer
+
+
+def _parse_timestamp(value: Optional[str], number: int) -> Optional[datetime.datetime]:
+    if value is None:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ArchiveError(f"Line {number}: invalid timestamp {value!r}.")
+
+
+class _Importer:
+    """Buffers parsed archive rows and writes them in batched transactions."""
+
+    def __init__(self, db):
+        self.db = db
+        self.stats = ImportStats()
+        # Conversations not yet inserted, with their archive ids
+        self.conversations: List[Tuple[int, Dict]] = []
+        self.messages: List[Dict] = []
+        # Archive id -> new id, for the conversations of this batch and the last one
+        # before it (whose messages may continue into this batch)
+        self.new_ids: Dict[int, int] = {}
+        # Archive id -> system prompt hash, for the same conversations (feedback is counted per prompt)
+        self.prompts: Dict[int, str] = {}
+        # Prompt hash -> text of the system prompts used in this batch
+        self.bodies: Dict[str, str] = {}
+        self.current: Optional[int] = None
+        # (archive conversation id, folded message count) of summaries to re-point
+        self.summaries: List[Tuple[int, int]] = []
+
+    def add_conversation(self, record: Dict, number: int) -> None:
+        try:
+            archive_id = int(record["id"])
+            system_prompt = str(record["system_prompt_used"])
+            row = {
+                "system_prompt_hash": prompt_hash(system_prompt),
+                "summary": record.get("summary"),
+                "response_cache_bypass": bool(record.get("response_cache_bypass", False)),
+            }
+            summary_message_count = int(record.get("summary_message_count") or 0)
+        except (KeyError, TypeError, ValueError):
+            raise ArchiveError(f"Line {number}: a conversation needs an integer id and a system_prompt_used.")
+        created_at = _parse_timestamp(record.get("created_at"), number)
+        if created_at is not None:
+            row["created_at"] = created_at
+        self.current = archive_id
+        self.prompts[archive_id] = row["system_prompt_hash"]
+        self.bodies[row["system_prompt_hash"]] = system_prompt
+        self.conversations.append((archive_id, row))
+        if row["summary"] is not None and summary_message_count:
+            self.summaries.append((archive_id, summary_message_count))
+
+    def add_message(self, record: Dict, number: int) -> None:
+        try:
+            archive_id = int(record["conversation_id"])
+            row = {
+                "conversation_id": archive_id,
+                "sender": str(record["sender"]),
+                "content": str(record["content"]),
+                "liked": bool(record.get("liked", False)),
+                "disliked": bool(record.get("disliked", False)),
+            }
+        except (KeyError, TypeError, ValueError):
+            raise ArchiveError(f"Line {number}: a message needs a conversation_id, sender and content.")
+        if archive_id != self.current:
+            raise ArchiveError(f"Line {number}: messages must follow their conversation (id {archive_id}).")
+        timestamp = _parse_timestamp(record.get("timestamp"), number)
+        if timestamp is not None:
+            row["timestamp"] = timestamp
+        self.messages.append(row)
+
+    def pending_rows(self) -> int:
+        return len(self.conversations) + len(self.messages)
+
+    async def flush(self, final: bool = False) -> None:
+        """Writes the buffered rows in one transaction."""
+        conversations, messages, current = self.conversations, self.messages, self.current
+        self.conversations, self.messages, bodies, self.bodies = [], [], self.bodies, {}
+        # A summary can be re-pointed once all of its conversation's messages are in
+        summaries = self.summaries if final else [item for item in self.summaries if item[0] != current]
+        self.summaries = [] if final else [item for item in self.summaries if item[0] == current]
+
+        await crud.store_prompt_bodies(self.db, bodies)
+        new_ids = await crud.bulk_insert_conversations(self.db, [row for _, row in conversations])
+        self.new_ids.update((archive_id, new_id) for (archive_id, _), new_id in zip(conversations, new_ids))
+        feedback: Dict[str, List[int]] = {}
+        for row in messages:
+            if row["liked"] or row["disliked"]:
+                counts = feedback.setdefault(self.prompts[row["conversation_id"]], [0, 0])
+                counts[0] += row["liked"]
+                counts[1] += row["disliked"]
+            row["conversation_id"] = self.new_ids[row["conversation_id"]]
+        await crud.bulk_insert_messages(self.db, messages)
+        await crud.add_prompt_feedback(self.db, {prompt: tuple(counts) for prompt, counts in feedback.items()})
+        await crud.set_summary_positions(self.db, [(self.new_ids[archive_id], count) for archive_id, count in summaries])
+        await self.db.commit()
+        # Only the last conversation can get more messages
+        self.new_ids = {current: self.new_ids[current]} if current in self.new_ids else {}
+        self.prompts = {current: self.prompts[current]} if current in self.prompts else {}
+        self.stats.conversations += len(conversations)
+        self.stats.messages += len(messages)
+
+
+async def import_ndjson(
+    chunks: AsyncIterator[bytes], batch_rows: int = IMPORT_BATCH_ROWS, progress=None, max_bytes: Optional[int] = None
+) -> ImportStats:
+    """Imports an NDJSON archive (plain or gzip) read from a stream of byte chunks.
+
+    Rows are written in transactions of `batch_rows` rows, so a failure part way
+    leaves the batches before it imported; the ArchiveError names the bad line.
+    `progress`, if given, is called with the running ImportStats after each batch.
+    Archives larger than `max_bytes` uncompressed (by default the
+    archive_import_max_bytes setting; 0 for no limit) are rejected part way.
+    """
+    if max_bytes is None:
+        max_bytes = settings.archive_import_max_bytes
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        importer = _Importer(db)
+        async for number, line in _lines(chunks, max_bytes):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise ArchiveError(f"Line {number}: not valid JSON.")
+            if not isinstance(record, dict):
+                raise ArchiveError(f"Line {number}: expected a JSON object.")
+            record_type = record.get("type")
+            if record_type == "conversation":
+                importer.add_conversation(record, number)
+            elif record_type == "message":
+                importer.add_message(record, number)
+            elif record_type is None and "format" in record:
+                if record["format"] != ARCHIVE_FORMAT or record.get("version") != ARCHIVE_VERSION:
+                    raise ArchiveError(f"Unsupported archive format {record['format']!r} version {record.get('version')!r}.")
+            else:
+                raise ArchiveError(f"Line {number}: unknown record type {record_type!r}.")
+            if importer.pending_rows() >= batch_rows:
+                await importer.flush()
+                _update_rate(importer.stats, started)
+                if progress is not None:
+                    progress(importer.stats)
+        await importer.flush(final=True)
+    _update_rate(importer.stats, started)
+    return importer.stats
+
+
+def _update_rate(stats: ImportStats, started: float) -> None:
+    stats.seconds = round(time.perf_counter() - started, 3)
+    rows = stats.conversations + stats.messages
+    stats.rows_per_s = round(rows / stats.seconds) if stats.seconds else 0.0
@@ -0,0 +1,272 @@
+from collections import deque
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+import asyncio
+import hashlib
+import random
+import time
+
+from google.api_core import exceptions as google_exceptions
+
+from backend.app.config import Settings, settings
+from backend.app.services.metrics import (
+    GEMINI_HEDGES, GEMINI_IN_FLIGHT, GEMINI_QUEUE_DEPTH, GEMINI_REJECTED, GEMINI_RETRIES, GEMINI_TIMEOUTS,
+)
+
+T = TypeVar("T")
+
+# Failures worth another attempt: overload (429), server errors (500, 503),
+# upstream timeouts (504) and dropped connections
+TRANSIENT_ERRORS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.InternalServerError,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.GatewayTimeout,
+    ConnectionError,
+)
+
+# Successful call latencies kept for the hedging percentile
+_LATENCY_WINDOW = 200
+
+
+class GeminiCallError(Exception):
+    """A model call that failed; `status_code` is the HTTP status to report it with."""
+    status_code = 500
+
+
+class GeminiTimeoutError(GeminiCallError):
+    status_code = 504
+
+
+class GeminiUnavailableError(GeminiCallError):
+    """The upstream kept failing transiently, or too many calls are already queued."""
+    status_code = 503
+
+
+class CallPolicy:
+    """Deadlines, retries, hedging and concurrency limits around Gemini API calls.
+
+    Each call holds a slot of a global and a per-API-key semaphore while it talks
+    to the API, so bursts queue here instead of piling onto the upstream. Transient
+    failures are retried with full-jitter exponential backoff until the call's
+    deadline. A non-streamed call that outlives a percentile of recent latencies
+    can be hedged with a second request; the first to succeed wins and the other
+    is cancelled. Cancelling the caller cancels everything in flight.
+    """
+
+    def __init__(self, config: Settings = settings):
+        self.timeout_seconds = config.gemini_timeout_seconds
+        self.max_retries = config.gemini_max_retries
+        self.retry_base_delay = config.gemini_retry_base_delay_seconds
+        self.retry_max_delay = config.gemini_retry_max_delay_seconds
+        self.max_concurrency = config.gemini_max_concurrency
+        self.max_concurrency_per_key = config.gemini_max_concurrency_per_key
+        self.max_queue_depth = config.gemini_max_queue_depth
+        self.hedge_percentile = config.gemini_hedge_percentile
+        self.hedge_min_samples = config.gemini_hedge_min_samples
+        self._global = asyncio.Semaphore(self.max_concurrency)
+        # Per-key semaphores, keyed by a hash of the key and dropped once unused
+        self._per_key: Dict[str, asyncio.Semaphore] = {}
+        self._per_key_users: Dict[str, int] = {}
+        self._latencies: deque = deque(maxlen=_LATENCY_WINDOW)
+        self.queued = 0
+        self.in_flight = 0
+        self.retries = 0
+        self.hedges = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    async def call(self, api_key: str, operation: str, attempt: Callable[[], Awaitable[T]]) -> T:
+        """Runs `attempt()` under the policy and returns its result."""
+        try:
+            return await asyncio.wait_for(self._call_with_retries(api_key, operation, attempt), self.timeout_seconds)
+        except asyncio.TimeoutError:
+            raise self._timed_out(operation)
+
+    async def stream(self, api_key: str, operation: str, open_stream: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Yields the chunks of `open_stream()` under the policy.
+
+        Transient failures before the first chunk are retried; once text has been
+        passed on, a failure ends the stream. The deadline applies to waiting for a
+        slot and the first chunk, and to each gap between chunks.
+        """
+        deadline = time.monotonic() + self.timeout_seconds
+        attempt_number = 0
+        while True:
+            error: Optional[BaseException] = None
+            async with AsyncExitStack() as slot:
+                try:
+                    await asyncio.wait_for(
+                        slot.enter_async_context(self._slot(api_key, operation)), max(0.0, deadline - time.monotonic())
+                    )
+                except asyncio.TimeoutError:
+                    raise self._timed_out(operation)
+                chunks = open_stream()
+                try:
+                    try:
+                        first = await asyncio.wait_for(chunks.__anext__(), max(0.0, deadline - time.monotonic()))
+                    except StopAsyncIteration:
+                        return
+                    except TRANSIENT_ERRORS as e:
+                        error = e
+                    else:
+                        # Time to a first chunk is not a full call's latency, so it stays
+                        # out of the window the hedge delay is computed from
+                        yield first
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout_seconds)
+                            except StopAsyncIteration:
+                                return
+                            yield chunk
+                except asyncio.TimeoutError:
+                    raise self._timed_out(operation)
+                finally:
+                    await chunks.aclose()
+            # The slot is released before backing off, so a retry does not hold up other calls
+            if not await self._backoff(operation, attempt_number, deadline):
+                raise error
+            attempt_number += 1
+
+    def stats(self) -> Dict:
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "hedge_delay_ms": round(self._hedge_delay() * 1000, 1) if self._hedge_delay() is not None else None,
+        }
+
+    async def _call_with_retries(self, api_key: str, operation: str, attempt: Callable[[], Awaitable[T]]) -> T:
+        deadline = time.monotonic() + self.timeout_seconds
+        attempt_number = 0
+        while True:
+            try:
+                async with self._slot(api_key, operation):
+                    return await self._hedged(api_key, operation, attempt)
+            except TRANSIENT_ERRORS:
+                if not await self._backoff(operation, attempt_number, deadline):
+                    raise
+                attempt_number += 1
+
+    async def _hedged(self, api_key: str, operation: str, attempt: Callable[[], Awaitable[T]]) -> T:
+        started = time.monotonic()
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None:
+            result = await attempt()
+            self._latencies.append(time.monotonic() - started)
+            return result
+
+        # The caller's slot keeps this key's semaphore registered while the hedge may hold it
+        per_key = self._per_key[self._key_id(api_key)]
+        tasks: List[asyncio.Task] = [asyncio.ensure_future(attempt())]
+        hedge_slot = False
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            # Hedge only with spare capacity, globally and for this key, so hedging never
+            # makes a queue longer or puts a key over its limit
+            if not done and not self._global.locked() and not per_key.locked():
+                await per_key.acquire()
+                await self._global.acquire()
+                hedge_slot = True
+                self.hedges += 1
+                GEMINI_HEDGES.labels(operation).inc()
+                tasks.append(asyncio.ensure_future(attempt()))
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._latencies.append(time.monotonic() - started)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            if hedge_slot:
+                self._global.release()
+                per_key.release()
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self.hedge_percentile is None or len(self._latencies) < self.hedge_min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))
+        return ordered[index]
+
+    def _timed_out(self, operation: str) -> GeminiTimeoutError:
+        self.timeouts += 1
+        GEMINI_TIMEOUTS.labels(operation).inc()
+        return GeminiTimeoutError(f"The AI model did not respond within {self.timeout_seconds:g} seconds.")
+
+    async def _backoff(self, operation: str, attempt_number: int, deadline: float) -> bool:
+        """Sleeps before a retry; returns False if no retry is left or the deadline would pass."""
+        if attempt_number >= self.max_retries:
+            return False
+        delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt_number))
+        if time.monotonic() + delay >= deadline:
+            return False
+        self.retries += 1
+        GEMINI_RETRIES.labels(operation).inc()
+        await asyncio.sleep(delay)
+        return True
+
+    @asynccontextmanager
+    async def _slot(self, api_key: str, operation: str):
+        if self.queued >= self.max_queue_depth and (self._global.locked() or self._key_full(api_key)):
+            self.rejected += 1
+            GEMINI_REJECTED.labels(operation).inc()
+            raise GeminiUnavailableError("Too many AI requests are queued; please retry shortly.")
+        key = self._key_id(api_key)
+        per_key = self._per_key.get(key)
+        if per_key is None:
+            per_key = self._per_key[key] = asyncio.Semaphore(self.max_concurrency_per_key)
+        self._per_key_users[key] = self._per_key_users.get(key, 0) + 1
+        self.queued += 1
+        GEMINI_QUEUE_DEPTH.inc()
+        acquired = []
+        try:
+            await per_key.acquire()
+            acquired.append(per_key)
+            await self._global.acquire()
+            acquired.append(self._global)
+        except BaseException:
+            for semaphore in acquired:
+                semaphore.release()
+            self._release_key(key)
+            raise
+        finally:
+            self.queued -= 1
+            GEMINI_QUEUE_DEPTH.dec()
+        self.in_flight += 1
+        GEMINI_IN_FLIGHT.inc()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            GEMINI_IN_FLIGHT.dec()
+            for semaphore in acquired:
+                semaphore.release()
+            self._release_key(key)
+
+    @staticmethod
+    def _key_id(api_key: str) -> str:
+        return hashlib.sha256(api_key.encode()).hexdigest()
+
+    def _key_full(self, api_key: str) -> bool:
+        per_key = self._per_key.get(self._key_id(api_key))
+        return per_key is not None and per_key.locked()
+
+    def _release_key(self, key: str) -> None:
+        self._per_key_users[key] -= 1
+        if not self._per_key_users[key]:
+            del self._per_key_users[key]
+            del self._per_key[key]
+
+
+# Shared policy used by the Gemini service
+call_policy = CallPolicy()
@@ -0,0 +1,212 @@
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set
+import asyncio
+import datetime
+import json
+import os
+import socket
+import time
+import uuid
+
+from backend.app import crud
+from backend.app.config import Settings, settings
+from backend.app.database import AsyncSessionLocal
+from backend.app.models import utcnow
+
+# Events read from the outbox per poll
+_POLL_BATCH = 500
+# An id skipped by a poll (a transaction still in flight when it ran) is looked for again
+# for this long; ids from rolled-back inserts never show up
+_GAP_SECONDS = 10.0
+# Skipped ids tracked at most; a larger jump is not worth chasing
+_MAX_GAPS = 1000
+# Old events are pruned at most this often
+_PRUNE_INTERVAL_SECONDS = 300
+# Sent instead of the missed events to a client that fell behind: it reloads its lists
+RESYNC_EVENT = json.dumps({"type": "resync"})
+
+
+class ChangeFeed:
+    """Pushes small change events to every open /ws connection, in every worker.
+
+    With a single worker every client is connected to this process, so
+    `publish` hands events straight to the subscribers and the database is not
+    involved.
+
+    With `outbox` (several workers, see Settings.multiple_workers) events go
+    through the `change_events` table. `publish` never blocks the request:
+    events are queued, written by a publisher task (one transaction per batch)
+    and handed to this process's subscribers in publish order. While a process
+    has subscribers it also polls the table for events published by other
+    processes, one query per poll interval however many clients are connected,
+    so database reads grow with the number of changes and workers, not clients.
+    The outbox write is a transaction of its own after the change's: under
+    light load a chat turn then takes two commits instead of one
+    (bench_send_message reports commits_per_turn); concurrent changes share
+    outbox batches.
+
+    Delivery is best effort: a client that reconnects, or falls behind by more
+    than its queue holds, gets a `resync` event and reloads its lists.
+    """
+
+    def __init__(self, config: Settings = settings):
+        self.outbox = config.runs_multiple_workers()
+        self.poll_interval = config.change_feed_poll_interval_seconds
+        self.retention_seconds = config.change_feed_retention_seconds
+        self.client_queue_size = config.change_feed_client_queue_size
+        # Marks the events this process published (and delivered) itself
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._outbox: List[str] = []
+        self._outbox_ready: Optional[asyncio.Event] = None
+        self._has_subscribers: Optional[asyncio.Event] = None
+        self._publisher_task: Optional[asyncio.Task] = None
+        self._poller_task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # Newest outbox id seen, and ids skipped below it with when to give up on them
+        self._last_id: Optional[int] = None
+        self._gaps: Dict[int, float] = {}
+        self._pruned_at = float("-inf")
+        self.published = 0
+        self.received = 0
+        self.resyncs = 0
+        self.polls = 0
+
+    def publish(self, event_type: str, **data) -> None:
+        """Queues an event for every connected client. `data` must be JSON-serializable."""
+        payload = json.dumps({"type": event_type, **data}, ensure_ascii=False, separators=(",", ":"))
+        if not self.outbox:
+            self.published += 1
+            self._deliver([payload])
+            return
+        self._outbox.append(payload)
+        self._start()
+        self._outbox_ready.set()
+
+    @contextmanager
+    def subscribe(self) -> Iterator[asyncio.Queue]:
+        """Registers a client; yields the queue its serialized events arrive on."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.client_queue_size)
+        if self.outbox:
+            self._start()
+            self._has_subscribers.set()
+        self._subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers.discard(queue)
+            if not self._subscribers and self._has_subscribers is not None:
+                self._has_subscribers.clear()
+
+    def stats(self) -> Dict:
+        return {
+            "outbox": self.outbox,
+            "clients": len(self._subscribers),
+            "published": self.published,
+            "received_from_other_workers": self.received,
+            "resyncs": self.resyncs,
+            "polls": self.polls,
+        }
+
+    async def stop(self) -> None:
+        """Writes out queued events and stops the background tasks."""
+        if self._publisher_task is None:
+            return
+        self._poller_task.cancel()
+        # The publisher finishes the batch in hand, writes what is left and returns
+        self._stopping = True
+        self._outbox_ready.set()
+        await asyncio.gather(self._poller_task, self._publisher_task, return_exceptions=True)
+        self._poller_task = self._publisher_task = None
+        self._stopping = False
+
+    def _start(self) -> None:
+        # Started on first use rather than from the app's lifespan, so it also runs under test clients
+        task = self._publisher_task
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            self._stopping = False
+            self._outbox_ready = asyncio.Event()
+            self._has_subscribers = asyncio.Event()
+            if self._subscribers:
+                self._has_subscribers.set()
+            self._publisher_task = asyncio.create_task(self._publisher())
+            self._poller_task = asyncio.create_task(self._poller())
+
+    def _deliver(self, payloads: List[str]) -> None:
+        for queue in list(self._subscribers):
+            for payload in payloads:
+                try:
+                    queue.put_nowait(payload)
+                except asyncio.QueueFull:
+                    # Too far behind to catch up event by event: drop the backlog and have it reload
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(RESYNC_EVENT)
+                    self.resyncs += 1
+                    break
+
+    async def _publisher(self) -> None:
+        while not self._stopping:
+            await self._outbox_ready.wait()
+            self._outbox_ready.clear()
+            await self._publish_batch()
+        # Events published while the last batch was being written
+        await self._publish_batch()
+
+    async def _publish_batch(self) -> None:
+        payloads, self._outbox = self._outbox, []
+        if not payloads:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                await crud.add_change_events(db, self.origin, payloads)
+        except Exception as e:
+            # Clients of this worker still get the events; other workers' clients miss them
+            print(f"Error writing change events: {e}")
+        self.published += len(payloads)
+        self._deliver(payloads)
+
+    async def _poller(self) -> None:
+        while True:
+            if not self._subscribers:
+                # Nobody to tell; start from the newest event once someone connects
+                self._last_id = None
+                await self._has_subscribers.wait()
+            try:
+                await self._poll()
+            except Exception as e:
+                print(f"Error polling change events: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _poll(self) -> None:
+        now = time.monotonic()
+        async with AsyncSessionLocal() as db:
+            if self._last_id is None:
+                self._last_id = await crud.get_latest_change_event_id(db)
+                self._gaps.clear()
+                return
+            self._gaps = {event_id: until for event_id, until in self._gaps.items() if until > now}
+            rows = await crud.get_change_events(db, self._last_id, self._gaps, skip_origin=self.origin, limit=_POLL_BATCH)
+            if time.monotonic() - self._pruned_at > _PRUNE_INTERVAL_SECONDS:
+                self._pruned_at = time.monotonic()
+                await crud.prune_change_events(db, utcnow() - datetime.timedelta(seconds=self.retention_seconds))
+        self.polls += 1
+        payloads = []
+        for event_id, payload in rows:
+            if event_id in self._gaps:
+                del self._gaps[event_id]
+            elif event_id > self._last_id:
+                # Ids are taken in insert order but become visible in commit order, so a
+                # transaction still in flight may show up later below the newest id
+                if event_id - self._last_id - 1 <= _MAX_GAPS:
+                    for missing in range(self._last_id + 1, event_id):
+                        self._gaps[missing] = now + _GAP_SECONDS
+                self._last_id = event_id
+            if payload is not None:
+                payloads.append(payload)
+        self.received += len(payloads)
+        self._deliver(payloads)
+
+
+# Shared feed; API endpoints publish to it and the /ws endpoint subscribes
+change_feed = ChangeFeed()
@@ -0,0 +1,184 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from backend.app import crud
+from backend.app.config import settings
+from backend.app.database import AsyncSessionLocal
+from backend.app.services.gemini_service import generate_gemini_response
+from backend.app.services.job_queue import job_queue
+
+# Longest rolling summary kept per conversation; longer summaries are cut down to this
+SUMMARY_TOKEN_BUDGET = 1000
+# Once verbatim history overflows its budget, the oldest turns are folded into the summary
+# until the verbatim part is back under this fraction of the budget. Folding in larger
+# steps means a summarization runs every few turns rather than on every turn.
+FOLD_TARGET_RATIO = 0.5
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a running summary of a chat between a user and an AI assistant. "
+    "Merge the existing summary with the new messages into one updated summary. "
+    "Keep names, facts, decisions, open questions and user preferences; drop pleasantries. "
+    f"Stay under {SUMMARY_TOKEN_BUDGET * 3 // 4} words and reply with the summary only."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximates the token count of a text (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+
+@dataclass
+class ContextWindow:
+    """The history to send for one turn, plus the token accounting behind it."""
+    history: List[Dict]
+    system_tokens: int
+    summary_tokens: int
+    history_tokens: int
+    user_tokens: int
+    verbatim_messages: int
+    # Messages that have fallen out of the verbatim window but are not in the summary yet
+    to_fold: List[Dict] = field(default_factory=list)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.system_tokens + self.summary_tokens + self.history_tokens + self.user_tokens
+
+    def report(self) -> Dict[str, int]:
+        return {
+            "system_tokens": self.system_tokens,
+            "summary_tokens": self.summary_tokens,
+            "history_tokens": self.history_tokens,
+            "user_tokens": self.user_tokens,
+            "total_tokens": self.total_tokens,
+            "verbatim_messages": self.verbatim_messages,
+        }
+
+
+def build_context(
+    system_prompt: str,
+    summary: Optional[str],
+    summary_upto_message_id: Optional[int],
+    history: List[Dict],
+    user_message: str,
+    token_budget: Optional[int] = None,
+) -> ContextWindow:
+    """Builds the history for a turn: the rolling summary, then the most recent turns verbatim.
+
+    Messages already folded into the summary (id <= summary_upto_message_id) are
+    represented only by the summary. Of the rest, the most recent ones that fit
+    in the remaining budget are sent verbatim. If they do not all fit, the
+    oldest are returned in `to_fold` for the background summarizer. The budget
+    defaults to the context_token_budget setting.
+    """
+    if token_budget is None:
+        token_budget = settings.context_token_budget
+    if summary_upto_message_id is not None:
+        unsummarized = [entry for entry in history if entry["id"] > summary_upto_message_id]
+    else:
+        unsummarized = list(history)
+
+    summary_history: List[Dict] = []
+    summary_tokens = 0
+    if summary:
+        summary = summary[:SUMMARY_TOKEN_BUDGET * 4]
+        summary_history = [
+            {"role": "user", "parts": [f"Summary of our conversation so far:\n{summary}"]},
+            {"role": "ai", "parts": ["Understood, I will keep that in mind."]},
+        ]
+        summary_tokens = sum(estimate_tokens(entry["parts"][0]) for entry in summary_history)
+
+    # Take the newest messages that fit in what is left of the budget
+    recent_budget = max(0, token_budget - summary_tokens)
+    sizes = [estimate_tokens(entry["parts"][0]) for entry in unsummarized]
+    start = len(unsummarized)
+    used = 0
+    while start > 0 and used + sizes[start - 1] <= recent_budget:
+        used += sizes[start - 1]
+        start -= 1
+    # The verbatim window must open with a user turn to keep roles alternating
+    while start < len(unsummarized) and unsummarized[start]["role"] != "user":
+        used -= sizes[start]
+        start += 1
+
+    to_fold: List[Dict] = []
+    if start > 0:
+        # Fold far enough back that the next few turns fit without another summarization
+        fold_end = start
+        remaining = used
+        target = recent_budget * FOLD_TARGET_RATIO
+        while fold_end < len(unsummarized) and remaining > target:
+            remaining -= sizes[fold_end]
+            fold_end += 1
+        while fold_end < len(unsummarized) and unsummarized[fold_end]["role"] != "user":
+            fold_end += 1
+        to_fold = unsummarized[:fold_end]
+
+    verbatim = unsummarized[start:]
+    return ContextWindow(
+        history=summary_history + verbatim,
+        system_tokens=estimate_tokens(system_prompt),
+        summary_tokens=summary_tokens,
+        history_tokens=used,
+        user_tokens=estimate_tokens(user_message),
+        verbatim_messages=len(verbatim),
+        to_fold=to_fold,
+    )
+
+
+# Job kind that folds a conversation's overflow into its rolling summary
+SUMMARY_JOB = "summarize_conversation"
+
+
+async def schedule_summary(conversation_id: int, api_key: str, summary_upto_message_id: Optional[int], window: ContextWindow) -> None:
+    """Queues folding the window's overflow into the rolling summary.
+
+    Meant to run after the response is sent. At most one summarization per
+    conversation is pending or running at a time.
+    """
+    if not window.to_fold:
+        return
+    await job_queue.enqueue(
+        SUMMARY_JOB,
+        {
+            "conversation_id": conversation_id,
+            "expected_upto_message_id": summary_upto_message_id,
+            "upto_message_id": window.to_fold[-1]["id"],
+        },
+        # The API key only ever lives in this process's memory, never in the jobs table
+        secrets={"api_key": api_key},
+        dedupe_key=f"summary:{conversation_id}",
+    )
+
+
+@job_queue.job(SUMMARY_JOB)
+async def _update_summary(payload: Dict, secrets: Dict[str, str]) -> None:
+    conversation_id = payload["conversation_id"]
+    expected_upto = payload["expected_upto_message_id"]
+    upto = payload["upto_message_id"]
+    async with AsyncSessionLocal() as db:
+        db_conversation = await crud.get_conversation(db, conversation_id)
+        # Gone, or another summarization already moved the summary on: nothing to do
+        if db_conversation is None or db_conversation.summary_upto_message_id != expected_upto:
+            return
+        summary = db_conversation.summary
+        rows = await crud.get_conversation_history(db, conversation_id)
+    to_fold = [
+        (sender, content) for message_id, sender, content in rows
+        if (expected_upto is None or message_id > expected_upto) and message_id <= upto
+    ]
+    if not to_fold:
+        return
+    transcript = "\n".join(f"{'User' if sender == 'user' else 'AI'}: {content}" for sender, content in to_fold)
+    prompt = f"Existing summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"
+    # Errors propagate so the job queue retries the summarization with backoff
+    new_summary = await generate_gemini_response(
+        api_key=secrets["api_key"], system_prompt=SUMMARY_SYSTEM_PROMPT, chat_history=[], user_message=prompt
+    )
+    async with AsyncSessionLocal() as db:
+        await crud.update_conversation_summary(
+            db,
+            conversation_id=conversation_id,
+            summary=new_summary.strip(),
+            upto_message_id=upto,
+            expected_upto_message_id=expected_upto,
+        )
@@ -0,0 +1,134 @@
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+import threading
+
+from backend.app.config import settings
+
+# Upper bound on message text held across all cached conversations (in characters)
+DEFAULT_MAX_CACHED_CHARS = 8_000_000
+# Rough per-message bookkeeping cost, counted so many tiny messages still use up budget
+_MESSAGE_OVERHEAD_CHARS = 64
+
+
+def _entry_size(entry: Dict) -> int:
+    return len(entry["parts"][0]) + _MESSAGE_OVERHEAD_CHARS
+
+
+class ConversationContextCache:
+    """In-process cache of each conversation's chat history in Gemini format.
+
+    Entries are loaded from the database once, then appended to as messages are
+    written, so a chat turn does not re-query the whole history. The cache is
+    bounded by the total size of the message text it holds and evicts whole
+    conversations in least-recently-used order.
+
+    With `check_database`, other processes may write to the same conversations,
+    so a cached history is only a starting point: callers fetch the messages
+    written after its last one and `extend` it with them, or reload it if that
+    message is gone.
+    """
+
+    def __init__(self, max_chars: int = DEFAULT_MAX_CACHED_CHARS, check_database: bool = False):
+        self.max_chars = max_chars
+        self.check_database = check_database
+        self._entries: "OrderedDict[int, List[Dict]]" = OrderedDict()
+        self._sizes: Dict[int, int] = {}
+        self._total_chars = 0
+        # Bumped whenever a write happens that a concurrent load could have missed.
+        # `put` refuses to store a load that started before such a write.
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def to_entry(message_id: int, sender: str, content: str) -> Dict:
+        return {"id": message_id, "role": sender, "parts": [content]}
+
+    def generation(self) -> int:
+        """Returns a token to pass to `put` for a load that is about to start."""
+        return self._generation
+
+    def get(self, conversation_id: int) -> Optional[List[Dict]]:
+        """Returns a copy of the cached history, or None on a miss."""
+        with self._lock:
+            entries = self._entries.get(conversation_id)
+            if entries is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(conversation_id)
+            self.hits += 1
+            return list(entries)
+
+    def put(self, conversation_id: int, entries: Iterable[Dict], generation: int) -> None:
+        """Stores a history loaded from the database, unless a write raced the load."""
+        entries = list(entries)
+        with self._lock:
+            if generation != self._generation or conversation_id in self._entries:
+                return
+            size = sum(_entry_size(entry) for entry in entries)
+            if size > self.max_chars:
+                return
+            self._entries[conversation_id] = entries
+            self._sizes[conversation_id] = size
+            self._total_chars += size
+            self._evict()
+
+    def append(self, conversation_id: int, entry: Dict) -> None:
+        """Adds a newly written message to a cached conversation."""
+        with self._lock:
+            entries = self._entries.get(conversation_id)
+            if entries is None:
+                # Not cached: the next load reads it from the database, but a load
+                # already in flight may have missed it.
+                self._generation += 1
+                return
+            self._append(conversation_id, entries, [entry])
+
+    def extend(self, conversation_id: int, after_id: int, entries: List[Dict]) -> None:
+        """Adds messages written by another process, if the cached history still ends at `after_id`."""
+        with self._lock:
+            cached = self._entries.get(conversation_id)
+            if not cached or cached[-1]["id"] != after_id:
+                # Changed here meanwhile; the next turn catches up from the new end
+                return
+            self._append(conversation_id, cached, entries)
+
+    def invalidate(self, conversation_id: int) -> None:
+        """Drops a conversation's cached history."""
+        with self._lock:
+            self._generation += 1
+            self._remove(conversation_id)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "conversations": len(self._entries),
+                "chars": self._total_chars,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _append(self, conversation_id: int, cached: List[Dict], entries: List[Dict]) -> None:
+        cached.extend(entries)
+        size = sum(_entry_size(entry) for entry in entries)
+        self._sizes[conversation_id] += size
+        self._total_chars += size
+        self._entries.move_to_end(conversation_id)
+        self._evict()
+
+    def _remove(self, conversation_id: int) -> None:
+        if self._entries.pop(conversation_id, None) is not None:
+            self._total_chars -= self._sizes.pop(conversation_id)
+
+    def _evict(self) -> None:
+        while self._total_chars > self.max_chars and self._entries:
+            conversation_id = next(iter(self._entries))
+            self._remove(conversation_id)
+            self.evictions += 1
+
+
+# Shared cache used by the chat endpoints
+context_cache = ConversationContextCache(check_database=settings.runs_multiple_workers())
@@ -0,0 +1,261 @@
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import datetime
+import json
+import time
+
+from backend.app import crud
+from backend.app.config import Settings, settings
+from backend.app.database import AsyncSessionLocal
+from backend.app.models import prompt_hash, utcnow
+from backend.app.services.call_policy import call_policy
+from backend.app.services.change_feed import change_feed
+from backend.app.services.context_builder import build_context
+from backend.app.services.gemini_service import generate_gemini_response
+
+# Evaluation stream layout: one JSON object per line. A result line per model call, in
+# the order the calls finish, then a summary line once the conversations are saved:
+#   {"type": "result", "prompt_id": 3, "message_index": 0, "reply": "...", "error": null, "latency_ms": 812.4, ...}
+#   {"type": "summary", "conversations": [{"prompt_id": 3, "message_index": 0, "conversation_id": 41}, ...], "stats": {...}}
+SKIPPED_ERROR = "Skipped: an earlier turn of this conversation failed."
+
+
+@dataclass
+class EvaluationPrompt:
+    id: int
+    name: str
+    content: str
+
+
+@dataclass
+class CallResult:
+    unit: int # Index of the conversation (work unit) the call belongs to
+    prompt_index: int
+    message_index: int
+    sent_at: datetime.datetime
+    replied_at: datetime.datetime
+    latency_ms: Optional[float] # None for a skipped turn
+    reply: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def skipped(self) -> bool:
+        return self.latency_ms is None
+
+
+def _percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(samples)
+
+    def pick(pct):
+        # Nearest rank
+        return round(ordered[max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))], 1)
+
+    return {"p50": pick(50), "p95": pick(95), "p99": pick(99), "max": round(ordered[-1], 1)}
+
+
+def _line(record: Dict) -> bytes:
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode()
+
+
+class Evaluation:
+    """One batch run of every prompt against every message.
+
+    The work is split into units, one per conversation to create: a single
+    (prompt, message) call each, or with `multi_turn` one unit per prompt whose
+    messages are sent in order as the turns of one conversation. A fixed pool of
+    workers takes units off a queue, so at most `concurrency` model calls are in
+    flight and the whole matrix takes about as long as its slowest calls rather
+    than the sum of them. Results are reported as each call finishes; the
+    conversations and messages are written afterwards in one transaction.
+    """
+
+    def __init__(self, api_key: str, prompts: List[EvaluationPrompt], messages: List[str], concurrency: Optional[int] = None, multi_turn: bool = False, config: Settings = settings):
+        self.api_key = api_key
+        self.prompts = prompts
+        self.messages = messages
+        self.multi_turn = multi_turn
+        if multi_turn:
+            self.units: List[Tuple[int, List[int]]] = [(p, list(range(len(messages)))) for p in range(len(prompts))]
+        else:
+            self.units = [(p, [m]) for p in range(len(prompts)) for m in range(len(messages))]
+        # All calls share one API key, so more workers than the per-key limit would only queue
+        limit = min(config.evaluation_concurrency, call_policy.max_concurrency_per_key)
+        self.concurrency = max(1, min(concurrency or limit, limit, len(self.units)))
+        self.results: List[CallResult] = []
+        self.wall_seconds = 0.0
+
+    @property
+    def total_calls(self) -> int:
+        return len(self.prompts) * len(self.messages)
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        """Runs the evaluation, yielding NDJSON lines: a result per call as it finishes, then the summary."""
+        started = time.perf_counter()
+        pending: asyncio.Queue = asyncio.Queue()
+        for unit in enumerate(self.units):
+            pending.put_nowait(unit)
+        finished: asyncio.Queue = asyncio.Queue()
+        workers = [asyncio.create_task(self._worker(pending, finished)) for _ in range(self.concurrency)]
+        try:
+            for completed in range(1, self.total_calls + 1):
+                result = await finished.get()
+                self.results.append(result)
+                yield _line(self._result_event(result, completed, started))
+        finally:
+            # A client that goes away stops the calls still running; what finished is kept
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            # Calls that finished but were not streamed yet are saved as well
+            while not finished.empty():
+                self.results.append(finished.get_nowait())
+            self.wall_seconds = time.perf_counter() - started
+            persist_started = time.perf_counter()
+            # Shielded so a cancelled stream still completes its write
+            conversations, persist_error = await asyncio.shield(self._persist())
+            persist_ms = (time.perf_counter() - persist_started) * 1000
+
+        summary = {"type": "summary", "conversations": conversations, "stats": self.stats()}
+        summary["stats"]["persist_ms"] = round(persist_ms, 1)
+        if persist_error:
+            summary["error"] = persist_error
+        yield _line(summary)
+
+    async def _worker(self, pending: asyncio.Queue, finished: asyncio.Queue) -> None:
+        while True:
+            try:
+                unit, (prompt_index, message_indexes) = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            prompt = self.prompts[prompt_index]
+            history: List[Dict] = []
+            failed = False
+            for message_index in message_indexes:
+                message = self.messages[message_index]
+                sent_at = utcnow()
+                if failed:
+                    # Without the previous reply the turns would no longer alternate
+                    finished.put_nowait(CallResult(unit, prompt_index, message_index, sent_at, sent_at, None, error=SKIPPED_ERROR))
+                    continue
+                call_started = time.perf_counter()
+                result = CallResult(unit, prompt_index, message_index, sent_at, sent_at, None)
+                try:
+                    context = build_context(prompt.content, None, None, history, message)
+                    result.reply = await generate_gemini_response(self.api_key, prompt.content, context.history, message)
+                except Exception as e:
+                    result.error = str(e)
+                    failed = True
+                result.latency_ms = (time.perf_counter() - call_started) * 1000
+                result.replied_at = utcnow()
+                if not failed:
+                    history.append({"role": "user", "parts": [message]})
+                    history.append({"role": "ai", "parts": [result.reply]})
+                finished.put_nowait(result)
+
+    def _result_event(self, result: CallResult, completed: int, started: float) -> Dict:
+        return {
+            "type": "result",
+            "prompt_id": self.prompts[result.prompt_index].id,
+            "message_index": result.message_index,
+            "reply": result.reply,
+            "error": result.error,
+            "latency_ms": None if result.skipped else round(result.latency_ms, 1),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            "completed": completed,
+            "total": self.total_calls,
+        }
+
+    async def _persist(self) -> Tuple[List[Dict], Optional[str]]:
+        """Saves a conversation per unit that made at least one call, in one transaction.
+
+        Like a single send, a failed call keeps the user message without a reply.
+        Returns the (prompt, message, conversation id) mapping and an error, if the write failed.
+        """
+        by_unit: Dict[int, List[CallResult]] = {}
+        for result in self.results:
+            if not result.skipped:
+                by_unit.setdefault(result.unit, []).append(result)
+        units = sorted(by_unit)
+        if not units:
+            return [], None
+        bodies = {prompt_hash(prompt.content): prompt.content for prompt in self.prompts}
+        try:
+            async with AsyncSessionLocal() as db:
+                await crud.store_prompt_bodies(db, bodies)
+                conversation_ids = await crud.bulk_insert_conversations(db, [
+                    {
+                        "system_prompt_hash": prompt_hash(self.prompts[self.units[unit][0]].content),
+                        "created_at": min(result.sent_at for result in by_unit[unit]),
+                    }
+                    for unit in units
+                ])
+                rows = []
+                for unit, conversation_id in zip(units, conversation_ids):
+                    for result in sorted(by_unit[unit], key=lambda result: result.message_index):
+                        rows.append(self._message_row(conversation_id, "user", self.messages[result.message_index], result.sent_at))
+                        if result.reply is not None:
+                            rows.append(self._message_row(conversation_id, "ai", result.reply, result.replied_at))
+                await crud.bulk_insert_messages(db, rows)
+                await db.commit()
+            # Open pages reload their lists once rather than receive an event per row
+            change_feed.publish("resync")
+        except Exception as e:
+            print(f"Error saving evaluation results: {e}")
+            return [], f"The results could not be saved: {e}"
+        return [
+            {
+                "prompt_id": self.prompts[self.units[unit][0]].id,
+                "message_index": None if self.multi_turn else self.units[unit][1][0],
+                "conversation_id": conversation_id,
+            }
+            for unit, conversation_id in zip(units, conversation_ids)
+        ], None
+
+    @staticmethod
+    def _message_row(conversation_id: int, sender: str, content: str, timestamp: datetime.datetime) -> Dict:
+        return {
+            "conversation_id": conversation_id,
+            "sender": sender,
+            "content": content,
+            "timestamp": timestamp,
+            "liked": False,
+            "disliked": False,
+        }
+
+    def stats(self) -> Dict:
+        """Aggregate latency and throughput over the calls made so far, overall and per prompt."""
+        made = [result for result in self.results if not result.skipped]
+        latencies = [result.latency_ms for result in made]
+        call_seconds = sum(latencies) / 1000
+        wall_seconds = self.wall_seconds
+        per_prompt = []
+        for prompt_index, prompt in enumerate(self.prompts):
+            calls = [result for result in made if result.prompt_index == prompt_index]
+            replies = [result.reply for result in calls if result.reply is not None]
+            per_prompt.append({
+                "prompt_id": prompt.id,
+                "name": prompt.name,
+                "succeeded": len(replies),
+                "failed": len(calls) - len(replies),
+                "latency_ms": _percentiles([result.latency_ms for result in calls]),
+                "mean_reply_chars": round(sum(map(len, replies)) / len(replies), 1) if replies else None,
+            })
+        succeeded = sum(result.reply is not None for result in made)
+        return {
+            "calls": self.total_calls,
+            "succeeded": succeeded,
+            "failed": len(made) - succeeded,
+            "skipped": len(self.results) - len(made),
+            "not_run": self.total_calls - len(self.results),
+            "concurrency": self.concurrency,
+            "wall_seconds": round(wall_seconds, 3),
+            # What the same calls would have taken one after another
+            "sequential_seconds": round(call_seconds, 3),
+            "speedup": round(call_seconds / wall_seconds, 2) if wall_seconds else None,
+            "calls_per_s": round(len(made) / wall_seconds, 1) if wall_seconds else None,
+            "latency_ms": _percentiles(latencies),
+            "prompts": per_prompt,
+        }
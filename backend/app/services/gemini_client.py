@@ -0,0 +1,153 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+import hashlib
+import threading
+import time
+
+# Defaults for the shared client manager. Models are cheap to keep around, but each
+# distinct API key holds an open channel, so both caches are bounded.
+DEFAULT_MAX_MODELS = 256
+DEFAULT_MAX_CLIENTS = 64
+DEFAULT_TTL_SECONDS = 30 * 60
+
+_MISSING = object()
+
+
+class GeminiTransport:
+    """Creates the objects the Gemini service talks to.
+
+    A transport builds one API client per API key and one model per
+    (client, model name, system prompt). The production transport wraps the
+    google-generativeai SDK; tests and benchmarks can swap in a local fake.
+    """
+
+    def create_client(self, api_key: str) -> Any:
+        raise NotImplementedError
+
+    def create_model(self, client: Any, model_name: str, system_prompt: str) -> Any:
+        """Returns an object exposing `start_chat(history=...)` like `genai.GenerativeModel`."""
+        raise NotImplementedError
+
+
+class GoogleGenAITransport(GeminiTransport):
+    """Transport backed by the google-generativeai SDK.
+
+    Each API key gets its own async service client instead of going through
+    `genai.configure`, which mutates process-global state and races when two
+    requests with different keys run at the same time.
+
+    The SDK is imported on first use rather than with this module: it accounts
+    for about half of the app's import time, which every worker pays on start.
+    """
+
+    def create_client(self, api_key: str) -> Any:
+        import google.ai.generativelanguage as glm
+
+        return glm.GenerativeServiceAsyncClient(client_options={"api_key": api_key})
+
+    def create_model(self, client: Any, model_name: str, system_prompt: str) -> Any:
+        import google.generativeai as genai
+
+        model = genai.GenerativeModel(model_name=model_name, system_instruction=system_prompt)
+        # The SDK has no public way to hand a model its client: it lazily fills this
+        # private attribute from the global configuration on first use, and pre-setting
+        # it binds the model to this key's client instead. requirements.txt pins the SDK
+        # version this was written against; fail loudly if another one drops the attribute
+        # rather than silently falling back to the global (unconfigured) client.
+        if getattr(model, "_async_client", _MISSING) is not None:
+            raise RuntimeError(
+                f"google-generativeai {genai.__version__} no longer exposes GenerativeModel._async_client; "
+                "per-key clients cannot be bound. Install the version pinned in requirements.txt."
+            )
+        model._async_client = client
+        return model
+
+
+class _LRUCache:
+    """Thread-safe LRU cache with a per-entry time-to-live and hit/miss counters."""
+
+    def __init__(self, max_size: int, ttl_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                # Expired: drop it and build a fresh value below
+                del self._entries[key]
+                self.evictions += 1
+            self.misses += 1
+            # Built under the lock so concurrent misses for the same key create one value.
+            # Factories only construct objects; no network I/O happens here.
+            value = factory()
+            if self.max_size > 0:
+                self._entries[key] = (now, value)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+            return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class GeminiClientManager:
+    """Caches Gemini clients and models so they are reused across requests.
+
+    Clients are keyed by API key and models by (API key, model name, system
+    prompt hash). Both caches use LRU eviction with a TTL so stale keys and
+    rarely used prompts do not pin channels open forever.
+    """
+
+    def __init__(
+        self,
+        transport: Optional[GeminiTransport] = None,
+        max_models: int = DEFAULT_MAX_MODELS,
+        max_clients: int = DEFAULT_MAX_CLIENTS,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+    ):
+        self.transport = transport or GoogleGenAITransport()
+        self._models = _LRUCache(max_models, ttl_seconds)
+        self._clients = _LRUCache(max_clients, ttl_seconds)
+
+    def set_transport(self, transport: GeminiTransport) -> None:
+        """Replaces the transport and drops everything built by the previous one."""
+        self.transport = transport
+        self._models.clear()
+        self._clients.clear()
+
+    def get_model(self, api_key: str, model_name: str, system_prompt: str) -> Any:
+        """Returns a cached model for this key, model and system prompt, creating it on a miss."""
+        prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+        key = (api_key, model_name, prompt_hash)
+        return self._models.get_or_create(
+            key, lambda: self.transport.create_model(self._get_client(api_key), model_name, system_prompt)
+        )
+
+    def _get_client(self, api_key: str) -> Any:
+        return self._clients.get_or_create(api_key, lambda: self.transport.create_client(api_key))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Returns hit/miss/eviction counters and current sizes for both caches."""
+        return {"models": self._models.stats(), "clients": self._clients.stats()}
+
+
+# Shared manager used by the Gemini service
+client_manager = GeminiClientManager()
@@ -1,32 +1,85 @@
-from typing import List, Dict
-import google.generativeai as genai
+from contextlib import aclosing
+from typing import AsyncIterator, List, Dict
 
-async def generate_gemini_response(api_key: str, system_prompt: str, chat_history: List[Dict], user_message: str) -> str:
-    """Generates an AI response using the Google Gemini API."""
-    try:
-        genai.configure(api_key=api_key)
+from backend.app.services.call_policy import (
+    TRANSIENT_ERRORS, GeminiCallError, GeminiUnavailableError, call_policy,
+)
+from backend.app.services.gemini_client import client_manager
+from backend.app.services.metrics import GEMINI_ERRORS, GEMINI_REQUESTS, record_gemini_usage
 
-        # Initialize the model with the system prompt
-        # Using 'gemini-1.5-flash' as a robust and fast model.
-        model = genai.GenerativeModel(
-            model_name='gemini-1.5-flash',
-            system_instruction=system_prompt
-        )
+# Using 'gemini-1.5-flash' as a robust and fast model.
+MODEL_NAME = 'gemini-1.5-flash'
+
+def _start_chat(api_key: str, system_prompt: str, chat_history: List[Dict]):
+    """Starts a Gemini chat session seeded with the given history."""
+    # The model (and the API client behind it) is reused across requests for the
+    # same key and system prompt instead of being rebuilt on every message.
+    model = client_manager.get_model(api_key, MODEL_NAME, system_prompt)
+
+    # Prepare chat history for the model
+    # The Gemini API expects roles 'user' and 'model'. Map 'ai' from our DB to 'model'.
+    gemini_history = []
+    for msg in chat_history:
+        role = 'user' if msg['role'] == 'user' else 'model'
+        gemini_history.append({'role': role, 'parts': msg['parts']})
+
+    # Start a chat session with the prepared history
+    return model.start_chat(history=gemini_history)
+
+async def _generate(api_key: str, system_prompt: str, chat_history: List[Dict], user_message: str) -> str:
+    chat = _start_chat(api_key, system_prompt, chat_history)
+
+    # Send the user's latest message and get the AI's response
+    response = await chat.send_message_async(user_message)
+    record_gemini_usage(getattr(response, "usage_metadata", None))
+    return response.text
 
-        # Prepare chat history for the model
-        # The Gemini API expects roles 'user' and 'model'. Map 'ai' from our DB to 'model'.
-        gemini_history = []
-        for msg in chat_history:
-            role = 'user' if msg['role'] == 'user' else 'model'
-            gemini_history.append({'role': role, 'parts': msg['parts']})
+async def _stream(api_key: str, system_prompt: str, chat_history: List[Dict], user_message: str) -> AsyncIterator[str]:
+    chat = _start_chat(api_key, system_prompt, chat_history)
 
-        # Start a chat session with the prepared history
-        chat = model.start_chat(history=gemini_history)
+    # With stream=True the call returns as soon as the first chunk is available
+    response = await chat.send_message_async(user_message, stream=True)
+    async for chunk in response:
+        # Chunks without text (e.g. safety metadata only) are skipped
+        if chunk.parts:
+            yield chunk.text
+    # Usage totals are complete once the stream has been read to the end
+    record_gemini_usage(getattr(response, "usage_metadata", None))
 
-        # Send the user's latest message and get the AI's response
-        response = await chat.send_message_async(user_message)
-        return response.text
+def _as_call_error(e: Exception) -> GeminiCallError:
+    """Wraps an error from the model call in the GeminiCallError to report to the client."""
+    if isinstance(e, GeminiCallError):
+        return e
+    error_class = GeminiUnavailableError if isinstance(e, TRANSIENT_ERRORS) else GeminiCallError
+    return error_class(f"Failed to generate AI response. Please check your API key and network connection. Details: {e}")
+
+async def generate_gemini_response(api_key: str, system_prompt: str, chat_history: List[Dict], user_message: str) -> str:
+    """Generates an AI response using the Google Gemini API.
+
+    The call runs under the call policy (deadline, retries, concurrency limits).
+    Failures raise a GeminiCallError carrying the HTTP status to report.
+    """
+    GEMINI_REQUESTS.labels("generate").inc()
+    try:
+        return await call_policy.call(
+            api_key, "generate", lambda: _generate(api_key, system_prompt, chat_history, user_message)
+        )
     except Exception as e:
+        GEMINI_ERRORS.labels("generate").inc()
         print(f"Error generating Gemini response: {e}")
         # Raise an exception that can be caught by the API endpoint and returned as a proper HTTP error
-        raise Exception(f"Failed to generate AI response. Please check your API key and network connection. Details: {e}")
+        raise _as_call_error(e)
+
+async def stream_gemini_response(api_key: str, system_prompt: str, chat_history: List[Dict], user_message: str) -> AsyncIterator[str]:
+    """Streams an AI response from the Google Gemini API, yielding text chunks as they arrive."""
+    GEMINI_REQUESTS.labels("stream").inc()
+    try:
+        async with aclosing(call_policy.stream(
+            api_key, "stream", lambda: _stream(api_key, system_prompt, chat_history, user_message)
+        )) as chunks:
+            async for chunk in chunks:
+                yield chunk
+    except Exception as e:
+        GEMINI_ERRORS.labels("stream").inc()
+        print(f"Error streaming Gemini response: {e}")
+        raise _as_call_error(e)
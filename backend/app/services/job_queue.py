@@ -0,0 +1,348 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+import asyncio
+import datetime
+import json
+import os
+import random
+import socket
+import time
+import uuid
+
+from backend.app import crud
+from backend.app.config import Settings, settings
+from backend.app.database import AsyncSessionLocal
+from backend.app.models import utcnow
+from backend.app.services.metrics import JOB_QUEUE_WAIT, JOB_RUN_DURATION, JOBS_FINISHED, JOBS_RUNNING
+
+# Recent wait and run times kept per job kind for the status endpoint
+_LATENCY_WINDOW = 500
+# Jobs holding secrets in another process are taken over (and fail for want of the
+# secrets) once they are this many timeouts old; that process is presumably gone
+_ORPHAN_TIMEOUTS = 10
+# Finished jobs are pruned at most this often
+_PRUNE_INTERVAL_SECONDS = 3600
+
+
+class PermanentJobError(Exception):
+    """A job failure that retrying cannot fix; the job is marked failed at once."""
+
+
+@dataclass
+class JobKind:
+    name: str
+    handler: Callable
+    max_attempts: int
+    timeout_seconds: float
+    # The handler is a picklable, synchronous function of the payload, run in the process pool
+    cpu_bound: bool
+
+
+def _percentiles(samples: Deque[float]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"p50": None, "p95": None}
+    ordered = sorted(samples)
+    return {
+        "p50": round(ordered[len(ordered) // 2], 1),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+    }
+
+
+def _as_utc(value: datetime.datetime) -> datetime.datetime:
+    # SQLite returns naive UTC datetimes
+    return value if value.tzinfo is not None else value.replace(tzinfo=datetime.timezone.utc)
+
+
+class JobQueue:
+    """Runs background work off the request path, persisted in the `jobs` table.
+
+    `enqueue` stores a job and hands it to this process's workers right away; a
+    poller also picks up due jobs left by restarts, retries and other processes.
+    Workers claim a job with a lease (`locked_until`) in one UPDATE, so each
+    attempt runs in exactly one process, and a job whose process died is taken
+    over once its lease expires. Failed attempts are retried with jittered
+    exponential backoff up to the kind's `max_attempts`.
+
+    Secrets such as API keys are never written to the database: they stay in the
+    memory of the enqueueing process, which is the only one that runs the job
+    (unless it disappears, in which case the job fails).
+    """
+
+    def __init__(self, config: Settings = settings):
+        self.concurrency = config.job_queue_concurrency
+        self.max_attempts = config.job_queue_max_attempts
+        self.retry_base_delay = config.job_queue_retry_base_delay_seconds
+        self.timeout_seconds = config.job_queue_timeout_seconds
+        self.poll_interval = config.job_queue_poll_interval_seconds
+        self.retention_seconds = config.job_queue_retention_seconds
+        self.process_workers = config.job_queue_process_workers
+        # Identifies this process as the holder of its jobs' secrets
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._kinds: Dict[str, JobKind] = {}
+        self._secrets: Dict[int, Dict[str, str]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ready: Optional[asyncio.Queue] = None
+        self._queued: Set[int] = set()
+        self._active: Set[int] = set()
+        # Async handler calls in flight, cancelled by stop()
+        self._calls: Dict[int, asyncio.Future] = {}
+        self._stopping = False
+        self._stop_event: Optional[asyncio.Event] = None
+        self._workers: List[asyncio.Task] = []
+        self._poller_task: Optional[asyncio.Task] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._pruned_at = float("-inf")
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        self._wait_ms: Dict[str, Deque[float]] = {}
+        self._run_ms: Dict[str, Deque[float]] = {}
+
+    def job(self, kind: str, max_attempts: Optional[int] = None, timeout_seconds: Optional[float] = None, cpu_bound: bool = False):
+        """Decorator registering a handler for a job kind.
+
+        Handlers are `async def handler(payload: dict, secrets: dict)`, or with
+        `cpu_bound` a module-level `def handler(payload: dict)` run in the process pool.
+        """
+        def register(handler: Callable) -> Callable:
+            self._kinds[kind] = JobKind(
+                name=kind,
+                handler=handler,
+                max_attempts=max_attempts or self.max_attempts,
+                timeout_seconds=timeout_seconds or self.timeout_seconds,
+                cpu_bound=cpu_bound,
+            )
+            return handler
+        return register
+
+    async def enqueue(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        secrets: Optional[Dict[str, str]] = None,
+        dedupe_key: Optional[str] = None,
+        delay_seconds: float = 0.0,
+    ) -> Optional[int]:
+        """Stores a job and schedules it; returns its id, or None if deduplicated."""
+        if kind not in self._kinds:
+            raise ValueError(f"Unknown job kind {kind!r}.")
+        self._ensure_started()
+        run_after = utcnow() + datetime.timedelta(seconds=delay_seconds) if delay_seconds else None
+        async with AsyncSessionLocal() as db:
+            db_job = await crud.create_job(
+                db, kind, json.dumps(payload), self._kinds[kind].max_attempts,
+                dedupe_key=dedupe_key, owner=self.owner if secrets else None, run_after=run_after,
+            )
+            if db_job is None:
+                return None
+            # Registered before the next await, so no worker can see the job without them
+            if secrets:
+                self._secrets[db_job.id] = secrets
+        self._schedule(db_job.id, delay_seconds)
+        return db_job.id
+
+    def start(self) -> None:
+        """Starts the workers and the poller on the running event loop (idempotent)."""
+        self._ensure_started()
+
+    async def stop(self) -> None:
+        """Stops the workers; jobs interrupted mid-run go back to pending for a later start.
+
+        Running async handlers are cancelled; process-pool calls, which cannot be
+        interrupted, are waited for. Database bookkeeping is never cut short, so
+        no connection is left holding a half-done write.
+        """
+        if self._loop is None:
+            return
+        self._stopping = True
+        self._stop_event.set()
+        for call in list(self._calls.values()):
+            call.cancel()
+        for _ in self._workers:
+            self._ready.put_nowait(None)
+        await asyncio.gather(*self._workers, self._poller_task, return_exceptions=True)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(cancel_futures=True)
+            self._process_pool = None
+        self._loop = None
+
+    async def stats(self) -> Dict:
+        async with AsyncSessionLocal() as db:
+            counts, oldest_pending = await crud.get_job_counts(db)
+        return {
+            "jobs": {status: counts.get(status, 0) for status in ("pending", "running", "done", "failed")},
+            "oldest_pending_age_s": (
+                round((utcnow() - _as_utc(oldest_pending)).total_seconds(), 1) if oldest_pending else None
+            ),
+            # The rest is for this worker process only
+            "worker": {
+                "concurrency": self.concurrency,
+                "running": len(self._active),
+                "queued": len(self._queued),
+                "completed": self.completed,
+                "retried": self.retried,
+                "failed": self.failed,
+                "wait_ms": {kind: _percentiles(samples) for kind, samples in self._wait_ms.items()},
+                "run_ms": {kind: _percentiles(samples) for kind, samples in self._run_ms.items()},
+            },
+        }
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # First use, or a new event loop (the old one's tasks are gone with it)
+        self._loop = loop
+        self._ready = asyncio.Queue()
+        self._queued, self._active, self._calls = set(), set(), {}
+        self._stopping = False
+        self._stop_event = asyncio.Event()
+        self._workers = [loop.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._poller_task = loop.create_task(self._poller())
+
+    def _schedule(self, job_id: int, delay_seconds: float = 0.0) -> None:
+        if self._stopping:
+            return # Left pending in the database for the next start
+        if delay_seconds > 0:
+            self._loop.call_later(delay_seconds, self._schedule, job_id)
+        elif job_id not in self._queued and job_id not in self._active:
+            self._queued.add(job_id)
+            self._ready.put_nowait(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._ready.get()
+            if job_id is None or self._stopping:
+                return
+            self._queued.discard(job_id)
+            self._active.add(job_id)
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Bookkeeping failed (e.g. the database was unavailable); the lease expiry retries the job
+                print(f"Error running job {job_id}: {e}")
+            finally:
+                self._active.discard(job_id)
+                self._ready.task_done()
+
+    async def _run(self, job_id: int) -> None:
+        now = utcnow()
+        async with AsyncSessionLocal() as db:
+            db_job = await crud.claim_job(db, job_id, now, now + datetime.timedelta(seconds=self._lease_seconds()))
+        if db_job is None:
+            return # Already taken by another worker, or finished
+        if self._stopping:
+            async with AsyncSessionLocal() as db:
+                await crud.release_jobs(db, [job_id])
+            return
+        kind = self._kinds.get(db_job.kind)
+        kind_name = db_job.kind
+        wait_seconds = max(0.0, (now - _as_utc(db_job.run_after)).total_seconds())
+        JOB_QUEUE_WAIT.labels(kind_name).observe(wait_seconds)
+        self._wait_ms.setdefault(kind_name, deque(maxlen=_LATENCY_WINDOW)).append(wait_seconds * 1000)
+
+        started = time.perf_counter()
+        JOBS_RUNNING.inc()
+        try:
+            if kind is None:
+                raise PermanentJobError(f"No handler registered for job kind {kind_name!r}.")
+            secrets = self._secrets.get(job_id, {})
+            if db_job.owner is not None and job_id not in self._secrets:
+                raise PermanentJobError("The job's secrets were held by a process that is gone.")
+            payload = json.loads(db_job.payload)
+            if kind.cpu_bound:
+                call = self._loop.run_in_executor(self._executor(), kind.handler, payload)
+            else:
+                call = self._calls[job_id] = asyncio.ensure_future(kind.handler(payload, secrets))
+            await asyncio.wait_for(call, kind.timeout_seconds)
+        except asyncio.CancelledError:
+            if not (self._stopping and self._calls.get(job_id) is not None and self._calls[job_id].cancelled()):
+                raise
+            # Interrupted by stop(): back to pending, without using up an attempt
+            JOBS_FINISHED.labels(kind_name, "interrupted").inc()
+            async with AsyncSessionLocal() as db:
+                await crud.release_jobs(db, [job_id])
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            max_attempts = kind.max_attempts if kind else db_job.max_attempts
+            if isinstance(e, PermanentJobError) or db_job.attempts >= max_attempts:
+                await self._finish(job_id, kind_name, "failed", error)
+            else:
+                delay = random.uniform(0.5, 1.0) * self.retry_base_delay * 2 ** (db_job.attempts - 1)
+                await self._finish(job_id, kind_name, "retried", error, delay)
+        else:
+            await self._finish(job_id, kind_name, "done")
+        finally:
+            self._calls.pop(job_id, None)
+            JOBS_RUNNING.dec()
+            duration = time.perf_counter() - started
+            JOB_RUN_DURATION.labels(kind_name).observe(duration)
+            self._run_ms.setdefault(kind_name, deque(maxlen=_LATENCY_WINDOW)).append(duration * 1000)
+
+    async def _finish(self, job_id: int, kind: str, outcome: str, error: Optional[str] = None, retry_delay: float = 0.0) -> None:
+        JOBS_FINISHED.labels(kind, outcome).inc()
+        async with AsyncSessionLocal() as db:
+            if outcome == "retried":
+                self.retried += 1
+                run_after = utcnow() + datetime.timedelta(seconds=retry_delay)
+                await crud.finish_job(db, job_id, "pending", error, run_after=run_after)
+            else:
+                await crud.finish_job(db, job_id, outcome, error)
+        if outcome == "retried":
+            self._loop.call_later(retry_delay, self._schedule, job_id)
+            return
+        if outcome == "done":
+            self.completed += 1
+        else:
+            self.failed += 1
+            print(f"Job {job_id} ({kind}) failed: {error}")
+        self._secrets.pop(job_id, None)
+
+    def _lease_seconds(self) -> float:
+        # The lease must outlast any handler's time limit; the kind is not known before the claim
+        return max([self.timeout_seconds] + [kind.timeout_seconds for kind in self._kinds.values()])
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.process_workers <= 0:
+            return None # The loop's default thread pool
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=self.process_workers)
+        return self._process_pool
+
+    async def _poller(self) -> None:
+        limit = self.concurrency * 4
+        while True:
+            job_ids = []
+            try:
+                now = utcnow()
+                orphaned_before = now - datetime.timedelta(seconds=self.timeout_seconds * _ORPHAN_TIMEOUTS)
+                async with AsyncSessionLocal() as db:
+                    job_ids = await crud.get_runnable_job_ids(
+                        db, now, self.owner, orphaned_before, limit=limit
+                    )
+                    if time.monotonic() - self._pruned_at > _PRUNE_INTERVAL_SECONDS:
+                        self._pruned_at = time.monotonic()
+                        await crud.prune_jobs(db, now - datetime.timedelta(seconds=self.retention_seconds))
+                for job_id in job_ids:
+                    self._schedule(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error polling for jobs: {e}")
+            waits = [asyncio.ensure_future(self._stop_event.wait())]
+            # A full batch means a backlog: poll again as soon as the workers have been through it
+            if len(job_ids) == limit:
+                waits.append(asyncio.ensure_future(self._ready.join()))
+            _, pending = await asyncio.wait(waits, timeout=self.poll_interval, return_when=asyncio.FIRST_COMPLETED)
+            for waiter in pending:
+                waiter.cancel()
+            if self._stopping:
+                return
+
+
+# Shared queue; handlers register on it with @job_queue.job(...)
+job_queue = JobQueue()
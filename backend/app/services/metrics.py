@@ -0,0 +1,204 @@
+from typing import Dict
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+# Set (by serve.py) when several worker processes serve the app. Each process then
+# writes its samples to files in this directory and /metrics, whichever worker answers
+# it, reports the totals over all of them rather than that one worker's share.
+MULTIPROCESS_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+# Latency buckets in seconds, from cache hits and DB reads up to slow model calls
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency, until the last byte of the response body is sent.",
+    ["method", "route", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+CHAT_STAGE_LATENCY = Histogram(
+    "chat_stage_duration_seconds",
+    "Time spent in each stage of a chat turn.",
+    ["endpoint", "stage"],
+    buckets=_LATENCY_BUCKETS,
+)
+GEMINI_REQUESTS = Counter(
+    "gemini_requests_total",
+    "Calls made to the Gemini API.",
+    ["operation"],
+)
+GEMINI_ERRORS = Counter(
+    "gemini_errors_total",
+    "Gemini API calls that failed.",
+    ["operation"],
+)
+GEMINI_RETRIES = Counter(
+    "gemini_retries_total",
+    "Gemini API calls retried after a transient failure.",
+    ["operation"],
+)
+GEMINI_HEDGES = Counter(
+    "gemini_hedges_total",
+    "Hedged second requests sent for slow Gemini calls.",
+    ["operation"],
+)
+GEMINI_TIMEOUTS = Counter(
+    "gemini_timeouts_total",
+    "Gemini calls that ran past their deadline.",
+    ["operation"],
+)
+GEMINI_REJECTED = Counter(
+    "gemini_rejected_total",
+    "Gemini calls refused because too many were already queued.",
+    ["operation"],
+)
+GEMINI_QUEUE_DEPTH = Gauge(
+    "gemini_queue_depth",
+    "Gemini calls waiting for a concurrency slot.",
+    multiprocess_mode="livesum",
+)
+GEMINI_IN_FLIGHT = Gauge(
+    "gemini_in_flight",
+    "Gemini calls currently holding a concurrency slot.",
+    multiprocess_mode="livesum",
+)
+GEMINI_TOKENS = Counter(
+    "gemini_tokens_total",
+    "Tokens sent to (in) and generated by (out) the Gemini API, as reported by the API.",
+    ["direction"],
+)
+
+JOB_QUEUE_WAIT = Histogram(
+    "job_queue_wait_seconds",
+    "Time background jobs waited between becoming due and starting.",
+    ["kind"],
+    buckets=_LATENCY_BUCKETS,
+)
+JOB_RUN_DURATION = Histogram(
+    "job_run_duration_seconds",
+    "Duration of background job attempts.",
+    ["kind"],
+    buckets=_LATENCY_BUCKETS,
+)
+JOBS_FINISHED = Counter(
+    "jobs_finished_total",
+    "Background job attempts by outcome (done, retried or failed).",
+    ["kind", "outcome"],
+)
+JOBS_RUNNING = Gauge(
+    "jobs_running",
+    "Background jobs currently running (in all worker processes).",
+    multiprocess_mode="livesum",
+)
+
+
+def record_gemini_usage(usage_metadata) -> None:
+    """Adds the token counts of a Gemini response to the token counters."""
+    if usage_metadata is None:
+        return
+    GEMINI_TOKENS.labels("in").inc(getattr(usage_metadata, "prompt_token_count", 0) or 0)
+    GEMINI_TOKENS.labels("out").inc(getattr(usage_metadata, "candidates_token_count", 0) or 0)
+
+
+class StageTimer:
+    """Times the stages of one chat turn.
+
+    Each stage is recorded in the `chat_stage_duration_seconds` histogram and kept
+    for the turn's `Server-Timing` header, so a single slow request can be broken
+    down from the client side as well.
+    """
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.durations: Dict[str, float] = {}
+
+    def stage(self, name: str) -> "_Stage":
+        return _Stage(self, name)
+
+    def record(self, name: str, seconds: float) -> None:
+        CHAT_STAGE_LATENCY.labels(self.endpoint, name).observe(seconds)
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.durations.items())
+
+
+class _Stage:
+    def __init__(self, timer: StageTimer, name: str):
+        self._timer = timer
+        self._name = name
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._timer.record(self._name, time.perf_counter() - self._started)
+        return False
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the latency of every HTTP request by route template.
+
+    Written against raw ASGI rather than as a `BaseHTTPMiddleware` so streamed
+    responses are timed until their last chunk, not just until the headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_LATENCY.labels(scope["method"], _route_label(scope), str(status_code)).observe(
+                time.perf_counter() - started
+            )
+
+
+def _route_label(scope) -> str:
+    """Returns the route template of a handled request, e.g. /api/conversation/{conversation_id}.
+
+    Labelling by template rather than by raw path keeps the number of series bounded;
+    requests that matched no route share a single label.
+    """
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    path = scope["path"]
+    # Depending on the FastAPI version, routes of an included router carry their path
+    # without the router prefix; recover the prefix from the request path
+    if not route.path_regex.match(path):
+        for index in range(1, len(path)):
+            if path[index] == "/" and route.path_regex.match(path[index:]):
+                return path[:index] + route.path
+    return route.path
+
+
+def render_latest():
+    """Returns the current metrics in the Prometheus text format, with its content type."""
+    if MULTIPROCESS_DIR_ENV in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead() -> None:
+    """Drops this worker's gauge values from the totals, for a worker shutting down."""
+    if MULTIPROCESS_DIR_ENV in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
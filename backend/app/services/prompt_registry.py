@@ -0,0 +1,109 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.app import crud
+from backend.app.config import Settings, settings
+from backend.app.models import PROMPTS_CACHE_VERSION
+
+# Distinct (skip, limit) list pages kept serialized per snapshot
+_MAX_CACHED_PAGES = 32
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+@dataclass
+class CachedBody:
+    """A serialized JSON response body and its ETag."""
+    body: bytes
+    etag: str
+
+    @classmethod
+    def of(cls, value) -> "CachedBody":
+        body = _dumps(value)
+        return cls(body, _etag(body))
+
+
+@dataclass
+class PromptSnapshot:
+    """Every prompt at one version of the registry, serialized once."""
+    version: int
+    prompts: List[Dict] # JSON-ready prompt dicts, in id order
+    by_id: Dict[int, CachedBody]
+    ids_by_name: Dict[str, int]
+    _pages: Dict[Tuple[int, Optional[int]], CachedBody] = field(default_factory=dict)
+
+    def page(self, skip: int, limit: Optional[int]) -> CachedBody:
+        """Returns the serialized list page, building it on first use."""
+        cached = self._pages.get((skip, limit))
+        if cached is None:
+            end = None if limit is None else skip + limit
+            cached = CachedBody.of(self.prompts[skip:end])
+            if len(self._pages) < _MAX_CACHED_PAGES:
+                self._pages[(skip, limit)] = cached
+        return cached
+
+
+class PromptRegistry:
+    """In-memory, versioned copy of the saved prompts.
+
+    Prompt writes bump the "prompts" counter in the `cache_versions` table in the
+    same transaction. A worker compares its snapshot's version with that counter
+    (at most once per `max_staleness_seconds`) and reloads all prompts only when
+    it moved, so changes made through any worker propagate to all of them. Writes
+    through this worker call `invalidate()` and are visible immediately.
+    """
+
+    def __init__(self, serialize, config: Settings = settings):
+        # Turns a Prompt row into a JSON-ready dict (the API's response schema)
+        self._serialize = serialize
+        self.max_staleness_seconds = config.prompt_registry_max_staleness_seconds
+        self._snapshot: Optional[PromptSnapshot] = None
+        self._checked_at = float("-inf")
+        self._lock = asyncio.Lock()
+        self.reloads = 0
+        self.version_checks = 0
+
+    async def get(self, db: AsyncSession) -> PromptSnapshot:
+        """Returns a snapshot no older than the staleness bound."""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.max_staleness_seconds:
+            return snapshot
+        async with self._lock:
+            # Another request may have revalidated while this one waited
+            if self._snapshot is not None and time.monotonic() - self._checked_at < self.max_staleness_seconds:
+                return self._snapshot
+            checked_at = time.monotonic()
+            # The version is read before the prompts: a write in between leaves a snapshot
+            # labelled older than its content, which the next check reloads again
+            version = await crud.get_cache_version(db, PROMPTS_CACHE_VERSION)
+            self.version_checks += 1
+            if self._snapshot is None or self._snapshot.version != version:
+                self._snapshot = self._build(version, await crud.get_all_prompts(db))
+                self.reloads += 1
+            self._checked_at = checked_at
+            return self._snapshot
+
+    def invalidate(self) -> None:
+        """Forces the next `get` to check the version counter."""
+        self._checked_at = float("-inf")
+
+    def _build(self, version: int, rows) -> PromptSnapshot:
+        prompts = [self._serialize(row) for row in rows]
+        return PromptSnapshot(
+            version=version,
+            prompts=prompts,
+            by_id={prompt["id"]: CachedBody.of(prompt) for prompt in prompts},
+            ids_by_name={prompt["name"]: prompt["id"] for prompt in prompts},
+        )
@@ -0,0 +1,149 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import datetime
+import hashlib
+import json
+import threading
+import time
+
+from backend.app import crud
+from backend.app.config import Settings, settings
+from backend.app.database import AsyncSessionLocal
+from backend.app.models import utcnow
+
+# Prune the on-disk tier after this many stores, rather than on every write
+_PRUNE_EVERY_PUTS = 100
+
+
+def _normalize(text: str) -> str:
+    # Whitespace differences should not defeat the cache
+    return " ".join(text.split())
+
+
+def make_key(model: str, system_prompt: str, history: List[Dict], user_message: str) -> str:
+    """Returns the cache key for a turn: a sha256 of everything the model sees."""
+    payload = json.dumps([
+        model,
+        _normalize(system_prompt),
+        [[entry["role"], _normalize(entry["parts"][0])] for entry in history],
+        _normalize(user_message),
+    ])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+@dataclass
+class CachedResponse:
+    text: str
+    # What the model took to produce the reply originally, i.e. the time a hit saves
+    model_latency_ms: float
+    tier: str # "memory" or "disk"
+
+
+class ResponseCache:
+    """Two-tier cache of AI replies for repeated turns.
+
+    Lookups check an in-process LRU first, then the `response_cache` table, which
+    survives restarts and is shared between workers. Disk hits are promoted to
+    memory. Both tiers expire entries after the TTL and are bounded in size.
+    """
+
+    def __init__(self, config: Settings = settings):
+        self.enabled = config.response_cache_enabled
+        self.ttl_seconds = config.response_cache_ttl_seconds
+        self.max_memory_entries = config.response_cache_memory_entries
+        self.max_disk_entries = config.response_cache_disk_entries
+        # key -> (text, model_latency_ms, stored_at on the monotonic clock)
+        self._memory: "OrderedDict[str, Tuple[str, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts_since_prune = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_latency_ms = 0.0
+
+    def is_active_for(self, conversation) -> bool:
+        """Whether turns of this conversation should use the cache."""
+        return self.enabled and not conversation.response_cache_bypass
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        """Returns the cached reply for a key, or None on a miss."""
+        cached = self._get_memory(key)
+        if cached is None:
+            async with AsyncSessionLocal() as db:
+                created_after = utcnow() - datetime.timedelta(seconds=self.ttl_seconds)
+                entry = await crud.get_cached_response(db, key, created_after)
+            if entry is not None:
+                created_at = entry.created_at
+                if created_at.tzinfo is None: # SQLite returns naive UTC datetimes
+                    created_at = created_at.replace(tzinfo=datetime.timezone.utc)
+                age_seconds = (utcnow() - created_at).total_seconds()
+                # Promote with the entry's remaining lifetime, not a fresh TTL
+                self._put_memory(key, entry.response, entry.model_latency_ms, age_seconds)
+                cached = CachedResponse(entry.response, entry.model_latency_ms, "disk")
+        with self._lock:
+            if cached is None:
+                self.misses += 1
+            else:
+                if cached.tier == "memory":
+                    self.memory_hits += 1
+                else:
+                    self.disk_hits += 1
+                self.saved_latency_ms += cached.model_latency_ms
+        return cached
+
+    async def put(self, key: str, model: str, text: str, model_latency_ms: float) -> None:
+        """Stores a fresh reply in both tiers."""
+        self._put_memory(key, text, model_latency_ms)
+        try:
+            async with AsyncSessionLocal() as db:
+                await crud.put_cached_response(db, key, model, text, model_latency_ms)
+                self._puts_since_prune += 1
+                if self._puts_since_prune >= _PRUNE_EVERY_PUTS:
+                    self._puts_since_prune = 0
+                    created_before = utcnow() - datetime.timedelta(seconds=self.ttl_seconds)
+                    self.evictions += await crud.prune_response_cache(db, created_before, self.max_disk_entries)
+        except Exception as e:
+            # The reply was already delivered and saved; losing the disk copy only costs a future miss
+            print(f"Error storing cached response: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "memory_entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "saved_latency_ms": round(self.saved_latency_ms, 1),
+            }
+
+    def _get_memory(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            item = self._memory.get(key)
+            if item is None:
+                return None
+            text, model_latency_ms, stored_at = item
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._memory[key]
+                self.evictions += 1
+                return None
+            self._memory.move_to_end(key)
+            return CachedResponse(text, model_latency_ms, "memory")
+
+    def _put_memory(self, key: str, text: str, model_latency_ms: float, age_seconds: float = 0.0) -> None:
+        with self._lock:
+            self._memory[key] = (text, model_latency_ms, time.monotonic() - age_seconds)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+                self.evictions += 1
+
+
+# Shared cache used by the chat endpoints
+response_cache = ResponseCache()
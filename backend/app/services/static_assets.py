@@ -0,0 +1,153 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional
+import gzip
+import hashlib
+import mimetypes
+import re
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from backend.app.services.etags import etag_matches
+
+try:
+    import brotli
+except ImportError: # optional; without it assets are offered gzip-compressed only
+    brotli = None
+
+# Assets served under content-hashed URLs never change, so browsers may keep them for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# The page and unhashed asset URLs are revalidated on every use (cheap, with the ETag)
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# Hex digits of the content hash put into asset URLs
+URL_HASH_CHARS = 12
+# Bodies smaller than this are not worth compressing
+_MIN_COMPRESS_BYTES = 256
+# Content types that compress well; images and fonts are already compressed
+_COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+
+def _content_type(path: Path) -> str:
+    content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    if content_type.startswith("text/") or content_type == "application/javascript":
+        content_type += "; charset=utf-8"
+    return content_type
+
+
+def _accepted_encodings(accept_encoding: Optional[str]) -> Dict[str, float]:
+    """Parses an Accept-Encoding header into {coding: q}."""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+@dataclass
+class StaticAsset:
+    """One file held in memory, with its precompressed variants."""
+    content_type: str
+    digest: str # sha256 of the uncompressed content
+    cache_control: str
+    # Body per content coding: "identity" always, "gzip"/"br" when they are smaller
+    bodies: Dict[str, bytes] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, content: bytes, content_type: str, cache_control: str) -> "StaticAsset":
+        asset = cls(content_type, hashlib.sha256(content).hexdigest(), cache_control, {"identity": content})
+        compressible = content_type.startswith(_COMPRESSIBLE_TYPES)
+        if compressible and len(content) >= _MIN_COMPRESS_BYTES:
+            # mtime=0 keeps the gzip bytes, and so their ETag, identical across workers and restarts
+            candidates = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                candidates["br"] = brotli.compress(content, quality=11)
+            for coding, body in candidates.items():
+                if len(body) < len(content):
+                    asset.bodies[coding] = body
+        return asset
+
+    def etag(self, coding: str) -> str:
+        # Each coding is a different representation, so it gets its own ETag
+        suffix = "" if coding == "identity" else f"-{coding}"
+        return f'"{self.digest[:32]}{suffix}"'
+
+    def negotiate(self, accept_encoding: Optional[str]) -> str:
+        """Picks the smallest variant the client accepts (brotli, then gzip, then none)."""
+        if len(self.bodies) == 1:
+            return "identity"
+        accepted = _accepted_encodings(accept_encoding)
+        for coding in ("br", "gzip"):
+            if coding in self.bodies and accepted.get(coding, accepted.get("*", 0.0)) > 0:
+                return coding
+        return "identity"
+
+    def response(self, request: Request) -> Response:
+        coding = self.negotiate(request.headers.get("accept-encoding"))
+        headers = {"ETag": self.etag(coding), "Cache-Control": self.cache_control}
+        if len(self.bodies) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        return Response(content=self.bodies[coding], media_type=self.content_type, headers=headers)
+
+
+class StaticAssets:
+    """The frontend, loaded into memory once.
+
+    Every file under the static directory is read and compressed at startup and
+    published twice: under a content-hashed URL (`/static/script.<hash>.js`),
+    cached by browsers for a year, and under its plain name for anything that
+    links to it directly, revalidated with its ETag. `index.html` is rewritten to
+    point at the hashed URLs, so a deploy that changes an asset changes its URL
+    and clients pick it up on their next page load.
+    """
+
+    def __init__(self, static_dir: Path, index_path: Path, url_prefix: str = "/static"):
+        self.static_dir = static_dir
+        self.index_path = index_path
+        self.url_prefix = url_prefix.rstrip("/")
+        self.index: Optional[StaticAsset] = None
+        # Asset per path below the prefix, hashed and plain names alike
+        self._assets: Dict[str, StaticAsset] = {}
+        # Plain URL -> hashed URL, for rewriting the page
+        self.urls: Dict[str, str] = {}
+
+    def load(self) -> "StaticAssets":
+        assets, urls = {}, {}
+        for path in sorted(p for p in self.static_dir.rglob("*") if p.is_file()):
+            name = path.relative_to(self.static_dir).as_posix()
+            content = path.read_bytes()
+            digest = hashlib.sha256(content).hexdigest()[:URL_HASH_CHARS]
+            stem, dot, suffix = name.rpartition(".")
+            hashed_name = f"{stem}.{digest}.{suffix}" if dot else f"{name}.{digest}"
+            content_type = _content_type(path)
+            assets[hashed_name] = StaticAsset.build(content, content_type, IMMUTABLE_CACHE_CONTROL)
+            assets[name] = StaticAsset(
+                content_type, assets[hashed_name].digest, REVALIDATE_CACHE_CONTROL, assets[hashed_name].bodies
+            )
+            urls[f"{self.url_prefix}/{name}"] = f"{self.url_prefix}/{hashed_name}"
+        self._assets, self.urls = assets, urls
+        self.index = StaticAsset.build(self._rewrite(self.index_path.read_text(encoding="utf-8")).encode(),
+                                       "text/html; charset=utf-8", REVALIDATE_CACHE_CONTROL)
+        return self
+
+    def _rewrite(self, html: str) -> str:
+        """Points the page's src/href attributes at the hashed asset URLs."""
+        def replace(match):
+            return match.group(1) + self.urls.get(match.group(2), match.group(2)) + match.group(3)
+        return re.sub(r'((?:src|href)=["\'])([^"\']+)(["\'])', replace, html)
+
+    def get(self, name: str) -> Optional[StaticAsset]:
+        return self._assets.get(name)
@@ -0,0 +1,139 @@
+"""Benchmark for the NDJSON conversation export and import.
+
+Seeds a throwaway SQLite database with synthetic conversations, exports it
+(plain and gzip) to files in the scratch directory, recreates the schema and
+imports the gzip archive back. Prints throughput in rows per second, archive
+sizes and the peak Python memory allocated during an export as JSON; the peak
+should stay flat as --messages grows.
+
+Usage (from the project root):
+    python -m backend.benchmarks.bench_archive --messages 500000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+async def seed(args, rng):
+    from sqlalchemy import insert, select
+
+    from backend.app import crud, models
+    from backend.app.database import AsyncSessionLocal
+
+    words = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet"]
+    conversations = max(1, args.messages // args.messages_per_conversation)
+    async with AsyncSessionLocal() as db:
+        prompt_body = await crud.get_or_create_prompt_body(db, "archive benchmark")
+        await db.execute(insert(models.Conversation), [{"system_prompt_hash": prompt_body.hash}] * conversations)
+        conversation_ids = (await db.scalars(select(models.Conversation.id))).all()
+        await db.commit()
+        rows = []
+        for i in range(args.messages):
+            rows.append({
+                "conversation_id": conversation_ids[i // args.messages_per_conversation % len(conversation_ids)],
+                "sender": "user" if i % 2 == 0 else "ai",
+                "content": " ".join(rng.choices(words, k=rng.randint(10, 60))),
+                "liked": i % 7 == 1,
+                "disliked": i % 11 == 1,
+            })
+            if len(rows) == 10_000:
+                await crud.bulk_insert_messages(db, rows)
+                await db.commit()
+                rows = []
+        await crud.bulk_insert_messages(db, rows)
+        await db.commit()
+    return len(conversation_ids)
+
+
+async def time_export(path, compress, trace=False):
+    from backend.app.services import archive
+
+    chunks = archive.export_ndjson()
+    if compress:
+        chunks = archive.gzip_chunks(chunks)
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    with open(path, "wb") as out:
+        async for chunk in chunks:
+            out.write(chunk)
+    elapsed = time.perf_counter() - started
+    peak = None
+    if trace:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, os.path.getsize(path), peak
+
+
+async def read_file(path):
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            yield chunk
+
+
+async def run(args):
+    from backend.app import models
+    from backend.app.database import engine
+    from backend.app.services import archive
+
+    models.Base.metadata.create_all(bind=engine)
+    rng = random.Random(args.seed)
+    conversations = await seed(args, rng)
+    rows = conversations + args.messages
+
+    results = {}
+    for name, compress in (("export_plain", False), ("export_gzip", True)):
+        path = "archive.ndjson.gz" if compress else "archive.ndjson"
+        elapsed, size, _ = await time_export(path, compress)
+        results[name] = {"seconds": round(elapsed, 2), "rows_per_s": round(rows / elapsed), "mb": round(size / 1e6, 1)}
+    # A separate pass, since tracing allocations slows the export several times over
+    _, _, peak = await time_export("archive.ndjson", False, trace=True)
+    results["export_peak_python_mb"] = round(peak / 1e6, 2)
+
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    stats = await archive.import_ndjson(read_file("archive.ndjson.gz"), batch_rows=args.batch_rows)
+    results["import_gzip"] = {
+        "seconds": stats.seconds,
+        "rows_per_s": stats.rows_per_s,
+        "conversations": stats.conversations,
+        "messages": stats.messages,
+    }
+
+    return {
+        "benchmark": "archive",
+        "messages": args.messages,
+        "conversations": conversations,
+        "batch_rows": args.batch_rows,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--messages-per-conversation", type=int, default=50)
+    parser.add_argument("--batch-rows", type=int, default=10_000, help="rows per import transaction")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # The app uses a relative SQLite path, so run inside a scratch directory.
+    project_root = os.getcwd()
+    sys.path.insert(0, project_root)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            result = asyncio.run(run(args))
+        finally:
+            os.chdir(project_root)
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Benchmark for keeping open tabs current: refetch after every change vs pushed deltas.
+
+Runs the FastAPI app in-process against a throwaway SQLite database and a fake
+Gemini transport. For each --tabs count, every tab has the same conversation
+open while --changes messages are sent to it, one at a time, and the tabs keep
+up either by
+  - refetch: each tab reloads the conversation list and the new messages after
+    every change, as the page did after its own mutations
+  - push: each tab holds a `/ws` connection and patches itself from the events
+Statements needed to make the changes themselves (measured with no tabs open)
+are subtracted, so the figures are the reads spent on keeping tabs current.
+With --outbox, events go through the database as they do with several workers.
+Prints SQL statements per change, wall time and push delivery latency as JSON.
+
+Usage (from the project root):
+    python -m backend.benchmarks.bench_change_feed --tabs 1 10 50 --changes 50 [--outbox]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+
+def percentile(samples, pct):
+    """Returns the pct-th percentile (nearest rank) of a list of samples."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def send(client, conversation_id, i):
+    response = client.post(
+        f"/api/conversation/{conversation_id}/send_message",
+        json={"message_content": f"Benchmark message {i}", "api_key": "bench"},
+    )
+    return response.json()["id"]
+
+
+def run(args):
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+
+    from backend.app import main, models
+    from backend.app.database import async_engine, engine
+    from backend.app.services.change_feed import change_feed
+    from backend.app.services.gemini_client import client_manager
+    from backend.benchmarks.fake_gemini import FakeTransport
+
+    models.Base.metadata.create_all(bind=engine)
+    client_manager.set_transport(FakeTransport(latency_ms=0))
+    change_feed.outbox = args.outbox
+    statements = {"count": 0}
+
+    @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+    def count_statement(*_):
+        statements["count"] += 1
+
+    results = {}
+    with TestClient(main.app) as client:
+        conversation_id = client.post("/api/conversation", json={"system_prompt_used": "You are a benchmark."}).json()["id"]
+        newest_id = send(client, conversation_id, "warmup")
+        for _ in range(args.conversations):
+            client.post("/api/conversation", json={"system_prompt_used": "You are a benchmark."})
+
+        # What the changes cost with nobody watching
+        before = statements["count"]
+        for i in range(args.changes):
+            newest_id = send(client, conversation_id, i)
+        per_change = (statements["count"] - before) / args.changes
+
+        for tabs in args.tabs:
+            # refetch: every tab reloads its lists after each change
+            before = statements["count"]
+            started = time.perf_counter()
+            for i in range(args.changes):
+                last_seen = newest_id
+                newest_id = send(client, conversation_id, i)
+                for _ in range(tabs):
+                    client.get("/api/conversations/summary")
+                    client.get(f"/api/conversation/{conversation_id}/messages?after_id={last_seen}")
+            refetch_seconds = time.perf_counter() - started
+            refetch_statements = statements["count"] - before - per_change * args.changes
+
+            # push: every tab receives the message.created events over its socket
+            sockets = [client.websocket_connect("/ws") for _ in range(tabs)]
+            for socket in sockets:
+                socket.__enter__()
+            try:
+                before = statements["count"]
+                started = time.perf_counter()
+                delivery_ms = []
+                for i in range(args.changes):
+                    sent = time.perf_counter()
+                    newest_id = send(client, conversation_id, i)
+                    for socket in sockets:
+                        # The user message, then the reply
+                        socket.receive_text()
+                        socket.receive_text()
+                    delivery_ms.append((time.perf_counter() - sent) * 1000)
+                push_seconds = time.perf_counter() - started
+                push_statements = statements["count"] - before - per_change * args.changes
+            finally:
+                for socket in sockets:
+                    socket.__exit__(None, None, None)
+
+            results[f"tabs_{tabs}"] = {
+                "refetch": {
+                    "seconds": round(refetch_seconds, 3),
+                    "statements_per_change": round(refetch_statements / args.changes, 2),
+                },
+                "push": {
+                    "seconds": round(push_seconds, 3),
+                    # Outbox polls with --outbox; one query per poll interval however many tabs are open
+                    "statements_per_change": round(push_statements / args.changes, 2),
+                    "send_to_all_delivered_ms": {
+                        "p50": round(percentile(delivery_ms, 50), 2),
+                        "p99": round(percentile(delivery_ms, 99), 2),
+                    },
+                },
+            }
+        feed_stats = change_feed.stats()
+
+    return {
+        "benchmark": "change_feed",
+        "changes": args.changes,
+        "outbox": args.outbox,
+        "conversations": args.conversations + 1,
+        "statements_per_change_without_tabs": round(per_change, 2),
+        "results": results,
+        "change_feed": feed_stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tabs", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--changes", type=int, default=50)
+    parser.add_argument("--conversations", type=int, default=50, help="Other conversations in the sidebar list")
+    parser.add_argument("--outbox", action="store_true", help="route events through the database, as with several workers")
+    args = parser.parse_args()
+
+    # The app uses a relative SQLite path, so run inside a scratch directory.
+    project_root = os.getcwd()
+    sys.path.insert(0, project_root)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            result = run(args)
+        finally:
+            os.chdir(project_root)
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Benchmark for batch evaluations against the by-hand workflow.
+
+Runs the FastAPI app in-process against a throwaway SQLite database and a fake
+Gemini transport whose calls take --model-latency-ms plus up to --jitter-ms.
+For --prompts saved prompts and --messages user messages it times:
+  - by hand: a conversation per prompt, then one `send_message` at a time
+  - `POST /api/evaluations` with --concurrency calls in flight, and the time
+    until the first result line arrives
+Prints wall time, the slowest single call and the evaluation's own stats as JSON.
+
+Usage (from the project root):
+    python -m backend.benchmarks.bench_evaluation --prompts 5 --messages 20 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+
+class JitteredTransport:
+    """Wraps the fake transport so each call's latency varies, like real model calls."""
+
+    @staticmethod
+    def create(latency_ms, jitter_ms, seed):
+        from backend.benchmarks.fake_gemini import FakeChat, FakeTransport
+
+        rng = random.Random(seed)
+
+        class Chat(FakeChat):
+            async def send_message_async(self, message, stream=False):
+                await asyncio.sleep(rng.uniform(0, jitter_ms) / 1000)
+                return await super().send_message_async(message, stream=stream)
+
+        class Model:
+            def __init__(self, transport, system_prompt):
+                self._transport = transport
+                self._system_prompt = system_prompt
+
+            def start_chat(self, history=None):
+                return Chat(self._transport, history or [], self._system_prompt)
+
+        class Transport(FakeTransport):
+            def create_model(self, client, model_name, system_prompt):
+                return Model(self, system_prompt)
+
+        return Transport(latency_ms=latency_ms)
+
+
+async def run(args):
+    import httpx
+
+    from backend.app import main, models
+    from backend.app.database import engine
+    from backend.app.services.evaluation import Evaluation, EvaluationPrompt
+    from backend.app.services.gemini_client import client_manager
+
+    models.Base.metadata.create_all(bind=engine)
+    client_manager.set_transport(JitteredTransport.create(args.model_latency_ms, args.jitter_ms, args.seed))
+    messages = [f"Benchmark question {i}: what is {i} squared?" for i in range(args.messages)]
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        prompts = []
+        for i in range(args.prompts):
+            response = await client.post("/api/prompts", json={"name": f"variant {i}", "content": f"You are variant {i}. " * 20})
+            prompts.append(response.json())
+
+        started = time.perf_counter()
+        slowest = 0.0
+        for prompt in prompts:
+            response = await client.post("/api/conversation", json={"system_prompt_used": prompt["content"]})
+            conversation_id = response.json()["id"]
+            for message in messages:
+                call_started = time.perf_counter()
+                await client.post(f"/api/conversation/{conversation_id}/send_message", json={"message_content": message, "api_key": "bench"})
+                slowest = max(slowest, time.perf_counter() - call_started)
+        by_hand = {"seconds": round(time.perf_counter() - started, 3), "slowest_call_ms": round(slowest * 1000, 1)}
+
+        started = time.perf_counter()
+        response = await client.post("/api/evaluations", json={
+            "prompt_ids": [prompt["id"] for prompt in prompts],
+            "messages": messages,
+            "api_key": "bench",
+            "concurrency": args.concurrency,
+        })
+        endpoint_seconds = time.perf_counter() - started
+        lines = [json.loads(line) for line in response.text.splitlines()]
+
+    # The in-process transport buffers the body, so the first result is timed on the stream itself
+    evaluation = Evaluation(
+        "bench", [EvaluationPrompt(prompt["id"], prompt["name"], prompt["content"]) for prompt in prompts], messages,
+        concurrency=args.concurrency,
+    )
+    started = time.perf_counter()
+    first_result_ms = None
+    async for _ in evaluation.stream():
+        if first_result_ms is None:
+            first_result_ms = (time.perf_counter() - started) * 1000
+
+    stats = lines[-1]["stats"]
+    stats.pop("prompts")
+    return {
+        "benchmark": "evaluation",
+        "prompts": args.prompts,
+        "messages": args.messages,
+        "model_latency_ms": args.model_latency_ms,
+        "jitter_ms": args.jitter_ms,
+        "results": {
+            "by_hand": by_hand,
+            "evaluation": {
+                "seconds": round(endpoint_seconds, 3),
+                "first_result_ms": round(first_result_ms, 1),
+                "speedup_vs_by_hand": round(by_hand["seconds"] / endpoint_seconds, 1),
+                "stats": stats,
+            },
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prompts", type=int, default=5)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--model-latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # The app uses a relative SQLite path, so run inside a scratch directory.
+    project_root = os.getcwd()
+    sys.path.insert(0, project_root)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            result = asyncio.run(run(args))
+        finally:
+            os.chdir(project_root)
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
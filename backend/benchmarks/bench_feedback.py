@@ -0,0 +1,168 @@
+"""Benchmark for the per-prompt feedback analytics.
+
+Seeds a throwaway SQLite database with --messages messages spread over
+conversations using --prompts distinct system prompts, some of them liked or
+disliked, and builds the counters with the rebuild command. Then times the
+ranking endpoint `/api/analytics/prompts` (which reads the counters), the
+GROUP BY scan over messages it replaces, and the feedback endpoint, which now
+also moves the counters. Prints the timings as JSON; the ranking latency should
+not grow with --messages.
+
+Usage (from the project root):
+    python -m backend.benchmarks.bench_feedback --messages 500000 --prompts 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+
+def percentile(samples, pct):
+    """Returns the pct-th percentile (nearest rank) of a list of samples."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_summary(samples):
+    return {"p50_ms": round(percentile(samples, 50), 3), "p99_ms": round(percentile(samples, 99), 3)}
+
+
+async def seed(args, rng):
+    from sqlalchemy import insert, select
+
+    from backend.app import crud, models
+    from backend.app.database import AsyncSessionLocal
+
+    conversations = max(1, args.messages // args.messages_per_conversation)
+    async with AsyncSessionLocal() as db:
+        prompts = [f"You are benchmark assistant number {i}. " * 10 for i in range(args.prompts)]
+        await crud.store_prompt_bodies(db, {models.prompt_hash(prompt): prompt for prompt in prompts})
+        await db.execute(insert(models.Conversation), [
+            {"system_prompt_hash": models.prompt_hash(prompts[i % args.prompts])} for i in range(conversations)
+        ])
+        conversation_ids = (await db.scalars(select(models.Conversation.id))).all()
+        await db.commit()
+        rows = []
+        for i in range(args.messages):
+            rated = rng.random() < args.rated_fraction
+            liked = rated and rng.random() < 0.6
+            rows.append({
+                "conversation_id": conversation_ids[i // args.messages_per_conversation % len(conversation_ids)],
+                "sender": "user" if i % 2 == 0 else "ai",
+                "content": "benchmark message",
+                "liked": liked,
+                "disliked": rated and not liked,
+            })
+            if len(rows) == 10_000:
+                await crud.bulk_insert_messages(db, rows)
+                await db.commit()
+                rows = []
+        await crud.bulk_insert_messages(db, rows)
+        await db.commit()
+        ai_message_ids = (await db.scalars(select(models.Message.id).filter(models.Message.sender == "ai").limit(1000))).all()
+    return ai_message_ids
+
+
+async def run(args):
+    import httpx
+    from sqlalchemy import case, func, select
+
+    from backend.app import crud, main, models
+    from backend.app.database import AsyncSessionLocal, engine
+
+    models.Base.metadata.create_all(bind=engine)
+    rng = random.Random(args.seed)
+    ai_message_ids = await seed(args, rng)
+
+    results = {}
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        prompts = await crud.rebuild_prompt_feedback_stats(db)
+    results["rebuild_seconds"] = round(time.perf_counter() - started, 3)
+    results["prompts_with_feedback"] = prompts
+
+    # What answering "which prompt gets the most dislikes" takes without the counters
+    scan = (
+        select(
+            models.Conversation.system_prompt_hash,
+            func.sum(case((models.Message.disliked, 1), else_=0)).label("dislikes"),
+        )
+        .join(models.Message, models.Message.conversation_id == models.Conversation.id)
+        .group_by(models.Conversation.system_prompt_hash)
+        .order_by(func.sum(case((models.Message.disliked, 1), else_=0)).desc())
+        .limit(20)
+    )
+    latencies = []
+    async with AsyncSessionLocal() as db:
+        for _ in range(args.scans):
+            t0 = time.perf_counter()
+            (await db.execute(scan)).all()
+            latencies.append((time.perf_counter() - t0) * 1000)
+    results["group_by_scan"] = latency_summary(latencies)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        latencies = []
+        for _ in range(args.requests):
+            t0 = time.perf_counter()
+            response = await client.get("/api/analytics/prompts")
+            latencies.append((time.perf_counter() - t0) * 1000)
+        assert response.status_code == 200
+        results["ranking_endpoint"] = latency_summary(latencies)
+
+        latencies = []
+        for i in range(args.requests):
+            message_id = rng.choice(ai_message_ids)
+            body = {"liked": True} if i % 2 == 0 else {"disliked": True}
+            t0 = time.perf_counter()
+            response = await client.put(f"/api/message/{message_id}/feedback", json=body)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        assert response.status_code == 200
+        results["feedback_endpoint"] = latency_summary(latencies)
+
+    # The counters must still agree with a full recount
+    async with AsyncSessionLocal() as db:
+        incremental = {row.prompt_hash: (row.likes, row.dislikes) for row in await crud.get_prompt_feedback_stats(db, limit=args.prompts)}
+        await crud.rebuild_prompt_feedback_stats(db)
+        rebuilt = {row.prompt_hash: (row.likes, row.dislikes) for row in await crud.get_prompt_feedback_stats(db, limit=args.prompts)}
+    results["counters_match_recount"] = incremental == rebuilt
+
+    return {
+        "benchmark": "feedback",
+        "messages": args.messages,
+        "prompts": args.prompts,
+        "requests": args.requests,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--messages-per-conversation", type=int, default=20)
+    parser.add_argument("--prompts", type=int, default=50, help="distinct system prompts")
+    parser.add_argument("--rated-fraction", type=float, default=0.1, help="share of messages with feedback")
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint scenario")
+    parser.add_argument("--scans", type=int, default=5, help="timed runs of the GROUP BY scan")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # The app uses a relative SQLite path, so run inside a scratch directory.
+    project_root = os.getcwd()
+    sys.path.insert(0, project_root)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            result = asyncio.run(run(args))
+        finally:
+            os.chdir(project_root)
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
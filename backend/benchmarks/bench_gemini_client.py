@@ -0,0 +1,78 @@
+"""Benchmark for reusing Gemini clients and models across calls.
+
+Sends messages through `generate_gemini_response` with the fake transport, once
+with the client manager's caches enabled and once with them disabled (every
+call builds a new client and model, as the service used to), and prints the
+per-call latency and cache counters as JSON.
+
+Usage (from the project root):
+    python -m backend.benchmarks.bench_gemini_client --calls 500 --setup-ms 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+
+async def measure(manager, calls, concurrency, api_keys, prompts):
+    from backend.app.services import gemini_service
+
+    gemini_service.client_manager = manager
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def call(i):
+        async with semaphore:
+            call_started = time.perf_counter()
+            await gemini_service.generate_gemini_response(
+                api_key=f"key-{i % api_keys}",
+                system_prompt=f"You are benchmark assistant {i % prompts}.",
+                chat_history=[],
+                user_message=f"message {i}",
+            )
+            latencies.append((time.perf_counter() - call_started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(call(i) for i in range(calls)))
+    elapsed = time.perf_counter() - started
+    return {
+        "calls": calls,
+        "mean_call_ms": round(sum(latencies) / len(latencies), 2),
+        "throughput_cps": round(calls / elapsed, 1),
+        "clients_created": manager.transport.clients_created,
+        "cache": manager.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--api-keys", type=int, default=4)
+    parser.add_argument("--prompts", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--setup-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.getcwd())
+    from backend.app.services.gemini_client import GeminiClientManager
+    from backend.benchmarks.fake_gemini import FakeTransport
+
+    def make_manager(cached):
+        transport = FakeTransport(latency_ms=args.latency_ms, setup_ms=args.setup_ms)
+        if cached:
+            return GeminiClientManager(transport)
+        return GeminiClientManager(transport, max_models=0, max_clients=0)
+
+    result = {"benchmark": "gemini_client"}
+    for label, cached in (("uncached", False), ("cached", True)):
+        result[label] = asyncio.run(
+            measure(make_manager(cached), args.calls, args.concurrency, args.api_keys, args.prompts)
+        )
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
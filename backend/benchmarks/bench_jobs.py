@@ -0,0 +1,123 @@
+"""Benchmark for the background job queue.
+
+Runs a JobQueue against a throwaway SQLite database with a handler that sleeps
+for --work-ms, enqueues --jobs jobs as fast as possible and waits for all of
+them to finish. Prints enqueue latency, end-to-end throughput and the queue
+wait (enqueue to start) percentiles as JSON, then repeats with jobs left
+pending by a "previous process" to time recovery through the poller.
+
+Usage (from the project root):
+    python -m backend.benchmarks.bench_jobs --jobs 2000 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+
+def percentile(samples, pct):
+    """Returns the pct-th percentile (nearest rank) of a list of samples."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def make_queue(args, done):
+    from backend.app.config import settings
+    from backend.app.services.job_queue import JobQueue
+
+    settings.job_queue_concurrency = args.concurrency
+    settings.job_queue_poll_interval_seconds = args.poll_interval
+    queue = JobQueue(settings)
+
+    @queue.job("bench")
+    async def work(payload, secrets):
+        if args.work_ms:
+            await asyncio.sleep(args.work_ms / 1000)
+        done.append(time.perf_counter())
+
+    return queue
+
+
+async def wait_for(done, count):
+    while len(done) < count:
+        await asyncio.sleep(0.005)
+
+
+async def run(args):
+    from backend.app import crud, models
+    from backend.app.database import AsyncSessionLocal, engine
+
+    models.Base.metadata.create_all(bind=engine)
+    results = {}
+
+    # Enqueue and drain in one process
+    done = []
+    queue = make_queue(args, done)
+    enqueue_ms = []
+    started = time.perf_counter()
+    for i in range(args.jobs):
+        t0 = time.perf_counter()
+        await queue.enqueue("bench", {"i": i})
+        enqueue_ms.append((time.perf_counter() - t0) * 1000)
+    await wait_for(done, args.jobs)
+    elapsed = time.perf_counter() - started
+    waits = list(queue._wait_ms["bench"])
+    results["enqueue_and_run"] = {
+        "seconds": round(elapsed, 2),
+        "jobs_per_s": round(args.jobs / elapsed),
+        "enqueue_p50_ms": round(percentile(enqueue_ms, 50), 3),
+        "enqueue_p99_ms": round(percentile(enqueue_ms, 99), 3),
+        "wait_p50_ms": round(percentile(waits, 50), 1),
+        "wait_p95_ms": round(percentile(waits, 95), 1),
+    }
+    await queue.stop()
+
+    # Jobs persisted by a process that went away before running them
+    async with AsyncSessionLocal() as db:
+        for i in range(args.jobs):
+            await crud.create_job(db, "bench", json.dumps({"i": i}), 3)
+    done = []
+    queue = make_queue(args, done)
+    started = time.perf_counter()
+    queue.start()
+    await wait_for(done, args.jobs)
+    elapsed = time.perf_counter() - started
+    results["recover_pending"] = {"seconds": round(elapsed, 2), "jobs_per_s": round(args.jobs / elapsed)}
+    results["stats"] = await queue.stats()
+    await queue.stop()
+
+    return {
+        "benchmark": "jobs",
+        "jobs": args.jobs,
+        "concurrency": args.concurrency,
+        "work_ms": args.work_ms,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--work-ms", type=float, default=5.0, help="simulated work per job")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="seconds between polls for pending jobs")
+    args = parser.parse_args()
+
+    # The app uses a relative SQLite path, so run inside a scratch directory.
+    project_root = os.getcwd()
+    sys.path.insert(0, project_root)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            result = asyncio.run(run(args))
+        finally:
+            os.chdir(project_root)
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
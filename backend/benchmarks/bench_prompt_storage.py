@@ -0,0 +1,105 @@
+"""Benchmark for content-addressed system prompt storage.
+
+Creates --conversations conversations in a throwaway SQLite database, using
+--prompts distinct system prompts of --prompt-chars characters each, and
+reports the database file size next to the bytes the prompt texts would take
+if every conversation stored its own copy. Then times `/api/conversations`
+with and without the prompt bodies (`include_system_prompt=false`) and
+prints response sizes and latency percentiles as JSON.
+
+Usage (from the project root):
+    python -m backend.benchmarks.bench_prompt_storage --conversations 20000 --prompt-chars 8000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+
+def percentile(samples, pct):
+    """Returns the pct-th percentile (nearest rank) of a list of samples."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def time_list(client, params, requests):
+    latencies = []
+    size = 0
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = await client.get("/api/conversations", params=params)
+        latencies.append((time.perf_counter() - started) * 1000)
+        size = len(response.content)
+    return {
+        "response_bytes": size,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+    }
+
+
+async def run(args):
+    import httpx
+    from sqlalchemy import insert
+
+    from backend.app import crud, main, models
+    from backend.app.database import AsyncSessionLocal, engine
+
+    models.Base.metadata.create_all(bind=engine)
+    prompts = [(f"Prompt {i}. " + "Follow the house style guide closely. " * args.prompt_chars)[:args.prompt_chars] for i in range(args.prompts)]
+    async with AsyncSessionLocal() as db:
+        await crud.store_prompt_bodies(db, {models.prompt_hash(prompt): prompt for prompt in prompts})
+        for start in range(0, args.conversations, 10_000):
+            await db.execute(insert(models.Conversation), [
+                {"system_prompt_hash": models.prompt_hash(prompts[i % args.prompts])}
+                for i in range(start, min(start + 10_000, args.conversations))
+            ])
+        await db.commit()
+
+    # The database file plus its write-ahead log, which may hold pages not checkpointed yet
+    database_bytes = sum(
+        os.path.getsize(path) for path in (engine.url.database, engine.url.database + "-wal") if os.path.exists(path)
+    )
+    results = {
+        "database_mb": round(database_bytes / 1e6, 2),
+        "inline_prompt_text_mb": round(args.conversations * args.prompt_chars / 1e6, 2),
+    }
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        results["list_with_prompts"] = await time_list(client, {"limit": 100}, args.requests)
+        results["list_without_prompts"] = await time_list(client, {"limit": 100, "include_system_prompt": "false"}, args.requests)
+
+    return {
+        "benchmark": "prompt_storage",
+        "conversations": args.conversations,
+        "prompts": args.prompts,
+        "prompt_chars": args.prompt_chars,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=20_000)
+    parser.add_argument("--prompts", type=int, default=5, help="distinct system prompts")
+    parser.add_argument("--prompt-chars", type=int, default=8000)
+    parser.add_argument("--requests", type=int, default=200, help="requests per list scenario")
+    args = parser.parse_args()
+
+    # The app uses a relative SQLite path, so run inside a scratch directory.
+    project_root = os.getcwd()
+    sys.path.insert(0, project_root)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            result = asyncio.run(run(args))
+        finally:
+            os.chdir(project_root)
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
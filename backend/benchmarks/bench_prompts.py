@@ -0,0 +1,111 @@
+"""Benchmark for the prompt list and single-prompt endpoints.
+
+Runs the FastAPI app in-process against a throwaway SQLite database holding
+--prompts saved prompts and times sequential GETs of `/api/prompts` and
+`/api/prompts/{id}`: full responses, conditional requests answered with 304
+Not Modified, and full responses with the registry checking the database
+version on every request (max staleness 0, the worst case). Prints latency
+percentiles and SQL statements per request as JSON.
+
+Usage (from the project root):
+    python -m backend.benchmarks.bench_prompts --prompts 50 --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+
+def percentile(samples, pct):
+    """Returns the pct-th percentile (nearest rank) of a list of samples."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def time_requests(client, url, requests, statements, headers=None):
+    latencies = []
+    statuses = set()
+    statements_before = statements["count"]
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+        statuses.add(response.status_code)
+    return {
+        "status": sorted(statuses),
+        "requests_per_s": round(requests / (sum(latencies) / 1000)),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "statements_per_request": round((statements["count"] - statements_before) / requests, 3),
+    }
+
+
+async def run(args):
+    import httpx
+    from sqlalchemy import event
+
+    from backend.app import main, models
+    from backend.app.api.prompts import prompt_registry
+    from backend.app.database import async_engine, engine
+
+    models.Base.metadata.create_all(bind=engine)
+    statements = {"count": 0}
+
+    @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+    def count_statement(*_):
+        statements["count"] += 1
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(args.prompts):
+            await client.post("/api/prompts", json={"name": f"prompt {i}", "content": "You are a benchmark. " * 50})
+        response = await client.get("/api/prompts")
+        list_etag = response.headers["etag"]
+        response = await client.get("/api/prompts/1")
+        single_etag = response.headers["etag"]
+
+        results = {
+            "list": await time_requests(client, "/api/prompts", args.requests, statements),
+            "list_not_modified": await time_requests(
+                client, "/api/prompts", args.requests, statements, headers={"If-None-Match": list_etag}
+            ),
+            "single": await time_requests(client, "/api/prompts/1", args.requests, statements),
+            "single_not_modified": await time_requests(
+                client, "/api/prompts/1", args.requests, statements, headers={"If-None-Match": single_etag}
+            ),
+        }
+        prompt_registry.max_staleness_seconds = 0
+        results["list_version_check_every_request"] = await time_requests(client, "/api/prompts", args.requests, statements)
+
+    return {
+        "benchmark": "prompts",
+        "prompts": args.prompts,
+        "requests": args.requests,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prompts", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    args = parser.parse_args()
+
+    # The app uses a relative SQLite path, so run inside a scratch directory.
+    project_root = os.getcwd()
+    sys.path.insert(0, project_root)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            result = asyncio.run(run(args))
+        finally:
+            os.chdir(project_root)
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""Scenario load benchmarks for the chat API.
+
+Runs the FastAPI app in-process against a throwaway SQLite database and the
+fake Gemini transport (configurable latency, stream chunk cadence and error
+rate), drives each scenario and prints one JSON document with throughput and
+p50/p95/p99 latency per scenario. Scenarios:
+
+    chat            many concurrent conversations calling send_message
+    stream          the same over the streaming endpoint (first-chunk latency too)
+    long_history    turns on a conversation with a very long history, with the
+                    context cache cold (history read from the database) and warm
+    sidebar         paging through the conversation summary list with thousands
+                    of conversations
+    feedback_storm  concurrent like/dislike updates on AI messages
+
+Save a run with --output and pass it to a later run with --compare to get the
+relative change of each metric.
+
+Usage (from the project root):
+    python -m backend.benchmarks.bench_scenarios --output before.json
+    python -m backend.benchmarks.bench_scenarios --compare before.json
+    python -m backend.benchmarks.bench_scenarios --scenarios chat,stream --error-rate 0.05
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SCENARIOS = ("chat", "stream", "long_history", "sidebar", "feedback_storm")
+# Metrics compared by --compare; for throughput higher is better, for latencies lower
+COMPARED_METRICS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def percentile(samples, pct):
+    """Returns the pct-th percentile (nearest rank) of a list of samples."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(name, latencies, elapsed, errors, **extra):
+    """Builds the result record of one scenario from its request latencies (ms)."""
+    result = {
+        "scenario": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "mean_ms": round(statistics.mean(latencies), 1),
+    }
+    result.update(extra)
+    return result
+
+
+async def drive(count, concurrency, request):
+    """Calls `request(i)` for i in range(count) with at most `concurrency` in flight.
+
+    `request` returns True on success. Returns (latencies in ms, elapsed seconds, errors).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            ok = await request(i)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    return latencies, time.perf_counter() - started, errors
+
+
+async def seed_conversations(count, messages_per_conversation, content_chars=200):
+    """Inserts conversations with alternating user/AI messages in bulk; returns their ids."""
+    from sqlalchemy import insert, select
+
+    from backend.app import crud, models
+    from backend.app.database import AsyncSessionLocal
+
+    body = "x" * content_chars
+    async with AsyncSessionLocal() as db:
+        marker = f"seed {time.perf_counter()}"
+        prompt_body = await crud.get_or_create_prompt_body(db, marker)
+        await db.execute(insert(models.Conversation), [{"system_prompt_hash": prompt_body.hash} for _ in range(count)])
+        ids = (await db.scalars(
+            select(models.Conversation.id).filter(models.Conversation.system_prompt_hash == prompt_body.hash)
+        )).all()
+        rows = []
+        for conversation_id in ids:
+            for i in range(messages_per_conversation):
+                rows.append({
+                    "conversation_id": conversation_id,
+                    "sender": "user" if i % 2 == 0 else "ai",
+                    "content": f"{i} {body}",
+                })
+                if len(rows) >= 5000:
+                    await crud.bulk_insert_messages(db, rows)
+                    rows = []
+        await crud.bulk_insert_messages(db, rows)
+        await db.commit()
+    return list(ids)
+
+
+async def scenario_chat(client, args):
+    conversation_ids = await seed_conversations(args.conversations, 0)
+
+    async def request(i):
+        conversation_id = conversation_ids[i % len(conversation_ids)]
+        response = await client.post(
+            f"/api/conversation/{conversation_id}/send_message",
+            json={"message_content": f"message {i}", "api_key": "bench"},
+        )
+        return response.status_code == 200
+
+    latencies, elapsed, errors = await drive(args.requests, args.concurrency, request)
+    return summarize("chat", latencies, elapsed, errors, concurrency=args.concurrency, conversations=args.conversations)
+
+
+async def scenario_stream(client, args):
+    conversation_ids = await seed_conversations(args.conversations, 0)
+    first_chunk_latencies = []
+
+    async def request(i):
+        conversation_id = conversation_ids[i % len(conversation_ids)]
+        response = await client.post(
+            f"/api/conversation/{conversation_id}/send_message/stream",
+            json={"message_content": f"message {i}", "api_key": "bench"},
+        )
+        # The in-process transport buffers the body, so first-chunk latency is taken
+        # from the server's own measurement in the done event
+        for line in response.text.splitlines():
+            if line.startswith("data: ") and '"first_chunk_latency_ms"' in line:
+                first_chunk_latencies.append(json.loads(line[6:])["first_chunk_latency_ms"])
+                return True
+        return False
+
+    latencies, elapsed, errors = await drive(args.requests, args.concurrency, request)
+    return summarize(
+        "stream", latencies, elapsed, errors,
+        concurrency=args.concurrency,
+        first_chunk_p50_ms=round(percentile(first_chunk_latencies, 50), 1) if first_chunk_latencies else None,
+        first_chunk_p99_ms=round(percentile(first_chunk_latencies, 99), 1) if first_chunk_latencies else None,
+    )
+
+
+async def scenario_long_history(client, args):
+    from backend.app.services.context_cache import context_cache
+
+    [conversation_id] = await seed_conversations(1, args.history_messages)
+    results = []
+    for cold in (True, False):
+        async def request(i):
+            if cold:
+                context_cache.invalidate(conversation_id)
+            response = await client.post(
+                f"/api/conversation/{conversation_id}/send_message",
+                json={"message_content": f"message {i}", "api_key": "bench"},
+            )
+            return response.status_code == 200
+
+        # One conversation takes one turn at a time, as a single user would
+        latencies, elapsed, errors = await drive(args.history_turns, 1, request)
+        results.append(summarize(
+            "long_history_cold" if cold else "long_history_warm", latencies, elapsed, errors,
+            history_messages=args.history_messages,
+        ))
+
+    async def page(i):
+        response = await client.get(f"/api/conversation/{conversation_id}/messages", params={"limit": 50})
+        return response.status_code == 200
+
+    latencies, elapsed, errors = await drive(args.requests, args.concurrency, page)
+    results.append(summarize("long_history_page", latencies, elapsed, errors, history_messages=args.history_messages))
+    return results
+
+
+async def scenario_sidebar(client, args):
+    await seed_conversations(args.sidebar_conversations, args.sidebar_messages)
+    pages = 0
+
+    async def request(i):
+        # Each client loads the first page and then follows the cursor a few pages back
+        nonlocal pages
+        cursor = None
+        for _ in range(args.sidebar_pages):
+            params = {"limit": 50}
+            if cursor:
+                params["cursor"] = cursor
+            response = await client.get("/api/conversations/summary", params=params)
+            if response.status_code != 200:
+                return False
+            pages += 1
+            cursor = response.json()["next_cursor"]
+            if not cursor:
+                break
+        return True
+
+    count = max(1, args.requests // args.sidebar_pages)
+    latencies, elapsed, errors = await drive(count, args.concurrency, request)
+    return summarize(
+        "sidebar", latencies, elapsed, errors,
+        concurrency=args.concurrency,
+        conversations=args.sidebar_conversations,
+        pages_per_request=args.sidebar_pages,
+        pages_per_s=round(pages / elapsed, 1),
+    )
+
+
+async def scenario_feedback_storm(client, args):
+    from sqlalchemy import select
+
+    from backend.app import models
+    from backend.app.database import AsyncSessionLocal
+
+    conversation_ids = await seed_conversations(args.conversations, 20)
+    async with AsyncSessionLocal() as db:
+        message_ids = (await db.scalars(
+            select(models.Message.id).filter(
+                models.Message.conversation_id.in_(conversation_ids), models.Message.sender == "ai"
+            )
+        )).all()
+
+    async def request(i):
+        response = await client.put(
+            f"/api/message/{message_ids[i % len(message_ids)]}/feedback",
+            json={"liked": i % 2 == 0, "disliked": i % 2 == 1},
+        )
+        return response.status_code == 200
+
+    latencies, elapsed, errors = await drive(args.requests, args.concurrency, request)
+    return summarize("feedback_storm", latencies, elapsed, errors, concurrency=args.concurrency, messages=len(message_ids))
+
+
+async def run(args):
+    import httpx
+
+    from backend.app import main, models
+    from backend.app.database import engine
+    from backend.app.services.gemini_client import client_manager
+    from backend.benchmarks.fake_gemini import FakeTransport
+
+    fake = FakeTransport(
+        latency_ms=args.model_latency_ms,
+        stream_chunks=args.stream_chunks,
+        chunk_interval_ms=args.chunk_interval_ms,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    client_manager.set_transport(fake)
+    models.Base.metadata.create_all(bind=engine)
+
+    runners = {
+        "chat": scenario_chat,
+        "stream": scenario_stream,
+        "long_history": scenario_long_history,
+        "sidebar": scenario_sidebar,
+        "feedback_storm": scenario_feedback_storm,
+    }
+    results = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name in args.scenarios.split(","):
+            result = await runners[name](client, args)
+            results.extend(result if isinstance(result, list) else [result])
+    return results, fake
+
+
+def compare(results, baseline):
+    """Adds to each result the relative change (in percent) of each metric versus the baseline run."""
+    previous = {result["scenario"]: result for result in baseline["results"]}
+    for result in results:
+        before = previous.get(result["scenario"])
+        if before is None:
+            continue
+        result["change_pct"] = {
+            metric: round((result[metric] - before[metric]) / before[metric] * 100, 1)
+            for metric in COMPARED_METRICS
+            if result.get(metric) is not None and before.get(metric)
+        }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=400, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--history-messages", type=int, default=5000)
+    parser.add_argument("--history-turns", type=int, default=20)
+    parser.add_argument("--sidebar-conversations", type=int, default=5000)
+    parser.add_argument("--sidebar-messages", type=int, default=4, help="messages per sidebar conversation")
+    parser.add_argument("--sidebar-pages", type=int, default=4, help="pages each sidebar client walks")
+    parser.add_argument("--model-latency-ms", type=float, default=50.0)
+    parser.add_argument("--stream-chunks", type=int, default=8)
+    parser.add_argument("--chunk-interval-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of model calls that fail")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the results to this file")
+    parser.add_argument("--compare", help="results file of an earlier run to compare against")
+    args = parser.parse_args()
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    # The app uses a relative SQLite path, so run inside a scratch directory.
+    project_root = os.getcwd()
+    sys.path.insert(0, project_root)
+    revision = git_revision()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            # The app logs errors with print(); keep stdout for the JSON report
+            with contextlib.redirect_stdout(sys.stderr):
+                results, fake = asyncio.run(run(args))
+        finally:
+            os.chdir(project_root)
+
+    if baseline is not None:
+        compare(results, baseline)
+    report = {
+        "benchmark": "scenarios",
+        "git_revision": revision,
+        "config": {
+            key: value for key, value in vars(args).items() if key not in ("output", "compare")
+        },
+        "model_calls": fake.calls,
+        "model_errors": fake.errors,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
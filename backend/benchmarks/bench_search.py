@@ -0,0 +1,182 @@
+"""Benchmark for full-text message search over a large corpus.
+
+Seeds a throwaway SQLite database with synthetic conversations (words drawn
+from a Zipf-like vocabulary, so some terms are common and most are rare),
+then times `/api/search` for rare, mid-frequency, common and absent terms,
+two-word queries and filtered queries. Absent and rare terms are also timed
+as a LIKE '%term%' scan, which is what searching took without the index.
+Prints latency percentiles and seeding throughput as JSON.
+
+Usage (from the project root):
+    python -m backend.benchmarks.bench_search --messages 1000000
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+
+def percentile(samples, pct):
+    """Returns the pct-th percentile (nearest rank) of a list of samples."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def make_vocabulary(rng, size):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(4, 9))))
+    return sorted(words)
+
+
+async def seed(args, rng, vocabulary):
+    from sqlalchemy import insert, select
+
+    from backend.app import crud, models
+    from backend.app.database import AsyncSessionLocal
+
+    # Word i is drawn with weight 1/(i+1), like word frequencies in natural text
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    conversations = max(1, args.messages // args.messages_per_conversation)
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        prompt_body = await crud.get_or_create_prompt_body(db, "search benchmark")
+        await db.execute(insert(models.Conversation), [{"system_prompt_hash": prompt_body.hash}] * conversations)
+        conversation_ids = (await db.scalars(select(models.Conversation.id))).all()
+        await db.commit()
+        rows = []
+        for i in range(args.messages):
+            words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(10, 40))
+            rows.append({
+                "conversation_id": conversation_ids[i // args.messages_per_conversation % len(conversation_ids)],
+                "sender": "user" if i % 2 == 0 else "ai",
+                "content": " ".join(words),
+            })
+            if len(rows) == args.batch_size:
+                await crud.bulk_insert_messages(db, rows)
+                await db.commit()
+                rows = []
+        await crud.bulk_insert_messages(db, rows)
+        await db.commit()
+    elapsed = time.perf_counter() - started
+    return conversation_ids, elapsed
+
+
+async def time_queries(client, queries, repeat):
+    latencies = []
+    hits = []
+    for _ in range(repeat):
+        for params in queries:
+            started = time.perf_counter()
+            response = await client.get("/api/search", params=params)
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits.append(len(response.json()["items"]))
+    return {
+        "queries": len(latencies),
+        "mean_results": round(statistics.mean(hits), 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+async def time_like_scan(terms):
+    from sqlalchemy import select
+
+    from backend.app import models
+    from backend.app.database import AsyncSessionLocal
+
+    latencies = []
+    async with AsyncSessionLocal() as db:
+        for term in terms:
+            started = time.perf_counter()
+            await db.execute(
+                select(models.Message.id).filter(models.Message.content.like(f"%{term}%")).limit(20)
+            )
+            latencies.append((time.perf_counter() - started) * 1000)
+    return {
+        "queries": len(latencies),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "max_ms": round(max(latencies), 2),
+    }
+
+
+async def run(args):
+    import httpx
+
+    from backend.app import main, models
+    from backend.app.database import engine
+
+    models.Base.metadata.create_all(bind=engine)
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(rng, args.vocabulary)
+    conversation_ids, seed_seconds = await seed(args, rng, vocabulary)
+
+    common = vocabulary[:20]
+    mid = vocabulary[200:220]
+    rare = vocabulary[-20:]
+    scenarios = {
+        "rare_term": [{"q": word} for word in rare],
+        "mid_term": [{"q": word} for word in mid],
+        "common_term": [{"q": word} for word in common],
+        # Words outside the vocabulary: no match, the worst case for a scan
+        "missing_term": [{"q": f"zz{word}"} for word in rare],
+        "two_terms": [{"q": f"{a} {b}"} for a, b in zip(mid, common)],
+        "conversation_filter": [
+            {"q": word, "conversation_id": rng.choice(conversation_ids)} for word in common
+        ],
+        "sender_filter_page_3": [{"q": word, "sender": "ai", "skip": 40} for word in mid],
+    }
+
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, queries in scenarios.items():
+            results[name] = await time_queries(client, queries, args.repeat)
+    # A rare term makes the scan read most of the table before it finds 20 matches,
+    # an absent one makes it read all of it
+    results["like_scan_rare_term"] = await time_like_scan(rare[:args.like_queries])
+    results["like_scan_missing_term"] = await time_like_scan([f"zz{word}" for word in rare[:args.like_queries]])
+
+    return {
+        "benchmark": "search",
+        "messages": args.messages,
+        "conversations": len(conversation_ids),
+        "seed_rows_per_s": round(args.messages / seed_seconds),
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--messages-per-conversation", type=int, default=50)
+    parser.add_argument("--vocabulary", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5, help="times each query is run")
+    parser.add_argument("--like-queries", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # The app uses a relative SQLite path, so run inside a scratch directory.
+    project_root = os.getcwd()
+    sys.path.insert(0, project_root)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            result = asyncio.run(run(args))
+        finally:
+            os.chdir(project_root)
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
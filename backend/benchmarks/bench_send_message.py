@@ -0,0 +1,104 @@
+"""Load benchmark for concurrent `send_message` calls.
+
+Runs the FastAPI app in-process against a throwaway SQLite database and the
+fake Gemini transport with fixed latency, fires concurrent `send_message`
+requests and prints latency percentiles and database commits per turn as JSON.
+
+Usage (from the project root):
+    python -m backend.benchmarks.bench_send_message --requests 400 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def percentile(samples, pct):
+    """Returns the pct-th percentile (nearest rank) of a list of samples."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run(args):
+    import httpx
+
+    from backend.app import main, models
+    from backend.app.database import commit_stats, engine
+    from backend.app.services.gemini_client import client_manager
+    from backend.benchmarks.fake_gemini import FakeTransport
+
+    client_manager.set_transport(FakeTransport(latency_ms=args.model_latency_ms))
+    models.Base.metadata.create_all(bind=engine)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        conversation_ids = []
+        for _ in range(args.conversations):
+            response = await client.post("/api/conversation", json={"system_prompt_used": "You are a benchmark."})
+            conversation_ids.append(response.json()["id"])
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies = []
+        errors = 0
+
+        async def send(i):
+            nonlocal errors
+            conversation_id = conversation_ids[i % len(conversation_ids)]
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(
+                    f"/api/conversation/{conversation_id}/send_message",
+                    json={"message_content": f"message {i}", "api_key": "bench"},
+                )
+                latencies.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    errors += 1
+
+        commits_before = commit_stats["write_commits"]
+        started = time.perf_counter()
+        await asyncio.gather(*(send(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - started
+        commits = commit_stats["write_commits"] - commits_before
+
+    return {
+        "benchmark": "send_message",
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "model_latency_ms": args.model_latency_ms,
+        "errors": errors,
+        "throughput_rps": round(args.requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "mean_ms": round(statistics.mean(latencies), 1),
+        "commits_per_turn": round(commits / args.requests, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--model-latency-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    # The app uses a relative SQLite path, so run inside a scratch directory.
+    project_root = os.getcwd()
+    sys.path.insert(0, project_root)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            result = asyncio.run(run(args))
+        finally:
+            os.chdir(project_root)
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Concurrent read/write benchmark for the SQLite storage profiles.
+
+For each combination of storage profile and async pool size, writer tasks
+insert messages (one commit each) while reader tasks page through the latest
+messages of the same conversation. Prints throughput, p99 latencies and the
+number of "database is locked" errors as JSON.
+
+Usage (from the project root):
+    python -m backend.benchmarks.bench_sqlite_profile --writers 8 --readers 8 --writes 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+
+def percentile(samples, pct):
+    """Returns the pct-th percentile (nearest rank) of a list of samples."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_case(args, profile, pool_size, workdir):
+    from sqlalchemy.exc import OperationalError
+    from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+    from backend.app import crud, models
+    from backend.app.config import Settings
+    from backend.app.database import create_app_engine, create_app_async_engine
+
+    config = Settings(
+        database_url=f"sqlite:///{os.path.join(workdir, f'{profile}-{pool_size}.db')}",
+        sqlite_profile=profile,
+        db_pool_size=pool_size,
+        db_max_overflow=0,
+    )
+    sync_engine = create_app_engine(config)
+    models.Base.metadata.create_all(bind=sync_engine)
+    sync_engine.dispose()
+
+    async_engine = create_app_async_engine(config)
+    Session = async_sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
+    async with Session() as db:
+        conversation = await crud.create_conversation(db, system_prompt_used="benchmark")
+        for i in range(args.seed_messages):
+            db.add(models.Message(conversation_id=conversation.id, sender="user", content=f"seed {i}"))
+        await db.commit()
+
+    write_latencies, read_latencies = [], []
+    lock_errors = 0
+    writers_done = asyncio.Event()
+
+    async def writer(n):
+        nonlocal lock_errors
+        for i in range(args.writes):
+            started = time.perf_counter()
+            try:
+                async with Session() as db:
+                    crud.add_message(db, conversation.id, "user", f"writer {n} message {i}")
+                    await db.commit()
+            except OperationalError:
+                lock_errors += 1
+                continue
+            write_latencies.append((time.perf_counter() - started) * 1000)
+
+    async def reader():
+        nonlocal lock_errors
+        while not writers_done.is_set():
+            started = time.perf_counter()
+            try:
+                async with Session() as db:
+                    await crud.get_messages_for_conversation(db, conversation.id, limit=50)
+            except OperationalError:
+                lock_errors += 1
+                continue
+            read_latencies.append((time.perf_counter() - started) * 1000)
+
+    async def writers():
+        await asyncio.gather(*(writer(n) for n in range(args.writers)))
+        writers_done.set()
+
+    started = time.perf_counter()
+    await asyncio.gather(writers(), *(reader() for _ in range(args.readers)))
+    elapsed = time.perf_counter() - started
+    await async_engine.dispose()
+
+    return {
+        "profile": profile,
+        "pool_size": pool_size,
+        "writes_per_s": round(len(write_latencies) / elapsed, 1),
+        "reads_per_s": round(len(read_latencies) / elapsed, 1),
+        "write_p99_ms": round(percentile(write_latencies, 99), 1),
+        "read_p99_ms": round(percentile(read_latencies, 99), 1) if read_latencies else None,
+        "lock_errors": lock_errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=200, help="commits per writer")
+    parser.add_argument("--seed-messages", type=int, default=2000)
+    parser.add_argument("--pool-sizes", default="1,4,8")
+    parser.add_argument("--profiles", default="legacy,production")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.getcwd())
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for profile in args.profiles.split(","):
+            for pool_size in (int(size) for size in args.pool_sizes.split(",")):
+                results.append(asyncio.run(run_case(args, profile, pool_size, workdir)))
+    print(json.dumps({"benchmark": "sqlite_profile", "results": results}))
+
+
+if __name__ == "__main__":
+    main()
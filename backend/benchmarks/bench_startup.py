@@ -0,0 +1,143 @@
+"""Benchmark for server cold start and time to first byte.
+
+Migrates a throwaway SQLite database, then starts the production entrypoint
+(`python -m backend.app.serve`) --starts times and measures the time from
+spawning the process until `/` first answers 200, and from SIGTERM until the
+process exits. On the last start it times sequential requests over one
+keep-alive connection for the page and a hashed script URL, uncompressed,
+gzip, brotli and revalidated (304). Prints percentiles of the time to first
+byte (response headers received) and bytes on the wire as JSON.
+
+Usage (from the project root):
+    python -m backend.benchmarks.bench_startup --starts 5 --workers 2 --requests 1000
+"""
+import argparse
+import http.client
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def percentile(samples, pct):
+    """Returns the pct-th percentile (nearest rank) of a list of samples."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def wait_until_serving(port, process, timeout=60.0):
+    """Polls `/` until it answers 200; returns the response body."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/")
+            response = connection.getresponse()
+            body = response.read()
+            connection.close()
+            if response.status == 200:
+                return body.decode()
+        except OSError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError("server did not start in time")
+
+
+def time_requests(port, url, requests, headers):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    first_byte, total = [], []
+    statuses, wire_bytes = set(), 0
+    for _ in range(requests):
+        started = time.perf_counter()
+        connection.request("GET", url, headers=headers)
+        response = connection.getresponse()
+        first_byte.append((time.perf_counter() - started) * 1000)
+        wire_bytes = len(response.read())
+        total.append((time.perf_counter() - started) * 1000)
+        statuses.add(response.status)
+    connection.close()
+    return {
+        "status": sorted(statuses),
+        "bytes": wire_bytes,
+        "ttfb_p50_ms": round(percentile(first_byte, 50), 3),
+        "ttfb_p99_ms": round(percentile(first_byte, 99), 3),
+        "total_p50_ms": round(percentile(total, 50), 3),
+    }
+
+
+def time_responses(port, html, requests):
+    script_url = re.search(r'src="(/static/script\.[0-9a-f]+\.js)"', html).group(1)
+    results = {}
+    for name, url in (("index", "/"), ("script", script_url)):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        connection.request("GET", url, headers={"Accept-Encoding": "br"})
+        etag = connection.getresponse().getheader("ETag")
+        connection.close()
+        for variant, headers in (
+            ("identity", {}),
+            ("gzip", {"Accept-Encoding": "gzip"}),
+            ("br", {"Accept-Encoding": "br, gzip"}),
+            ("not_modified", {"Accept-Encoding": "br, gzip", "If-None-Match": etag}),
+        ):
+            results[f"{name}_{variant}"] = time_requests(port, url, requests, headers)
+    return results
+
+
+def run(args, project_root, workdir):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{workdir}/bench.db", PYTHONPATH=project_root)
+    started = time.perf_counter()
+    subprocess.run(["alembic", "upgrade", "head"], cwd=project_root, env=env, check=True, capture_output=True)
+    migrate_seconds = time.perf_counter() - started
+
+    starts, stops, responses = [], [], None
+    command = [sys.executable, "-m", "backend.app.serve", "--host", "127.0.0.1", "--port", str(args.port),
+               "--workers", str(args.workers)]
+    for i in range(args.starts):
+        started = time.perf_counter()
+        process = subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            html = wait_until_serving(args.port, process)
+            starts.append(time.perf_counter() - started)
+            if i == args.starts - 1:
+                responses = time_responses(args.port, html, args.requests)
+        finally:
+            stopping = time.perf_counter()
+            process.send_signal(signal.SIGTERM)
+            process.wait(timeout=60)
+            stops.append(time.perf_counter() - stopping)
+
+    return {
+        "benchmark": "startup",
+        "workers": args.workers,
+        "migrate_seconds": round(migrate_seconds, 3),
+        "cold_start_seconds": {"p50": round(percentile(starts, 50), 3), "max": round(max(starts), 3)},
+        "shutdown_seconds": {"p50": round(percentile(stops, 50), 3), "max": round(max(stops), 3)},
+        "requests": args.requests,
+        "results": responses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--starts", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per scenario")
+    parser.add_argument("--port", type=int, default=9871)
+    args = parser.parse_args()
+
+    # The servers run inside a scratch directory, with their database in it
+    project_root = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        result = run(args, project_root, workdir)
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Deterministic stand-in for the Gemini API, plugged in through `GeminiTransport`.
+
+Replies echo the user message. Latency, stream chunking, error rate and client
+setup cost are configurable, so benchmarks can exercise the real service code
+without a network connection or an API key.
+"""
+import asyncio
+import random
+import time
+
+from google.api_core import exceptions as google_exceptions
+
+from backend.app.services.gemini_client import GeminiTransport
+
+
+def _tokens(text):
+    return (len(text) + 3) // 4
+
+
+class FakeUsage:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class FakeChunk:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.parts = [text]
+        self.usage_metadata = usage_metadata
+
+
+class FakeStreamResponse:
+    def __init__(self, chunks, first_chunk_delay, chunk_interval, usage_metadata=None, fail_after=None):
+        self._chunks = chunks
+        self._first_chunk_delay = first_chunk_delay
+        self._chunk_interval = chunk_interval
+        self.usage_metadata = usage_metadata
+        # Index of the chunk at which the stream breaks off with an error, if any
+        self._fail_after = fail_after
+
+    async def __aiter__(self):
+        for index, chunk in enumerate(self._chunks):
+            await asyncio.sleep(self._first_chunk_delay if index == 0 else self._chunk_interval)
+            if index == self._fail_after:
+                raise google_exceptions.ServiceUnavailable("Fake stream interrupted")
+            yield FakeChunk(chunk)
+
+
+class FakeChat:
+    def __init__(self, transport, history, system_prompt=""):
+        self._transport = transport
+        self.history = history
+        self._system_prompt = system_prompt
+
+    async def send_message_async(self, message, stream=False):
+        transport = self._transport
+        transport.calls += 1
+        failing = transport.should_fail()
+        text = f"Echo: {message}"
+        prompt_text = self._system_prompt + message + "".join(part for entry in self.history for part in entry["parts"])
+        usage = FakeUsage(_tokens(prompt_text), _tokens(text))
+        if stream:
+            size = max(1, -(-len(text) // transport.stream_chunks))
+            chunks = [text[i:i + size] for i in range(0, len(text), size)]
+            fail_after = transport.random.randrange(len(chunks)) if failing else None
+            return FakeStreamResponse(chunks, transport.latency_ms / 1000, transport.chunk_interval_ms / 1000, usage, fail_after)
+        await asyncio.sleep(transport.latency_ms / 1000)
+        if failing:
+            raise google_exceptions.ServiceUnavailable("Fake upstream error")
+        return FakeChunk(text, usage)
+
+
+class FakeModel:
+    def __init__(self, transport, model_name, system_prompt):
+        self._transport = transport
+        self.model_name = model_name
+        self.system_prompt = system_prompt
+
+    def start_chat(self, history=None):
+        return FakeChat(self._transport, history or [], self.system_prompt or "")
+
+
+class FakeTransport(GeminiTransport):
+    """Fake transport with fixed reply latency and simulated client setup cost.
+
+    `setup_ms` is spent (blocking) each time a client is created, mirroring the
+    channel and credential setup that the real SDK does per client.
+    `error_rate` is the fraction of calls that fail with a 503 (ServiceUnavailable),
+    like a transient upstream outage; streamed calls break off at a random chunk.
+    Failures are drawn from a seeded generator, so runs are repeatable.
+    """
+
+    def __init__(self, latency_ms=50.0, stream_chunks=8, chunk_interval_ms=10.0, setup_ms=0.0, error_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.stream_chunks = stream_chunks
+        self.chunk_interval_ms = chunk_interval_ms
+        self.setup_ms = setup_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+        self.clients_created = 0
+
+    def should_fail(self):
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            return True
+        return False
+
+    def create_client(self, api_key):
+        self.clients_created += 1
+        if self.setup_ms:
+            time.sleep(self.setup_ms / 1000)
+        return object()
+
+    def create_model(self, client, model_name, system_prompt):
+        return FakeModel(self, model_name, system_prompt)
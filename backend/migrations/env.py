@@ -0,0 +1,67 @@
+from logging.config import fileConfig
+
+from alembic import context
+
+from backend.app import models
+from backend.app.database import engine
+
+# Alembic Config object, which provides access to the values within alembic.ini
+config = context.config
+
+# Set up Python logging from the config file
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+# Metadata used by `alembic revision --autogenerate` to diff models against the database
+target_metadata = models.Base.metadata
+
+
+def include_name(name, type_, parent_names) -> bool:
+    """Leaves the full-text search objects, which have no model, out of autogenerate."""
+    return not (name or "").startswith(("messages_fts", "ix_messages_content_fts"))
+
+
+def run_migrations_offline() -> None:
+    """Emits migration SQL to stdout without connecting (`alembic upgrade head --sql`)."""
+    context.configure(
+        url=engine.url.render_as_string(hide_password=False),
+        target_metadata=target_metadata,
+        include_name=include_name,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=engine.dialect.name == "sqlite",
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_on(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_name=include_name,
+        # SQLite cannot ALTER most column properties; batch mode recreates the table instead
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """Runs migrations against the database configured by the DATABASE_URL setting.
+
+    A connection passed in `config.attributes["connection"]` (as the tests do) is
+    used instead.
+    """
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        run_migrations_on(connection)
+        return
+    with engine.connect() as connection:
+        run_migrations_on(connection)
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,43 @@
+"""response cache
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:18:31.445663
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('response_cache',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('model', sa.String(), nullable=False),
+    sa.Column('response', sa.Text(), nullable=False),
+    sa.Column('model_latency_ms', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index('ix_response_cache_created_at', 'response_cache', ['created_at'], unique=False)
+
+    op.add_column('conversations', sa.Column('response_cache_bypass', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # SQLite cannot drop columns in place; batch mode recreates the table
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.drop_column('response_cache_bypass')
+
+    op.drop_index('ix_response_cache_created_at', table_name='response_cache')
+    op.drop_table('response_cache')
@@ -0,0 +1,60 @@
+"""prompt feedback stats
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 11:02:47.190366
+
+"""
+from typing import Sequence, Union
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    stats = op.create_table('prompt_feedback_stats',
+    sa.Column('prompt_hash', sa.String(length=64), nullable=False),
+    sa.Column('system_prompt', sa.Text(), nullable=False),
+    sa.Column('likes', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('dislikes', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('prompt_hash')
+    )
+    op.create_index('ix_prompt_feedback_stats_dislikes', 'prompt_feedback_stats', ['dislikes'], unique=False)
+    op.create_index('ix_prompt_feedback_stats_likes', 'prompt_feedback_stats', ['likes'], unique=False)
+
+    # Backfill the counters from the existing feedback (crud.rebuild_prompt_feedback_stats)
+    rows = op.get_bind().execute(sa.text("""
+        SELECT c.system_prompt_used,
+               SUM(CASE WHEN m.liked THEN 1 ELSE 0 END),
+               SUM(CASE WHEN m.disliked THEN 1 ELSE 0 END)
+        FROM conversations AS c JOIN messages AS m ON m.conversation_id = c.id
+        WHERE m.liked OR m.disliked
+        GROUP BY c.system_prompt_used
+    """)).all()
+    if rows:
+        op.bulk_insert(stats, [
+            {
+                'prompt_hash': hashlib.sha256(system_prompt.encode()).hexdigest(),
+                'system_prompt': system_prompt,
+                'likes': likes,
+                'dislikes': dislikes,
+            }
+            for system_prompt, likes, dislikes in rows
+        ])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_prompt_feedback_stats_likes', table_name='prompt_feedback_stats')
+    op.drop_index('ix_prompt_feedback_stats_dislikes', table_name='prompt_feedback_stats')
+    op.drop_table('prompt_feedback_stats')
@@ -0,0 +1,117 @@
+"""prompt bodies
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 13:26:09.842113
+
+"""
+from typing import Sequence, Union
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Conversations read and updated per statement while moving prompt texts
+BATCH_ROWS = 5000
+
+
+def _hash(content: str) -> str:
+    # models.prompt_hash, copied so the migration does not change if the model does
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    prompt_bodies = op.create_table('prompt_bodies',
+    sa.Column('hash', sa.String(length=64), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('hash')
+    )
+    op.add_column('conversations', sa.Column('system_prompt_hash', sa.String(length=64), nullable=True))
+
+    # Move every distinct prompt text into prompt_bodies and point the conversations at it,
+    # walking the conversations in id order so memory stays bounded by the batch size
+    # (plus one hash per distinct text)
+    connection = op.get_bind()
+    conversations = sa.table('conversations', sa.column('id', sa.Integer), sa.column('system_prompt_used', sa.Text), sa.column('system_prompt_hash', sa.String))
+    stored = set()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(conversations.c.id, conversations.c.system_prompt_used)
+            .where(conversations.c.id > last_id)
+            .order_by(conversations.c.id)
+            .limit(BATCH_ROWS)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        hashes = [(row.id, _hash(row.system_prompt_used)) for row in rows]
+        new_bodies = {}
+        for (_, key), row in zip(hashes, rows):
+            if key not in stored:
+                new_bodies[key] = row.system_prompt_used
+        if new_bodies:
+            op.bulk_insert(prompt_bodies, [{'hash': key, 'content': content} for key, content in new_bodies.items()])
+            stored.update(new_bodies)
+        connection.execute(
+            conversations.update()
+            .where(conversations.c.id == sa.bindparam('cid'))
+            .values(system_prompt_hash=sa.bindparam('key')),
+            [{'cid': conversation_id, 'key': key} for conversation_id, key in hashes],
+        )
+
+    # Feedback counters can outlive their conversations, so their texts may not be stored yet
+    stats = sa.table('prompt_feedback_stats', sa.column('prompt_hash', sa.String), sa.column('system_prompt', sa.Text))
+    orphaned = {
+        row.prompt_hash: row.system_prompt
+        for row in connection.execute(sa.select(stats.c.prompt_hash, stats.c.system_prompt)).all()
+        if row.prompt_hash not in stored
+    }
+    if orphaned:
+        op.bulk_insert(prompt_bodies, [{'hash': key, 'content': content} for key, content in orphaned.items()])
+
+    # SQLite cannot alter columns or add foreign keys in place; batch mode recreates the table
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.alter_column('system_prompt_hash', existing_type=sa.String(length=64), nullable=False)
+        batch_op.create_index('ix_conversations_system_prompt_hash', ['system_prompt_hash'], unique=False)
+        batch_op.create_foreign_key('fk_conversations_system_prompt_hash', 'prompt_bodies', ['system_prompt_hash'], ['hash'])
+        batch_op.drop_column('system_prompt_used')
+
+    with op.batch_alter_table('prompt_feedback_stats', schema=None) as batch_op:
+        batch_op.create_foreign_key('fk_prompt_feedback_stats_prompt_hash', 'prompt_bodies', ['prompt_hash'], ['hash'])
+        batch_op.drop_column('system_prompt')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('prompt_feedback_stats', sa.Column('system_prompt', sa.Text(), nullable=True))
+    op.add_column('conversations', sa.Column('system_prompt_used', sa.Text(), nullable=True))
+    op.execute(
+        'UPDATE prompt_feedback_stats SET system_prompt = '
+        '(SELECT content FROM prompt_bodies WHERE prompt_bodies.hash = prompt_feedback_stats.prompt_hash)'
+    )
+    op.execute(
+        'UPDATE conversations SET system_prompt_used = '
+        '(SELECT content FROM prompt_bodies WHERE prompt_bodies.hash = conversations.system_prompt_hash)'
+    )
+
+    with op.batch_alter_table('prompt_feedback_stats', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_prompt_feedback_stats_prompt_hash', type_='foreignkey')
+        batch_op.alter_column('system_prompt', existing_type=sa.Text(), nullable=False)
+
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_conversations_system_prompt_hash', type_='foreignkey')
+        batch_op.drop_index('ix_conversations_system_prompt_hash')
+        batch_op.alter_column('system_prompt_used', existing_type=sa.Text(), nullable=False)
+        batch_op.drop_column('system_prompt_hash')
+
+    op.drop_table('prompt_bodies')
@@ -0,0 +1,45 @@
+"""unique active job dedupe key
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 18:05:12.418337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, Sequence[str], None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ACTIVE_JOB_CONDITION = "status IN ('pending', 'running')"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Concurrent enqueues may already have stored duplicates; the oldest active job of
+    # each key keeps it, the others still run but no longer count for deduplication
+    op.execute(
+        "UPDATE jobs SET dedupe_key = NULL "
+        f"WHERE dedupe_key IS NOT NULL AND {ACTIVE_JOB_CONDITION} AND id NOT IN ("
+        f"SELECT MIN(id) FROM jobs WHERE dedupe_key IS NOT NULL AND {ACTIVE_JOB_CONDITION} GROUP BY dedupe_key)"
+    )
+    op.drop_index('ix_jobs_dedupe_key', table_name='jobs')
+    op.create_index(
+        'uq_jobs_active_dedupe_key', 'jobs', ['dedupe_key'], unique=True,
+        sqlite_where=sa.text(ACTIVE_JOB_CONDITION), postgresql_where=sa.text(ACTIVE_JOB_CONDITION),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        'uq_jobs_active_dedupe_key', table_name='jobs',
+        sqlite_where=sa.text(ACTIVE_JOB_CONDITION), postgresql_where=sa.text(ACTIVE_JOB_CONDITION),
+    )
+    op.create_index('ix_jobs_dedupe_key', 'jobs', ['dedupe_key'], unique=False)
@@ -0,0 +1,164 @@
+"""Shared fixtures: every database test runs once on SQLite and once on PostgreSQL.
+
+Each backend gets a template database migrated to head once per session, and
+each test gets a fresh copy of it. PostgreSQL comes from TEST_POSTGRES_URL (a
+server where the test user may create databases), or else from a throwaway
+server started with the `pgserver` package; without either the PostgreSQL runs
+are skipped.
+"""
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from backend.app.config import Settings
+from backend.app.database import AsyncSessionLocal, apply_sqlite_pragmas, to_async_url, to_sync_url
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+BACKENDS = ["sqlite", "postgresql"]
+
+
+def alembic_config(connection) -> Config:
+    """An Alembic config that migrates the given connection (see migrations/env.py)."""
+    config = Config()
+    config.set_main_option("script_location", str(MIGRATIONS_DIR))
+    config.attributes["connection"] = connection
+    return config
+
+
+def run_alembic(url: str, name: str, *args) -> None:
+    """Runs an Alembic command (e.g. "upgrade", "head") against a database in one transaction."""
+    engine = create_engine(to_sync_url(url), poolclass=NullPool)
+    try:
+        with engine.begin() as connection:
+            getattr(command, name)(alembic_config(connection), *args)
+    finally:
+        engine.dispose()
+
+
+@pytest.fixture
+def alembic():
+    return run_alembic
+
+
+@pytest.fixture(scope="session")
+def postgres_admin_url(tmp_path_factory):
+    url = os.environ.get("TEST_POSTGRES_URL")
+    if url:
+        yield url
+        return
+    pgserver = pytest.importorskip("pgserver", reason="set TEST_POSTGRES_URL or install pgserver")
+    server = pgserver.get_server(tmp_path_factory.mktemp("pgdata"), cleanup_mode="stop")
+    yield server.get_uri()
+    server.cleanup()
+
+
+class PostgresDatabases:
+    """Creates databases on a PostgreSQL server, copied from a migrated template."""
+
+    def __init__(self, admin_url: str):
+        self.admin_url = make_url(to_sync_url(admin_url))
+        self.admin = create_engine(self.admin_url, isolation_level="AUTOCOMMIT", poolclass=NullPool)
+        self.template = None
+
+    def url(self, name: str) -> str:
+        return self.admin_url.set(database=name).render_as_string(hide_password=False)
+
+    def create(self, template: str = None) -> str:
+        name = f"promptcraft_test_{uuid.uuid4().hex[:12]}"
+        with self.admin.connect() as connection:
+            connection.execute(text(f'CREATE DATABASE "{name}"' + (f' TEMPLATE "{template}"' if template else "")))
+        return name
+
+    def drop(self, name: str) -> None:
+        with self.admin.connect() as connection:
+            connection.execute(text(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
+
+
+@pytest.fixture(scope="session")
+def postgres_databases(postgres_admin_url):
+    databases = PostgresDatabases(postgres_admin_url)
+    databases.template = databases.create()
+    run_alembic(databases.url(databases.template), "upgrade", "head")
+    yield databases
+    databases.drop(databases.template)
+    databases.admin.dispose()
+
+
+@pytest.fixture(scope="session")
+def sqlite_template(tmp_path_factory):
+    path = tmp_path_factory.mktemp("sqlite") / "template.db"
+    run_alembic(f"sqlite:///{path}", "upgrade", "head")
+    return path
+
+
+@pytest.fixture(params=BACKENDS)
+def empty_database_url(request, tmp_path):
+    """The URL of a new database with no tables."""
+    if request.param == "sqlite":
+        yield f"sqlite:///{tmp_path / 'test.db'}"
+        return
+    databases = request.getfixturevalue("postgres_databases")
+    name = databases.create()
+    yield databases.url(name)
+    databases.drop(name)
+
+
+@pytest.fixture(params=BACKENDS)
+def database_url(request, tmp_path):
+    """The URL of a new database migrated to head."""
+    if request.param == "sqlite":
+        path = tmp_path / "test.db"
+        shutil.copyfile(request.getfixturevalue("sqlite_template"), path)
+        yield f"sqlite:///{path}"
+        return
+    databases = request.getfixturevalue("postgres_databases")
+    name = databases.create(template=databases.template)
+    yield databases.url(name)
+    databases.drop(name)
+
+
+@pytest.fixture
+def db_engine(database_url):
+    """Points the app's session factory (used by every service) at the test database."""
+    # No pool: TestClient runs the app on an event loop of its own, and pooled async
+    # connections cannot move between loops
+    engine = create_async_engine(to_async_url(database_url), poolclass=NullPool)
+    apply_sqlite_pragmas(engine.sync_engine, Settings(database_url=database_url))
+    previous = AsyncSessionLocal.kw["bind"]
+    AsyncSessionLocal.configure(bind=engine)
+    yield engine
+    AsyncSessionLocal.configure(bind=previous)
+
+
+@pytest.fixture
+async def db(db_engine):
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    """Gives each test empty in-process caches and a single-worker change feed."""
+    from backend.app.api import chat, prompts
+    from backend.app.services.change_feed import change_feed
+    from backend.app.services.context_cache import ConversationContextCache
+
+    monkeypatch.setattr(chat, "context_cache", ConversationContextCache())
+    monkeypatch.setattr(change_feed, "outbox", False)
+    prompts.prompt_registry.invalidate()
+    yield
+    prompts.prompt_registry.invalidate()
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
@@ -0,0 +1,260 @@
+import gzip
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, delete, insert
+from sqlalchemy.pool import NullPool
+
+from backend.app import main, models
+from backend.app.api import chat
+from backend.app.config import settings
+from backend.app.database import to_sync_url
+from backend.app.services.context_cache import ConversationContextCache
+from backend.app.services.gemini_client import client_manager
+from backend.benchmarks.fake_gemini import FakeTransport
+
+
+@pytest.fixture
+def client(db_engine):
+    previous = client_manager.transport
+    client_manager.set_transport(FakeTransport(latency_ms=0, chunk_interval_ms=0))
+    with TestClient(main.app) as test_client:
+        yield test_client
+    client_manager.set_transport(previous)
+
+
+def _conversation(client, system_prompt="Be brief."):
+    response = client.post("/api/conversation", json={"system_prompt_used": system_prompt})
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def _send(client, conversation_id, content):
+    response = client.post(
+        f"/api/conversation/{conversation_id}/send_message",
+        json={"message_content": content, "api_key": "test"},
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_prompts_revalidate_with_etags(client):
+    created = client.post("/api/prompts", json={"name": "helper", "content": "You help."})
+    assert created.status_code == 201
+    assert client.post("/api/prompts", json={"name": "helper", "content": "Again."}).status_code == 400
+
+    listed = client.get("/api/prompts")
+    etag = listed.headers["etag"]
+    assert [prompt["name"] for prompt in listed.json()] == ["helper"]
+    assert client.get("/api/prompts", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/api/prompts", headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+
+    prompt_id = created.json()["id"]
+    assert client.put(f"/api/prompts/{prompt_id}", json={"content": "You help more."}).status_code == 200
+    changed = client.get("/api/prompts", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert changed.json()[0]["content"] == "You help more."
+
+    assert client.delete(f"/api/prompts/{prompt_id}").status_code == 204
+    assert client.get(f"/api/prompts/{prompt_id}").status_code == 404
+
+
+def test_prompt_bodies_are_immutable(client):
+    conversation_id = _conversation(client, "You are terse.")
+    prompt_hash = client.get("/api/conversations").json()[0]["system_prompt_hash"]
+    body = client.get(f"/api/prompt_bodies/{prompt_hash}")
+    assert body.json()["content"] == "You are terse."
+    assert "immutable" in body.headers["cache-control"]
+    assert client.get(f"/api/prompt_bodies/{prompt_hash}", headers={"If-None-Match": body.headers["etag"]}).status_code == 304
+    assert client.delete(f"/api/conversation/{conversation_id}").status_code == 204
+    assert client.get("/api/prompt_bodies/unknown").status_code == 404
+
+
+def test_send_message_stores_the_turn(client):
+    conversation_id = _conversation(client)
+    reply = _send(client, conversation_id, "hello")
+    assert (reply["sender"], reply["content"]) == ("ai", "Echo: hello")
+    _send(client, conversation_id, "again")
+
+    messages = client.get(f"/api/conversation/{conversation_id}/messages").json()
+    assert [m["content"] for m in messages] == ["hello", "Echo: hello", "again", "Echo: again"]
+    summary = client.get("/api/conversations/summary").json()["items"][0]
+    assert (summary["message_count"], summary["last_message_preview"]) == (4, "Echo: again")
+
+
+def test_context_token_budget_is_configurable(client, monkeypatch):
+    conversation_id = _conversation(client)
+    for i in range(5):
+        _send(client, conversation_id, f"message {i} " + "x" * 400)
+
+    def context_tokens():
+        response = client.post(
+            f"/api/conversation/{conversation_id}/send_message",
+            json={"message_content": "short", "api_key": "test"},
+        )
+        return int(response.headers["x-context-tokens"])
+
+    assert context_tokens() > 500
+    monkeypatch.setattr(settings, "context_token_budget", 200)
+    assert context_tokens() < 250
+
+
+def test_history_cache_sees_other_workers(client, database_url, monkeypatch):
+    monkeypatch.setattr(chat, "context_cache", ConversationContextCache(check_database=True))
+    conversation_id = _conversation(client)
+    _send(client, conversation_id, "hello")
+
+    # Another worker adds a message to the same conversation
+    other_worker = create_engine(to_sync_url(database_url), poolclass=NullPool)
+    with other_worker.begin() as connection:
+        connection.execute(insert(models.Message), {
+            "conversation_id": conversation_id, "sender": "user", "content": "from elsewhere", "timestamp": models.utcnow(),
+        })
+    _send(client, conversation_id, "again")
+    history = [entry["parts"][0] for entry in chat.context_cache.get(conversation_id)]
+    assert history == ["hello", "Echo: hello", "from elsewhere", "again", "Echo: again"]
+
+    # ...and then clears it, so the cached messages are gone
+    with other_worker.begin() as connection:
+        connection.execute(delete(models.Message).where(models.Message.conversation_id == conversation_id))
+    other_worker.dispose()
+    _send(client, conversation_id, "fresh start")
+    history = [entry["parts"][0] for entry in chat.context_cache.get(conversation_id)]
+    assert history == ["fresh start", "Echo: fresh start"]
+
+
+def test_streamed_reply_is_stored(client):
+    conversation_id = _conversation(client)
+    with client.stream(
+        "POST", f"/api/conversation/{conversation_id}/send_message/stream",
+        json={"message_content": "hello", "api_key": "test"},
+    ) as response:
+        body = "".join(response.iter_text())
+    assert response.status_code == 200 and "event: done" in body
+    messages = client.get(f"/api/conversation/{conversation_id}/messages").json()
+    assert [m["content"] for m in messages] == ["hello", "Echo: hello"]
+
+
+def test_message_pages_use_cursors(client):
+    conversation_id = _conversation(client)
+    for i in range(3):
+        _send(client, conversation_id, f"message {i}")
+    url = f"/api/conversation/{conversation_id}/messages"
+    latest = client.get(url, params={"limit": 2}).json()
+    older = client.get(url, params={"limit": 10, "before_id": latest[0]["id"]}).json()
+    newer = client.get(url, params={"limit": 10, "after_id": older[-1]["id"]}).json()
+    assert [m["id"] for m in older + latest] == [m["id"] for m in older + newer]
+    assert len(older + latest) == 6
+
+    assert client.get(url, params={"before_id": latest[0]["id"], "after_id": latest[0]["id"]}).status_code == 400
+    other_message = _send(client, _conversation(client), "elsewhere")
+    assert client.get(url, params={"before_id": other_message["id"]}).status_code == 400
+    assert client.get("/api/conversation/999999/messages").status_code == 404
+
+
+def test_conversation_list_pages_use_cursors(client):
+    ids = [_conversation(client, f"Prompt {i}") for i in range(5)]
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/conversations/summary", params=params).json()
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ids[::-1]
+
+    response = client.get("/api/conversations", params={"limit": 3, "include_system_prompt": False})
+    assert [c["id"] for c in response.json()] == ids[:1:-1]
+    assert response.json()[0]["system_prompt_used"] is None
+    rest = client.get("/api/conversations", params={"cursor": response.headers["x-next-cursor"]}).json()
+    assert [c["id"] for c in rest] == ids[1::-1]
+    assert client.get("/api/conversations/summary", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_feedback_updates_prompt_counters(client):
+    conversation_id = _conversation(client)
+    reply = _send(client, conversation_id, "hello")
+    assert client.put(f"/api/message/{reply['id'] - 1}/feedback", json={"liked": True}).status_code == 400
+    assert client.put(f"/api/message/{reply['id']}/feedback", json={"liked": True}).json()["liked"] is True
+    ranking = client.get("/api/analytics/prompts", params={"sort": "likes"}).json()
+    assert [(row["likes"], row["dislikes"]) for row in ranking] == [(1, 0)]
+
+    client.put(f"/api/message/{reply['id']}/feedback", json={"disliked": True})
+    stats = client.get(f"/api/analytics/prompts/{ranking[0]['prompt_hash']}").json()
+    assert (stats["likes"], stats["dislikes"]) == (0, 1)
+
+
+def test_export_import_round_trip(client):
+    conversation_id = _conversation(client, "Be brief.")
+    for i in range(3):
+        reply = _send(client, conversation_id, f"message {i}")
+    client.put(f"/api/message/{reply['id']}/feedback", json={"liked": True})
+    _conversation(client, "Empty conversation.")
+
+    plain = client.get("/api/conversations/export")
+    assert plain.status_code == 200
+    lines = [json.loads(line) for line in plain.text.splitlines()]
+    assert lines[0]["format"] == "promptcraft-conversations"
+    assert [line["type"] for line in lines[1:]] == ["conversation"] + ["message"] * 6 + ["conversation"]
+
+    zipped = client.get("/api/conversations/export", params={"gzip": True})
+    assert gzip.decompress(zipped.content).splitlines()[1:] == plain.content.splitlines()[1:]
+
+    result = client.post("/api/conversations/import", content=zipped.content).json()
+    assert (result["conversations"], result["messages"]) == (2, 6)
+    summaries = client.get("/api/conversations/summary").json()["items"]
+    assert sorted(s["message_count"] for s in summaries) == [0, 0, 6, 6]
+    # Imported feedback counts towards the prompt like the original
+    ranking = client.get("/api/analytics/prompts", params={"sort": "likes"}).json()
+    assert [row["likes"] for row in ranking] == [2]
+
+    def records(text):
+        return [
+            {key: value for key, value in json.loads(line).items() if key not in ("id", "conversation_id")}
+            for line in text.splitlines()[1:]
+        ]
+
+    again = records(client.get("/api/conversations/export").text)
+    assert sorted(map(json.dumps, again)) == sorted(map(json.dumps, records(plain.text) * 2))
+
+
+def test_import_rejects_invalid_archives(client):
+    response = client.post("/api/conversations/import", content=b'{"format": "something else", "version": 1}\n')
+    assert response.status_code == 400
+    response = client.post(
+        "/api/conversations/import",
+        content=b'{"format": "promptcraft-conversations", "version": 1}\n{"type": "message", "conversation_id": 5}\n',
+    )
+    assert response.status_code == 400
+
+
+def test_search_endpoint_highlights_matches(client):
+    conversation_id = _conversation(client)
+    _send(client, conversation_id, "is a fox < a wolf & a bear?")
+    page = client.get("/api/search", params={"q": "fox", "sender": "user"}).json()
+    assert [item["conversation_id"] for item in page["items"]] == [conversation_id]
+    assert "<mark>fox</mark>" in page["items"][0]["snippet"]
+    assert "&lt; a wolf &amp; a bear" in page["items"][0]["snippet"]
+    assert client.get("/api/search", params={"q": "   "}).status_code == 400
+
+
+def test_websocket_receives_changes(client):
+    with client.websocket_connect("/ws") as socket:
+        conversation_id = _conversation(client)
+        event = json.loads(socket.receive_text())
+        assert (event["type"], event["conversation"]["id"]) == ("conversation.created", conversation_id)
+        _send(client, conversation_id, "hello")
+        assert [json.loads(socket.receive_text())["message"]["sender"] for _ in range(2)] == ["user", "ai"]
+        client.delete(f"/api/conversation/{conversation_id}")
+        assert json.loads(socket.receive_text()) == {"type": "conversation.deleted", "conversation_id": conversation_id}
+
+
+def test_metrics_label_requests_by_route_template(client):
+    assert client.get("/static/style.css").status_code == 200
+    assert client.get("/no/such/page").status_code == 404
+    text = client.get("/metrics").text
+    assert 'route="/static/{name:path}",status="200"' in text
+    assert 'route="unmatched",status="404"' in text
+    assert "/no/such/page" not in text
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from backend.app.config import Settings
+from backend.app.services import call_policy as call_policy_module
+from backend.app.services.call_policy import CallPolicy, GeminiTimeoutError
+
+pytestmark = pytest.mark.anyio
+
+
+async def _collect(chunks):
+    return [chunk async for chunk in chunks]
+
+
+async def test_stream_releases_its_slot_while_backing_off(monkeypatch):
+    monkeypatch.setattr(call_policy_module.random, "uniform", lambda low, high: high)
+    policy = CallPolicy(Settings(gemini_max_concurrency=1, gemini_retry_base_delay_seconds=0.2, gemini_max_retries=1))
+    events = []
+
+    def open_stream():
+        async def chunks():
+            events.append("stream")
+            if events.count("stream") == 1:
+                raise google_exceptions.ServiceUnavailable("down")
+            yield "ok"
+        return chunks()
+
+    async def attempt():
+        events.append("call")
+        return "done"
+
+    streamed = asyncio.ensure_future(_collect(policy.stream("key", "generate", open_stream)))
+    await asyncio.sleep(0.05)
+    # Runs during the stream's backoff, in the only slot there is
+    assert await asyncio.wait_for(policy.call("key", "generate", attempt), 0.1) == "done"
+    assert await streamed == ["ok"]
+    assert events == ["stream", "call", "stream"]
+
+
+async def test_stream_waiting_for_a_slot_times_out():
+    policy = CallPolicy(Settings(gemini_max_concurrency=1, gemini_timeout_seconds=0.1))
+
+    def open_stream():
+        async def chunks():
+            yield "first"
+            yield "second"
+        return chunks()
+
+    # A stream paused between chunks keeps the only slot
+    held = policy.stream("key", "generate", open_stream)
+    assert await held.__anext__() == "first"
+    with pytest.raises(GeminiTimeoutError):
+        await asyncio.wait_for(_collect(policy.stream("key", "generate", open_stream)), 1.0)
+    await held.aclose()
+    assert policy.stats()["in_flight"] == 0
+
+
+async def test_streams_do_not_set_the_hedge_delay():
+    policy = CallPolicy(Settings(gemini_hedge_percentile=50, gemini_hedge_min_samples=1))
+
+    def open_stream():
+        async def chunks():
+            yield "fast first chunk"
+        return chunks()
+
+    assert await _collect(policy.stream("key", "generate", open_stream)) == ["fast first chunk"]
+    assert policy.stats()["hedge_delay_ms"] is None
@@ -0,0 +1,178 @@
+import asyncio
+import datetime
+
+import pytest
+from sqlalchemy import delete
+
+from backend.app import crud
+from backend.app.api import chat
+from backend.app.database import AsyncSessionLocal
+from backend.app.models import PROMPTS_CACHE_VERSION, PromptFeedbackStats, prompt_hash, utcnow
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_prompt_crud_bumps_cache_version(db):
+    version = await crud.get_cache_version(db, PROMPTS_CACHE_VERSION)
+    prompt = await crud.create_prompt(db, "helper", "You help.")
+    assert [p.id for p in await crud.get_all_prompts(db)] == [prompt.id]
+
+    await crud.update_prompt(db, prompt.id, content="You help a lot.")
+    assert (await crud.get_prompt(db, prompt.id)).content == "You help a lot."
+    assert await crud.delete_prompt(db, prompt.id)
+    assert not await crud.delete_prompt(db, prompt.id)
+    assert await crud.get_all_prompts(db) == []
+    assert await crud.get_cache_version(db, PROMPTS_CACHE_VERSION) == version + 3
+
+
+async def test_conversations_share_prompt_bodies(db):
+    first = await crud.create_conversation(db, "Be brief.")
+    second = await crud.create_conversation(db, "Be brief.")
+    assert first.system_prompt_hash == second.system_prompt_hash == prompt_hash("Be brief.")
+    assert (await crud.get_prompt_body(db, first.system_prompt_hash)).content == "Be brief."
+
+
+async def test_delete_conversation_removes_messages(db):
+    conversation = await crud.create_conversation(db, "Be brief.")
+    message = crud.add_message(db, conversation.id, "user", "hello")
+    await db.commit()
+    # Deleted from a later request's session, which has not seen the conversation yet
+    db.expunge_all()
+    assert await crud.delete_conversation(db, conversation.id)
+    assert await crud.get_conversation(db, conversation.id) is None
+    assert await crud.get_message(db, message.id) is None
+    assert not await crud.delete_conversation(db, conversation.id)
+
+
+async def test_message_pages_follow_timestamp_and_id(db):
+    conversation = await crud.create_conversation(db, "Be brief.")
+    start = utcnow()
+    # Pairs of messages share a timestamp, so ids have to break the ties
+    for i in range(10):
+        crud.add_message(db, conversation.id, "user", f"message {i}", timestamp=start + datetime.timedelta(seconds=i // 2))
+    await db.commit()
+
+    latest = await crud.get_messages_for_conversation(db, conversation.id, limit=4)
+    assert [m.content for m in latest] == [f"message {i}" for i in range(6, 10)]
+    older = await crud.get_messages_for_conversation(db, conversation.id, before=(latest[0].timestamp, latest[0].id), limit=4)
+    assert [m.content for m in older] == [f"message {i}" for i in range(2, 6)]
+    newer = await crud.get_messages_for_conversation(db, conversation.id, after=(older[-1].timestamp, older[-1].id), limit=3)
+    assert [m.content for m in newer] == [f"message {i}" for i in range(6, 9)]
+
+
+async def test_conversation_summaries_page_newest_first(db):
+    ids = [(await crud.create_conversation(db, f"Prompt {i}")).id for i in range(5)]
+    await crud.bulk_insert_messages(db, [
+        {"conversation_id": ids[0], "sender": "user", "content": "first"},
+        {"conversation_id": ids[0], "sender": "ai", "content": "second"},
+    ])
+    await db.commit()
+
+    seen = []
+    before = None
+    while True:
+        rows = await crud.get_conversation_summaries(db, before=before, limit=2)
+        seen.extend(rows)
+        if len(rows) < 2:
+            break
+        before = (rows[-1].created_at, rows[-1].id)
+    assert [row.id for row in seen] == ids[::-1]
+    oldest = seen[-1]
+    assert (oldest.message_count, oldest.last_message_preview, oldest.system_prompt_preview) == (2, "second", "Prompt 0")
+
+
+async def test_history_since_id(db):
+    conversation = await crud.create_conversation(db, "Be brief.")
+    other = await crud.create_conversation(db, "Be brief.")
+    # Stored the way the chat endpoints store a turn
+    await chat._save_turn(db, conversation.id, "message 0", utcnow(), "message 1")
+    last = await chat._save_turn(db, conversation.id, "message 2", utcnow(), "message 3")
+    foreign = await chat._save_turn(db, other.id, "elsewhere", utcnow(), "reply")
+
+    history = await crud.get_conversation_history(db, conversation.id, since_id=last.id - 1)
+    assert [row.content for row in history] == ["message 2", "message 3"]
+    assert await crud.get_conversation_history(db, conversation.id, since_id=foreign.id) == []
+
+
+async def test_feedback_counters_follow_messages(db):
+    conversation = await crud.create_conversation(db, "Be brief.")
+    key = conversation.system_prompt_hash
+    first = crud.add_message(db, conversation.id, "ai", "one")
+    second = crud.add_message(db, conversation.id, "ai", "two")
+    await db.commit()
+
+    await crud.apply_message_feedback(db, first, liked=True)
+    await crud.apply_message_feedback(db, second, liked=True)
+    # Disliking a liked message moves it from one counter to the other
+    await crud.apply_message_feedback(db, second, disliked=True)
+    # Repeating a status changes nothing
+    await crud.apply_message_feedback(db, second, disliked=True)
+    assert (second.liked, second.disliked) == (False, True)
+    row = await crud.get_prompt_feedback(db, key)
+    assert (row.likes, row.dislikes, row.system_prompt) == (1, 1, "Be brief.")
+
+    await db.execute(delete(PromptFeedbackStats))
+    await db.commit()
+    assert await crud.rebuild_prompt_feedback_stats(db) == 1
+    assert [(r.prompt_hash, r.likes, r.dislikes) for r in await crud.get_prompt_feedback_stats(db)] == [(key, 1, 1)]
+
+    db.expunge_all()
+    await crud.delete_conversation(db, conversation.id)
+    row = await crud.get_prompt_feedback(db, key)
+    assert (row.likes, row.dislikes) == (0, 0)
+
+
+async def _claim(job_id, now, locked_until):
+    # Each claim in a session of its own, as each worker's is
+    async with AsyncSessionLocal() as session:
+        return await crud.claim_job(session, job_id, now, locked_until)
+
+
+async def test_job_lease_is_claimed_once(db):
+    job = await crud.create_job(db, "test", "{}", max_attempts=3, dedupe_key="only")
+    assert await crud.create_job(db, "test", "{}", max_attempts=3, dedupe_key="only") is None
+    now = utcnow()
+
+    lease = now + datetime.timedelta(seconds=30)
+    assert await crud.get_runnable_job_ids(db, now, "me", now, 10) == [job.id]
+    claimed = await _claim(job.id, now, lease)
+    assert (claimed.status, claimed.attempts) == ("running", 1)
+    assert await _claim(job.id, now, lease) is None
+
+    # Once the lease runs out another worker takes the job over
+    later = lease + datetime.timedelta(seconds=1)
+    assert await crud.get_runnable_job_ids(db, later, "other", later, 10) == [job.id]
+    assert (await _claim(job.id, later, later + datetime.timedelta(seconds=30))).attempts == 2
+
+    await crud.release_jobs(db, [job.id])
+    counts, oldest_pending = await crud.get_job_counts(db)
+    assert counts == {"pending": 1} and oldest_pending is not None
+    await crud.finish_job(db, job.id, "done")
+    assert await crud.prune_jobs(db, utcnow() + datetime.timedelta(seconds=1)) == 1
+
+
+async def test_concurrent_enqueues_store_one_job_per_key(db):
+    async def enqueue():
+        # Each in a session of its own, as enqueues from different workers are
+        async with AsyncSessionLocal() as session:
+            return await crud.create_job(session, "test", "{}", max_attempts=3, dedupe_key="raced")
+
+    jobs = await asyncio.gather(*(enqueue() for _ in range(5)))
+    stored = [job for job in jobs if job is not None]
+    assert len(stored) == 1 and stored[0].status == "pending"
+    # Once the job has finished its key is free again
+    await crud.finish_job(db, stored[0].id, "done")
+    assert await enqueue() is not None
+
+
+async def test_change_events_skip_own_payloads(db):
+    assert await crud.get_latest_change_event_id(db) == 0
+    await crud.add_change_events(db, "mine", ["a", "b"])
+    await crud.add_change_events(db, "theirs", ["c"])
+    latest = await crud.get_latest_change_event_id(db)
+
+    rows = await crud.get_change_events(db, 0, skip_origin="mine")
+    assert [payload for _, payload in rows] == [None, None, "c"]
+    assert rows[-1][0] == latest
+    assert await crud.get_change_events(db, latest, also_ids=[rows[0][0]]) == [(rows[0][0], "a")]
+    assert await crud.prune_change_events(db, utcnow() + datetime.timedelta(seconds=1)) == 3
@@ -0,0 +1,69 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.pool import NullPool
+
+from backend.app import models
+from backend.app.database import to_sync_url
+
+
+def _engine(url):
+    return create_engine(to_sync_url(url), poolclass=NullPool)
+
+
+def test_upgrade_to_head_matches_models(alembic, empty_database_url):
+    alembic(empty_database_url, "upgrade", "head")
+    # Raises if autogenerate finds any difference between the models and the schema
+    alembic(empty_database_url, "check")
+
+
+def test_downgrade_to_base_and_back(alembic, empty_database_url):
+    engine = _engine(empty_database_url)
+    alembic(empty_database_url, "upgrade", "head")
+    alembic(empty_database_url, "downgrade", "base")
+    assert set(inspect(engine).get_table_names()) <= {"alembic_version"}
+    alembic(empty_database_url, "upgrade", "head")
+    assert set(models.Base.metadata.tables) <= set(inspect(engine).get_table_names())
+    engine.dispose()
+
+
+def test_upgrade_moves_existing_data(alembic, empty_database_url):
+    alembic(empty_database_url, "upgrade", "0005")
+    engine = _engine(empty_database_url)
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO conversations (id, system_prompt_used) VALUES (1, 'Be brief.'), (2, 'Be brief.'), (3, 'Be kind.')"
+        ))
+        connection.execute(text(
+            "INSERT INTO messages (conversation_id, sender, content, liked, disliked) VALUES "
+            "(1, 'ai', 'brief answer', true, false), (2, 'ai', 'another brief answer', false, true), "
+            "(3, 'ai', 'kind answer', true, false)"
+        ))
+        # Active duplicates that concurrent enqueues could store before keys were unique
+        connection.execute(text(
+            "INSERT INTO jobs (id, kind, payload, status, dedupe_key, max_attempts, run_after) VALUES "
+            "(1, 'summarize', '{}', 'done', 'key', 3, CURRENT_TIMESTAMP), "
+            "(2, 'summarize', '{}', 'running', 'key', 3, CURRENT_TIMESTAMP), "
+            "(3, 'summarize', '{}', 'pending', 'key', 3, CURRENT_TIMESTAMP)"
+        ))
+
+    alembic(empty_database_url, "upgrade", "head")
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM prompt_bodies")).scalar() == 2
+        stats = {
+            content: (likes, dislikes)
+            for content, likes, dislikes in connection.execute(text(
+                "SELECT b.content, s.likes, s.dislikes FROM prompt_feedback_stats AS s "
+                "JOIN prompt_bodies AS b ON b.hash = s.prompt_hash"
+            ))
+        }
+        assert stats == {"Be brief.": (1, 1), "Be kind.": (1, 0)}
+        assert connection.execute(text(
+            "SELECT b.content FROM conversations AS c JOIN prompt_bodies AS b ON b.hash = c.system_prompt_hash WHERE c.id = 3"
+        )).scalar() == "Be kind."
+        keys = dict(connection.execute(text("SELECT id, dedupe_key FROM jobs")).all())
+        assert keys == {1: "key", 2: "key", 3: None}
+
+    alembic(empty_database_url, "downgrade", "0005")
+    with engine.connect() as connection:
+        prompts = dict(connection.execute(text("SELECT id, system_prompt_used FROM conversations")).all())
+        assert prompts == {1: "Be brief.", 2: "Be brief.", 3: "Be kind."}
+    engine.dispose()
@@ -0,0 +1,49 @@
+import pytest
+
+from backend.app import crud
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def conversation_ids(db):
+    first = await crud.create_conversation(db, "Be brief.")
+    second = await crud.create_conversation(db, "Be brief.")
+    await crud.bulk_insert_messages(db, [
+        {"conversation_id": first.id, "sender": "user", "content": "Where does the quick brown fox live?"},
+        {"conversation_id": first.id, "sender": "ai", "content": "The fox lives in the forest. A fox den is hidden."},
+        {"conversation_id": second.id, "sender": "user", "content": "Tell me about the lazy dog."},
+    ])
+    await db.commit()
+    return first.id, second.id
+
+
+async def test_search_ranks_and_marks_matches(db, conversation_ids):
+    rows = await crud.search_messages(db, "fox")
+    assert [row.sender for row in rows] == ["ai", "user"] # two mentions rank above one
+    assert all(row.conversation_id == conversation_ids[0] for row in rows)
+    assert f"{crud.SEARCH_MATCH_START}fox{crud.SEARCH_MATCH_END}" in rows[0].snippet.lower()
+    assert rows[0].score >= rows[1].score
+
+
+async def test_search_matches_all_words_and_filters(db, conversation_ids):
+    assert [row.sender for row in await crud.search_messages(db, "quick fox")] == ["user"]
+    assert await crud.search_messages(db, "fox dog") == []
+    assert [row.sender for row in await crud.search_messages(db, "fox", sender="ai")] == ["ai"]
+    assert await crud.search_messages(db, "fox", conversation_id=conversation_ids[1]) == []
+    assert len(await crud.search_messages(db, "fox", skip=1, limit=5)) == 1
+
+
+async def test_search_indexes_new_and_deleted_messages(db, conversation_ids):
+    crud.add_message(db, conversation_ids[1], "ai", "Dogs sleep a lot; this one is a hound.")
+    await db.commit()
+    assert [row.sender for row in await crud.search_messages(db, "hound")] == ["ai"]
+    db.expunge_all()
+    await crud.delete_conversation(db, conversation_ids[1])
+    assert await crud.search_messages(db, "hound") == []
+
+
+@pytest.mark.parametrize("query", ['"fox', "fox AND (", "NEAR(fox", "content:fox", "fox*", "-fox"])
+async def test_search_treats_syntax_as_text(db, conversation_ids, query):
+    # Operators of either backend's query syntax must not raise
+    await crud.search_messages(db, query)
@@ -0,0 +1,127 @@
+import asyncio
+import gzip
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from backend.app import crud
+from backend.app.config import Settings
+from backend.app.database import AsyncSessionLocal
+from backend.app.services import archive
+from backend.app.services.change_feed import ChangeFeed
+from backend.app.services.job_queue import JobQueue
+
+pytestmark = pytest.mark.anyio
+
+
+async def _eventually(check, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not await check():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+async def test_outbox_reaches_other_workers_once(db_engine):
+    # Two feeds on one database stand for two worker processes
+    config = Settings(multiple_workers=True, change_feed_poll_interval_seconds=0.01)
+    first, second = ChangeFeed(config), ChangeFeed(config)
+    try:
+        with first.subscribe() as first_events, second.subscribe() as second_events:
+            async def polling():
+                return first.stats()["polls"] > 0 and second.stats()["polls"] > 0
+            await _eventually(polling)
+
+            first.publish("prompt.deleted", prompt_id=1)
+            second.publish("prompt.deleted", prompt_id=2)
+            for events in (first_events, second_events):
+                received = [json.loads(await asyncio.wait_for(events.get(), 5)) for _ in range(2)]
+                assert sorted(event["prompt_id"] for event in received) == [1, 2]
+            # Each feed has read the other's event; its own came back without a payload
+            async def caught_up():
+                return first.stats()["received_from_other_workers"] == second.stats()["received_from_other_workers"] == 1
+            await _eventually(caught_up)
+            assert first_events.empty() and second_events.empty()
+    finally:
+        await first.stop()
+        await second.stop()
+
+
+async def test_single_worker_feed_skips_the_database(db_engine):
+    feed = ChangeFeed(Settings(multiple_workers=False))
+    with feed.subscribe() as events:
+        feed.publish("resync")
+        assert json.loads(events.get_nowait()) == {"type": "resync"}
+    async with AsyncSessionLocal() as db:
+        assert await crud.get_latest_change_event_id(db) == 0
+
+
+async def test_failed_job_is_retried(db_engine):
+    queue = JobQueue(Settings(job_queue_retry_base_delay_seconds=0.01, job_queue_poll_interval_seconds=0.05))
+    calls = []
+
+    @queue.job("flaky")
+    async def flaky(payload, secrets):
+        calls.append((payload, secrets))
+        if len(calls) == 1:
+            raise RuntimeError("first attempt fails")
+
+    try:
+        job_id = await queue.enqueue("flaky", {"n": 1}, secrets={"api_key": "secret"})
+        assert await queue.enqueue("flaky", {"n": 1}, dedupe_key="once") is not None
+        assert await queue.enqueue("flaky", {"n": 2}, dedupe_key="once") is None
+
+        async def finished():
+            async with AsyncSessionLocal() as db:
+                return (await crud.get_job(db, job_id)).status == "done"
+        await _eventually(finished)
+    finally:
+        await queue.stop()
+
+    async with AsyncSessionLocal() as db:
+        job = await crud.get_job(db, job_id)
+        assert (job.attempts, job.payload) == (2, '{"n": 1}')
+        assert "secret" not in job.payload
+    assert calls[0] == ({"n": 1}, {"api_key": "secret"})
+
+
+async def _one_chunk(data):
+    yield data
+
+
+async def test_gzip_archives_expand_in_bounded_pieces():
+    bomb = gzip.compress(b"\n" * (64 * 1024 * 1024))
+    sizes = [len(piece) async for piece in archive._decompressed(_one_chunk(bomb + bomb), 0)]
+    assert sum(sizes) == 128 * 1024 * 1024
+    assert max(sizes) <= 64 * 1024
+
+
+async def test_import_rejects_archives_over_the_size_limit(db_engine):
+    header = b'{"format": "promptcraft-conversations", "version": 1}\n'
+    with pytest.raises(archive.ArchiveError):
+        await archive.import_ndjson(_one_chunk(gzip.compress(header + b"\n" * (8 * 1024 * 1024))), max_bytes=1024 * 1024)
+    stats = await archive.import_ndjson(_one_chunk(gzip.compress(header)), max_bytes=1024 * 1024)
+    assert (stats.conversations, stats.messages) == (0, 0)
+
+
+def _run_python(code, env):
+    # A fresh interpreter, as each uvicorn worker is
+    root = Path(__file__).resolve().parents[2]
+    return subprocess.run([sys.executable, "-c", code], cwd=root, env=env, check=True, capture_output=True, text=True).stdout
+
+
+def test_metrics_add_up_over_worker_processes(tmp_path):
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    worker = "from backend.app.services import metrics; metrics.GEMINI_REQUESTS.labels('generate').inc(); metrics.JOBS_RUNNING.inc()"
+    for _ in range(2):
+        _run_python(worker, env)
+    scrape = "from backend.app.services import metrics; print(metrics.render_latest()[0].decode())"
+    text = _run_python(scrape, env)
+    assert 'gemini_requests_total{operation="generate"} 2.0' in text
+    assert "jobs_running 2.0" in text
+    # A worker that shuts down drops out of the gauges, but not the counters
+    _run_python(worker + "; metrics.mark_process_dead()", env)
+    assert "jobs_running 2.0" in _run_python(scrape, env)
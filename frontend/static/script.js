@@ -14,6 +14,20 @@ document.addEventListener('DOMContentLoaded', () => {
 
     let currentConversationId = null;
 
+    // Paging state for the open conversation's message history
+    const MESSAGE_PAGE_SIZE = 50;
+    let oldestLoadedMessageId = null;
+    let hasOlderMessages = false;
+    let loadingOlderMessages = false;
+
+    // Local copies patched from the change events pushed over /ws, so nothing is refetched after a change
+    const PREVIEW_CHARS = 80;
+    let savedPrompts = [];
+    let changeFeedRetryMs = 1000;
+    let changeFeedConnected = false;
+    // The reply this tab is streaming; its pushed copy is left to the stream's 'done' event
+    let streamingConversationId = null;
+
     // Default prompts (will be added to the select always)
     const defaultPrompts = [
         { name: 'Helpful AI Assistant', content: 'You are a helpful AI assistant. Please format your responses using Markdown.' },
@@ -28,8 +42,8 @@ document.addEventListener('DOMContentLoaded', () => {
         return date.toLocaleString(); // Adjust as needed for desired format
     }
 
-    // Function to display a message in the chat window
-    function displayMessage(message) {
+    // Function to build the element for a message (content, timestamp and feedback buttons)
+    function createMessageElement(message) {
         const { sender, content, timestamp, id, liked, disliked } = message;
 
         const messageElement = document.createElement('div');
@@ -82,8 +96,50 @@ document.addEventListener('DOMContentLoaded', () => {
             messageElement.appendChild(feedbackContainer);
         }
 
+        return messageElement;
+    }
+
+    // Function to display a message at the bottom of the chat window
+    function displayMessage(message) {
+        const messageElement = createMessageElement(message);
         chatWindow.appendChild(messageElement);
         chatWindow.scrollTop = chatWindow.scrollHeight; // Scroll to bottom
+        return messageElement;
+    }
+
+    // Function to re-render the content of a message that is still being streamed
+    function updateStreamingMessage(messageElement, content) {
+        const contentContainer = messageElement.firstChild;
+        if (typeof marked !== 'undefined') {
+            contentContainer.innerHTML = marked.parse(content);
+        } else {
+            contentContainer.textContent = content;
+        }
+        chatWindow.scrollTop = chatWindow.scrollHeight; // Keep the latest text in view
+    }
+
+    // Function to read a Server-Sent Events stream from a fetch response, calling onEvent per event
+    async function readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let eventName = 'message';
+                let data = '';
+                frame.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) eventName = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                });
+                onEvent(eventName, data ? JSON.parse(data) : null);
+            }
+        }
     }
 
     // Function to handle message feedback (like/dislike)
@@ -129,10 +185,38 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    // Function to fetch and display messages for a conversation
+    // Function to set the like/dislike buttons of a shown message
+    function applyFeedback(messageId, liked, disliked) {
+        const messageElement = chatWindow.querySelector(`.message[data-message-id='${messageId}']`);
+        if (!messageElement) return;
+        messageElement.querySelector('.like-btn')?.classList.toggle('active', liked);
+        messageElement.querySelector('.dislike-btn')?.classList.toggle('active', disliked);
+    }
+
+    // Function to show a message pushed by the server in the open conversation, once
+    function showPushedMessage(message) {
+        if (message.conversation_id !== currentConversationId) return;
+        if (chatWindow.querySelector(`.message[data-message-id='${message.id}']`)) return;
+        if (message.sender === 'user') {
+            // This tab's own message is already shown; give it its id
+            const pending = [...chatWindow.querySelectorAll('.message.user[data-pending]')]
+                .find(element => element.firstChild.textContent === message.content);
+            if (pending) {
+                delete pending.dataset.pending;
+                pending.dataset.messageId = message.id;
+                return;
+            }
+        } else if (streamingConversationId === message.conversation_id) {
+            return;
+        }
+        displayMessage(message);
+    }
+
+    // Function to fetch and display messages for a conversation.
+    // Only the latest page is loaded up front; older pages are fetched as the user scrolls up.
     async function fetchMessages(conversationId) {
         try {
-            const response = await fetch(`/api/conversation/${conversationId}/messages`);
+            const response = await fetch(`/api/conversation/${conversationId}/messages?limit=${MESSAGE_PAGE_SIZE}`);
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
@@ -142,6 +226,8 @@ document.addEventListener('DOMContentLoaded', () => {
                 displayMessage(msg);
             });
             currentConversationId = conversationId; // Set current conversation
+            oldestLoadedMessageId = messages.length > 0 ? messages[0].id : null;
+            hasOlderMessages = messages.length === MESSAGE_PAGE_SIZE;
             // Highlight the active conversation in the sidebar
             document.querySelectorAll('#conversationsList li').forEach(item => {
                 item.classList.remove('active');
@@ -156,54 +242,137 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    // Function to load and display conversation history in the sidebar
-    async function loadConversations() {
+    // Function to prepend the page of messages before the oldest one shown, keeping the scroll position
+    async function fetchOlderMessages() {
+        if (loadingOlderMessages || !hasOlderMessages || currentConversationId === null) return;
+        loadingOlderMessages = true;
+        const conversationId = currentConversationId;
         try {
-            const response = await fetch('/api/conversations');
+            const response = await fetch(`/api/conversation/${conversationId}/messages?limit=${MESSAGE_PAGE_SIZE}&before_id=${oldestLoadedMessageId}`);
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
-            const conversations = await response.json();
-            conversationsList.innerHTML = ''; // Clear existing list
-            if (conversations.length === 0) {
+            const messages = await response.json();
+            if (conversationId !== currentConversationId) return; // Switched conversations meanwhile
+
+            const previousHeight = chatWindow.scrollHeight;
+            const firstChild = chatWindow.firstChild;
+            messages.forEach(msg => {
+                chatWindow.insertBefore(createMessageElement(msg), firstChild);
+            });
+            chatWindow.scrollTop += chatWindow.scrollHeight - previousHeight;
+
+            if (messages.length > 0) oldestLoadedMessageId = messages[0].id;
+            hasOlderMessages = messages.length === MESSAGE_PAGE_SIZE;
+        } catch (error) {
+            console.error('Error fetching older messages:', error);
+        } finally {
+            loadingOlderMessages = false;
+        }
+    }
+
+    // Function to build the sidebar item for one conversation summary
+    function createConversationItem(convo) {
+        const listItem = document.createElement('li');
+        listItem.dataset.conversationId = convo.id; // Store ID for easy access
+        listItem.dataset.messageCount = convo.message_count;
+        const promptSnippet = convo.system_prompt_preview.substring(0, 30) + '...';
+        const date = new Date(convo.last_activity).toLocaleDateString();
+        // Add delete button
+        listItem.innerHTML = `<span>${promptSnippet}</span><span class="date-span">${date}</span><button class="delete-btn" data-id="${convo.id}">🗑️</button>`;
+        listItem.title = convo.last_message_preview
+            ? `${convo.message_count} messages. Last: ${convo.last_message_preview}`
+            : 'No messages yet';
+
+        listItem.addEventListener('click', (event) => {
+            // Only fetch messages if the click wasn't on the delete button
+            if (event.target.closest('.delete-btn')) return;
+            fetchMessages(convo.id);
+        });
+
+        // Add event listener for the delete button
+        const deleteBtn = listItem.querySelector('.delete-btn');
+        deleteBtn.addEventListener('click', (event) => {
+            event.stopPropagation(); // Prevent the parent <li>'s click event
+            deleteConversation(convo.id);
+        });
+
+        if (convo.id === currentConversationId) {
+            listItem.classList.add('active');
+        }
+        return listItem;
+    }
+
+    // Function to add one conversation summary to the end of the sidebar list
+    function appendConversationItem(convo) {
+        conversationsList.appendChild(createConversationItem(convo));
+    }
+
+    function findConversationItem(conversationId) {
+        return conversationsList.querySelector(`li[data-conversation-id='${conversationId}']`);
+    }
+
+    // Function to put a new conversation at the top of the sidebar list (the list is newest first)
+    function addConversationItem(convo) {
+        if (findConversationItem(convo.id)) return;
+        conversationsList.querySelector('.empty-list')?.remove();
+        conversationsList.prepend(createConversationItem(convo));
+    }
+
+    // Function to update a conversation's message count, preview and date after a new message
+    function updateConversationItem(message) {
+        const listItem = findConversationItem(message.conversation_id);
+        if (!listItem) return;
+        const count = parseInt(listItem.dataset.messageCount) + 1;
+        listItem.dataset.messageCount = count;
+        listItem.title = `${count} messages. Last: ${message.content.substring(0, PREVIEW_CHARS)}`;
+        listItem.querySelector('.date-span').textContent = new Date(message.timestamp).toLocaleDateString();
+    }
+
+    // Function to drop a deleted conversation from the sidebar, and from the chat window if it is open
+    function removeConversation(conversationId) {
+        findConversationItem(conversationId)?.remove();
+        if (currentConversationId === conversationId) {
+            currentConversationId = null;
+            hasOlderMessages = false;
+            chatWindow.innerHTML = ''; // Clear chat window
+            displayMessage({ sender: 'ai', content: 'Conversation deleted. Please start a new conversation.' });
+        }
+    }
+
+    // Function to load and display conversation history in the sidebar.
+    // Without a cursor the list is reloaded from the newest conversation; with one, the next
+    // (older) page is appended and a "Load more" item is shown while more pages remain.
+    async function loadConversations(cursor = null) {
+        try {
+            const url = cursor
+                ? `/api/conversations/summary?cursor=${encodeURIComponent(cursor)}`
+                : '/api/conversations/summary';
+            const response = await fetch(url);
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            const page = await response.json();
+            if (!cursor) {
+                conversationsList.innerHTML = ''; // Clear existing list
+            }
+            conversationsList.querySelector('.load-more')?.remove();
+            if (!cursor && page.items.length === 0) {
                 const noConvoItem = document.createElement('li');
+                noConvoItem.classList.add('empty-list');
                 noConvoItem.textContent = 'No past conversations.';
                 conversationsList.appendChild(noConvoItem);
                 return;
             }
 
-            conversations.forEach(convo => {
-                const listItem = document.createElement('li');
-                listItem.dataset.conversationId = convo.id; // Store ID for easy access
-                const promptSnippet = convo.system_prompt_used.substring(0, 30) + '...';
-                const date = new Date(convo.created_at).toLocaleDateString();
-                // Add delete button
-                listItem.innerHTML = `<span>${promptSnippet}</span><span class="date-span">${date}</span><button class="delete-btn" data-id="${convo.id}">🗑️</button>`;
-
-                listItem.addEventListener('click', (event) => {
-                    // Only fetch messages if the click wasn't on the delete button
-                    if (event.target.closest('.delete-btn')) return;
-                    fetchMessages(convo.id);
-                });
-
-                // Add event listener for the delete button
-                const deleteBtn = listItem.querySelector('.delete-btn');
-                deleteBtn.addEventListener('click', (event) => {
-                    event.stopPropagation(); // Prevent the parent <li>'s click event
-                    deleteConversation(convo.id);
-                });
-
-                conversationsList.appendChild(listItem);
-            });
+            page.items.forEach(appendConversationItem);
 
-            // If there's an active conversation, highlight it
-            if (currentConversationId) {
-                document.querySelectorAll('#conversationsList li').forEach(item => {
-                    item.classList.remove('active');
-                    if (parseInt(item.dataset.conversationId) === currentConversationId) {
-                        item.classList.add('active');
-                    }
-                });
+            if (page.next_cursor) {
+                const loadMoreItem = document.createElement('li');
+                loadMoreItem.classList.add('load-more');
+                loadMoreItem.textContent = 'Load older conversations...';
+                loadMoreItem.addEventListener('click', () => loadConversations(page.next_cursor));
+                conversationsList.appendChild(loadMoreItem);
             }
 
         } catch (error) {
@@ -214,69 +383,92 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    // Function to load and display system prompts
+    // Function to load the saved prompts and display them
     async function loadPrompts() {
         try {
             const response = await fetch('/api/prompts');
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
-            const savedPrompts = await response.json();
-
-            // Clear existing options and list items
-            systemPromptSelect.innerHTML = '';
+            savedPrompts = await response.json();
+            renderPrompts();
+        } catch (error) {
+            console.error('Error loading prompts:', error);
             savedPromptsList.innerHTML = '';
+            const errorItem = document.createElement('li');
+            errorItem.textContent = 'Error loading custom prompts.';
+            savedPromptsList.appendChild(errorItem);
+            systemPromptSelect.innerHTML = '<option>Error loading prompts</option>';
+        }
+    }
 
-            // Add default prompts to the select dropdown
-            defaultPrompts.forEach(prompt => {
+    // Function to display the system prompts from the local list, keeping the current selection
+    function renderPrompts() {
+        const selectedContent = systemPromptSelect.value;
+
+        // Clear existing options and list items
+        systemPromptSelect.innerHTML = '';
+        savedPromptsList.innerHTML = '';
+
+        // Add default prompts to the select dropdown
+        defaultPrompts.forEach(prompt => {
+            const option = document.createElement('option');
+            option.value = prompt.content;
+            option.textContent = `Default: ${prompt.name}`;
+            systemPromptSelect.appendChild(option);
+        });
+
+        // Add saved prompts to the select dropdown and the management list
+        if (savedPrompts.length > 0) {
+            const savedPromptsOptGroup = document.createElement('optgroup');
+            savedPromptsOptGroup.label = 'Your Saved Prompts';
+            systemPromptSelect.appendChild(savedPromptsOptGroup);
+
+            savedPrompts.forEach(prompt => {
+                // Add to select dropdown
                 const option = document.createElement('option');
                 option.value = prompt.content;
-                option.textContent = `Default: ${prompt.name}`;
-                systemPromptSelect.appendChild(option);
-            });
+                option.textContent = `${prompt.name}`;
+                option.dataset.promptId = prompt.id; // Store ID for potential future use (e.g., editing)
+                savedPromptsOptGroup.appendChild(option);
 
-            // Add saved prompts to the select dropdown and the management list
-            if (savedPrompts.length > 0) {
-                const savedPromptsOptGroup = document.createElement('optgroup');
-                savedPromptsOptGroup.label = 'Your Saved Prompts';
-                systemPromptSelect.appendChild(savedPromptsOptGroup);
-
-                savedPrompts.forEach(prompt => {
-                    // Add to select dropdown
-                    const option = document.createElement('option');
-                    option.value = prompt.content;
-                    option.textContent = `${prompt.name}`;
-                    option.dataset.promptId = prompt.id; // Store ID for potential future use (e.g., editing)
-                    savedPromptsOptGroup.appendChild(option);
-
-                    // Add to saved prompts list for management
-                    const listItem = document.createElement('li');
-                    listItem.dataset.promptId = prompt.id;
-                    listItem.innerHTML = `<span>${prompt.name}</span><button class="delete-btn" data-id="${prompt.id}">🗑️</button>`;
-                    
-                    // Add event listener for delete button
-                    const deleteBtn = listItem.querySelector('.delete-btn');
-                    deleteBtn.addEventListener('click', (event) => {
-                        event.stopPropagation();
-                        deletePrompt(prompt.id);
-                    });
-                    savedPromptsList.appendChild(listItem);
+                // Add to saved prompts list for management
+                const listItem = document.createElement('li');
+                listItem.dataset.promptId = prompt.id;
+                listItem.innerHTML = `<span>${prompt.name}</span><button class="delete-btn" data-id="${prompt.id}">🗑️</button>`;
+                
+                // Add event listener for delete button
+                const deleteBtn = listItem.querySelector('.delete-btn');
+                deleteBtn.addEventListener('click', (event) => {
+                    event.stopPropagation();
+                    deletePrompt(prompt.id);
                 });
-            } else {
-                const noPromptItem = document.createElement('li');
-                noPromptItem.textContent = 'No custom prompts saved.';
-                savedPromptsList.appendChild(noPromptItem);
-            }
+                savedPromptsList.appendChild(listItem);
+            });
+        } else {
+            const noPromptItem = document.createElement('li');
+            noPromptItem.textContent = 'No custom prompts saved.';
+            savedPromptsList.appendChild(noPromptItem);
+        }
 
-        } catch (error) {
-            console.error('Error loading prompts:', error);
-            const errorItem = document.createElement('li');
-            errorItem.textContent = 'Error loading custom prompts.';
-            savedPromptsList.appendChild(errorItem);
-            systemPromptSelect.innerHTML = '<option>Error loading prompts</option>';
+        if (selectedContent && [...systemPromptSelect.options].some(option => option.value === selectedContent)) {
+            systemPromptSelect.value = selectedContent;
         }
     }
 
+    // Function to add or replace a prompt in the local list (kept in id order, like the API returns it)
+    function upsertPrompt(prompt) {
+        savedPrompts = savedPrompts.filter(saved => saved.id !== prompt.id);
+        savedPrompts.push(prompt);
+        savedPrompts.sort((a, b) => a.id - b.id);
+        renderPrompts();
+    }
+
+    function removePrompt(promptId) {
+        savedPrompts = savedPrompts.filter(saved => saved.id !== promptId);
+        renderPrompts();
+    }
+
     // Function to save a new prompt
     async function saveNewPrompt() {
         const name = newPromptNameInput.value.trim();
@@ -305,7 +497,7 @@ document.addEventListener('DOMContentLoaded', () => {
             displayMessage({ sender: 'ai', content: `Prompt "${newPrompt.name}" saved successfully.` });
             newPromptNameInput.value = '';
             newPromptContentTextarea.value = '';
-            await loadPrompts(); // Reload prompts to show the new one
+            upsertPrompt(newPrompt); // Other tabs get it from the change feed
         } catch (error) {
             console.error('Error saving new prompt:', error);
             displayMessage({ sender: 'ai', content: `Error saving prompt: ${error.message}.` });
@@ -325,7 +517,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             displayMessage({ sender: 'ai', content: `Prompt deleted.` });
-            await loadPrompts(); // Reload prompts list
+            removePrompt(promptId);
         } catch (error) {
             console.error('Error deleting prompt:', error);
             displayMessage({ sender: 'ai', content: 'Error deleting prompt. Please try again.' });
@@ -357,10 +549,18 @@ document.addEventListener('DOMContentLoaded', () => {
 
             const conversation = await response.json();
             currentConversationId = conversation.id;
+            hasOlderMessages = false;
             chatWindow.innerHTML = ''; // Clear chat window for new conversation
             displayMessage({ sender: 'ai', content: `New conversation started with prompt: "${systemPromptSelect.options[systemPromptSelect.selectedIndex].text}"` });
             console.log('New conversation started:', conversation);
-            await loadConversations(); // Reload conversations to show the new one
+            addConversationItem({
+                id: conversation.id,
+                created_at: conversation.created_at,
+                system_prompt_preview: selectedPromptContent.substring(0, PREVIEW_CHARS),
+                message_count: 0,
+                last_message_preview: null,
+                last_activity: conversation.created_at,
+            });
 
         } catch (error) {
             console.error('Error starting new conversation:', error);
@@ -383,11 +583,15 @@ document.addEventListener('DOMContentLoaded', () => {
             return;
         }
 
-        displayMessage({ sender: 'user', content: messageContent, timestamp: new Date().toISOString() }); // Display user message immediately
+        const conversationId = currentConversationId;
+        const userElement = displayMessage({ sender: 'user', content: messageContent, timestamp: new Date().toISOString() }); // Display user message immediately
+        userElement.dataset.pending = 'true'; // Until the pushed copy gives it its id
         userMessageInput.value = ''; // Clear input field
 
+        let streamingElement = null;
+        streamingConversationId = conversationId;
         try {
-            const response = await fetch(`/api/conversation/${currentConversationId}/send_message`, {
+            const response = await fetch(`/api/conversation/${conversationId}/send_message/stream`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -400,11 +604,32 @@ document.addEventListener('DOMContentLoaded', () => {
                 throw new Error(`HTTP error! status: ${response.status}. Detail: ${errorData.detail || 'Failed to get AI response.'}`);
             }
 
-            const aiMessage = await response.json();
-            displayMessage(aiMessage);
+            // Render chunks as they arrive, then swap in the saved message (with feedback buttons) when done
+            streamingElement = displayMessage({ sender: 'ai', content: '' });
+            let streamedContent = '';
+            let streamError = null;
+            await readEventStream(response, (eventName, data) => {
+                if (eventName === 'chunk') {
+                    streamedContent += data.text;
+                    updateStreamingMessage(streamingElement, streamedContent);
+                } else if (eventName === 'done') {
+                    streamingElement.remove();
+                    streamingElement = null;
+                    streamingConversationId = null;
+                    showPushedMessage(data.message);
+                } else if (eventName === 'error') {
+                    streamError = data.detail;
+                }
+            });
+            if (streamError) {
+                throw new Error(streamError);
+            }
         } catch (error) {
             console.error('Error sending message or getting AI response:', error);
+            if (streamingElement) streamingElement.remove();
             displayMessage({ sender: 'ai', content: `Error: ${error.message}` });
+        } finally {
+            streamingConversationId = null;
         }
     }
 
@@ -421,18 +646,90 @@ document.addEventListener('DOMContentLoaded', () => {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             displayMessage({ sender: 'ai', content: `Conversation deleted.` });
-            if (currentConversationId === conversationId) {
-                currentConversationId = null;
-                chatWindow.innerHTML = ''; // Clear chat window
-                displayMessage({ sender: 'ai', content: 'Conversation deleted. Please start a new conversation.' });
-            }
-            await loadConversations(); // Reload conversations list
+            removeConversation(conversationId);
         } catch (error) {
             console.error('Error deleting conversation:', error);
             displayMessage({ sender: 'ai', content: 'Error deleting conversation. Please try again.' });
         }
     }
 
+    // Function to fetch the open conversation's messages newer than the newest one shown
+    async function catchUpMessages() {
+        const conversationId = currentConversationId;
+        if (conversationId === null) return;
+        const newest = [...chatWindow.querySelectorAll('.message[data-message-id]')].pop();
+        const cursor = newest ? `&after_id=${newest.dataset.messageId}` : '';
+        try {
+            const response = await fetch(`/api/conversation/${conversationId}/messages?limit=500${cursor}`);
+            if (response.status === 404) {
+                removeConversation(conversationId);
+                return;
+            }
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            const messages = await response.json();
+            messages.forEach(showPushedMessage);
+        } catch (error) {
+            console.error('Error catching up on messages:', error);
+        }
+    }
+
+    // Function to reload the lists after changes this tab may have missed (while disconnected, or too many to push)
+    function resync() {
+        loadConversations();
+        loadPrompts();
+        catchUpMessages();
+    }
+
+    // Function to apply one change pushed by the server to the local state
+    function applyChange(change) {
+        switch (change.type) {
+            case 'conversation.created':
+                addConversationItem(change.conversation);
+                break;
+            case 'conversation.deleted':
+                removeConversation(change.conversation_id);
+                break;
+            case 'message.created':
+                updateConversationItem(change.message);
+                showPushedMessage(change.message);
+                break;
+            case 'message.feedback':
+                applyFeedback(change.message_id, change.liked, change.disliked);
+                break;
+            case 'prompt.created':
+            case 'prompt.updated':
+                upsertPrompt(change.prompt);
+                break;
+            case 'prompt.deleted':
+                removePrompt(change.prompt_id);
+                break;
+            case 'resync':
+                resync();
+                break;
+        }
+    }
+
+    // Function to subscribe to the server's change events, reconnecting with backoff when the connection drops
+    function connectChangeFeed() {
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const socket = new WebSocket(`${protocol}//${window.location.host}/ws`);
+        socket.addEventListener('open', () => {
+            changeFeedRetryMs = 1000;
+            // Changes made while disconnected were not pushed; reload once instead
+            if (changeFeedConnected) resync();
+            changeFeedConnected = true;
+        });
+        socket.addEventListener('message', (event) => {
+            applyChange(JSON.parse(event.data));
+        });
+        socket.addEventListener('close', () => {
+            setTimeout(connectChangeFeed, changeFeedRetryMs);
+            changeFeedRetryMs = Math.min(changeFeedRetryMs * 2, 30000);
+        });
+    }
+
     // Dark Mode Toggle Logic
     function applyDarkMode(isDark) {
         if (isDark) {
@@ -472,8 +769,14 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
     savePromptBtn.addEventListener('click', saveNewPrompt);
+    chatWindow.addEventListener('scroll', () => {
+        if (chatWindow.scrollTop < 100) {
+            fetchOlderMessages();
+        }
+    });
 
-    // Initial setup: Load past conversations and prompt the user
+    // Initial setup: Subscribe to changes, load past conversations and prompt the user
+    connectChangeFeed(); // Before loading, so no change slips in between
     loadConversations();
     loadPrompts(); // Load prompts on startup
     displayMessage({ sender: 'ai', content: 'Welcome to PromptCraft AI Chat! Please enter your Gemini API Key, then choose a system prompt and click "Start New Conversation" to begin.' });
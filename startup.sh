@@ -1,10 +1,29 @@
 #!/bin/bash
-# Install Python dependencies
-pip install -r backend/requirements.txt
+# Usage: ./startup.sh              development: single process, installs dependencies when they changed
+#        APP_ENV=production ./startup.sh
+#                                  production: no install step, one worker per CPU core
+#                                  (WEB_CONCURRENCY overrides), graceful shutdown on SIGTERM
+set -e
 
-# Remove the old database file to ensure schema is up-to-date
-rm -f ./sql_app.db
+# Install Python dependencies, but only when backend/requirements.txt (or the Python
+# interpreter) changed since the last successful install. Production images are
+# expected to have them installed already.
+if [ "$APP_ENV" != "production" ]; then
+    REQUIREMENTS_STAMP=".requirements.stamp"
+    current="$(sha256sum backend/requirements.txt | cut -d' ' -f1) $(command -v python)"
+    if [ "$(cat "$REQUIREMENTS_STAMP" 2>/dev/null)" != "$current" ]; then
+        pip install -r backend/requirements.txt
+        echo "$current" > "$REQUIREMENTS_STAMP"
+    fi
+fi
 
-# Start the FastAPI application using uvicorn on port 9000
+# Bring the database schema up to date (creates it on first run, keeps existing data).
+# The database is selected with the DATABASE_URL environment variable (default: ./sql_app.db).
+alembic upgrade head
+
+# Start the FastAPI application on port 9000
 # Run from the project root so that 'backend' is a discoverable package
-uvicorn backend.app.main:app --host 0.0.0.0 --port 9000
\ No newline at end of file
+if [ "$APP_ENV" = "production" ]; then
+    exec python -m backend.app.serve
+fi
+exec uvicorn backend.app.main:app --host 0.0.0.0 --port 9000